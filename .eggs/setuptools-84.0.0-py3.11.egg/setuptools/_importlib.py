@@ -0,0 +1,4 @@
+from importlib import (
+    metadata,  # noqa: F401
+    resources,  # noqa: F401
+)
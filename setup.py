@@ -13,6 +13,7 @@ ENTRY_POINTS = """
 [distutils.commands]
 check = setupmeta.commands:CheckCommand
 explain = setupmeta.commands:ExplainCommand
+export_env = setupmeta.commands:ExportEnvCommand
 version = setupmeta.commands:VersionCommand
 
 [setuptools.finalize_distribution_options]
@@ -6,20 +6,34 @@ download_url: archive/v{version}.tar.gz
 author: Zoran Simic zoran@simicweb.com
 """
 
+import atexit
 import contextlib
+import fnmatch
+import io
+import json
 import os
 import platform
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import warnings
 
 USER_HOME = os.path.expanduser("~")  # Used to pretty-print subfolders of ~
 TRACE_ENABLED = os.environ.get("SETUPMETA_DEBUG")
+TRACE_INFO = 1  # Trace level for main steps
+TRACE_DEBUG = 2  # Trace level for details (each definition, each requirement line...)
+TRACE_LEVELS = {"info": TRACE_INFO, "debug": TRACE_DEBUG}
+TRACE_LEVEL = TRACE_LEVELS.get(str(TRACE_ENABLED).lower(), TRACE_DEBUG)  # SETUPMETA_DEBUG=info shows only main steps
+TRACE_JSON = os.environ.get("SETUPMETA_DEBUG_FORMAT") == "json"  # Emit trace events as JSON lines
 VERSION_FILE = ".setupmeta.version"  # File used to work with projects that are in a subfolder of a git checkout
 SCM_DESCRIBE = "SCM_DESCRIBE"  # Name of env var used as pass-through for cases where git checkout is not available
+EXPORT_FILE = ".setupmeta.env"  # File written by 'setup.py export_env', used instead of querying git when present
+MAX_WORKERS = 4  # Max number of threads used to run independent queries (such as git or network ones) concurrently
 RE_SPACES = re.compile(r"\s+", re.MULTILINE)
 RE_VERSION_COMPONENT = re.compile(r"(\d+|[A-Za-z]+)")
 
@@ -44,14 +58,79 @@ def abort(message):
 
 def warn(message):
     """Issue a warning (coming from setupmeta itself)"""
+    inputs = current_context().inputs
+    if inputs is not None:
+        inputs.warnings.append(message)
+
     warnings.warn(message, stacklevel=2)
 
 
-def trace(message):
-    """Output `message` if tracing is on"""
-    if TRACE_ENABLED:
-        sys.stderr.write(f":: {message}\n")
-        sys.stderr.flush()
+def trace(message, *args, level=TRACE_INFO, **fields):
+    """
+    Output `message` if tracing is on, 'message' is formatted with 'args' only when tracing is on
+
+    Args:
+        message (str): Message to trace, %-style format string when 'args' are given
+        *args: Arguments for 'message', formatted only when message gets emitted (see LazyShort for expensive ones)
+        level (int): Trace level of this message (TRACE_INFO or TRACE_DEBUG)
+        **fields: Extra fields to add to structured (JSON) trace events
+    """
+    if not TRACE_ENABLED or level > TRACE_LEVEL:
+        return
+
+    if args:
+        message = message % args
+
+    if TRACE_JSON:
+        event = {"time": round(time.time(), 6), "level": "debug" if level >= TRACE_DEBUG else "info", "message": message}
+        event.update(fields)
+        TRACE_SINK.write("%s\n" % json.dumps(event, default=str))
+
+    else:
+        TRACE_SINK.write(":: %s\n" % message)
+
+
+class TraceSink:
+    """Buffers trace output, to avoid a write+flush per message (flushed at the end of each evaluation, and at exit)"""
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity  # type: int # Number of buffered messages after which buffer gets flushed
+        self.buffer = []  # type: list[str]
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.buffer.append(text)
+            if len(self.buffer) < self.capacity:
+                return
+
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            text = "".join(self.buffer)
+            self.buffer = []
+
+        if text:
+            sys.stderr.write(text)
+            sys.stderr.flush()
+
+
+TRACE_SINK = TraceSink()
+atexit.register(TRACE_SINK.flush)
+
+
+class LazyShort:
+    """Defers computing short(value) to when (and if) a trace message actually gets emitted"""
+
+    __slots__ = ("c", "value")
+
+    def __init__(self, value, c=None):
+        self.value = value
+        self.c = c
+
+    def __str__(self):
+        return short(self.value, c=self.c)
 
 
 def get_words(text):
@@ -161,6 +240,616 @@ def represented_args(args, separator=" "):
     return separator.join(result)
 
 
+def file_signature(path):
+    """
+    Args:
+        path (str): Path to file
+
+    Returns:
+        (list | None): [mtime_ns, size] of file, None if it doesn't exist
+    """
+    try:
+        st = os.stat(path)
+
+    except OSError:
+        return None
+
+    else:
+        return [st.st_mtime_ns, st.st_size]
+
+
+def folder_signature(path):
+    """
+    Args:
+        path (str): Path to folder
+
+    Returns:
+        (int | None): mtime_ns of folder (changes when entries are added or removed), None if it doesn't exist
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+
+    except OSError:
+        return None
+
+
+def track_file(path):
+    """Record that contents of file 'path' were used to compute current definitions (no-op when not tracking)"""
+    context = current_context()
+    if context.inputs is not None and path not in context.inputs.files:
+        if context.dir_index is not None and not is_file(path):
+            context.inputs.files[path] = None  # No need to stat files that are known to not exist
+            return
+
+        context.inputs.files[path] = file_signature(path)
+
+
+def track_folder(path):
+    """Record that the list of entries in folder 'path' was used to compute current definitions (no-op when not tracking)"""
+    inputs = current_context().inputs
+    if inputs is not None and path not in inputs.folders:
+        inputs.folders[path] = folder_signature(path)
+
+
+def getenv(name, default=None):
+    """Value of env var 'name' in current evaluation context (not tracked as an input, see env_value())"""
+    return current_context().environ.get(name, default)
+
+
+def _env_lookup(name):
+    environ = current_context().environ
+    if name.startswith("*") and name.endswith("*"):
+        candidates = [n for n in environ if name[1:-1] in n]
+
+    elif name.startswith("*"):
+        candidates = [n for n in environ if n.endswith(name[1:])]
+
+    elif name.endswith("*"):
+        candidates = [n for n in environ if n.startswith(name[:-1])]
+
+    else:
+        candidates = [name]
+
+    if candidates:
+        return environ.get(min(candidates))
+
+
+def env_value(name):
+    """
+    Args:
+        name (str): Name of env var to look up, can start and/or end with '*' to look up first (sorted) env var with matching name
+
+    Returns:
+        (str | None): Value of env var, if defined
+    """
+    value = _env_lookup(name)
+    inputs = current_context().inputs
+    if inputs is not None:
+        inputs.env[name] = value
+
+    return value
+
+
+_LOCAL = threading.local()  # Evaluation contexts active in each thread
+
+
+def current_context():
+    """
+    Returns:
+        (EvaluationContext): Evaluation context active in current thread (defaults to the process-wide one)
+    """
+    stack = getattr(_LOCAL, "stack", None)
+    if stack:
+        return stack[-1]
+
+    default = getattr(_LOCAL, "default", None)
+    if default is None:
+        default = _LOCAL.default = ProcessContext()
+
+    return default
+
+
+class EvaluationContext:
+    """
+    Everything the evaluation of one project depends on: its folder, command line and environment,
+    as well as the run-scoped caches used while computing its definitions.
+    Contexts are activated per thread, so that several projects can be evaluated concurrently in one interpreter.
+    """
+
+    def __init__(self, project_dir, argv=None, environ=None, scm_queries=None):
+        """
+        Args:
+            project_dir (str): Path to project folder
+            argv (list[str] | None): Command line to consider (default: none, as in a plain 'setup.py' invocation)
+            environ (dict | None): Env vars to consider (default: a snapshot of os.environ)
+            scm_queries (dict | None): Results of read-only SCM queries, shareable between contexts of projects evaluated in batch
+        """
+        self.project_dir = os.path.abspath(project_dir)
+        self.argv = list(argv) if argv is not None else [os.path.join(self.project_dir, "setup.py")]
+        self.environ = dict(environ) if environ is not None else dict(os.environ)
+        self.scm_queries = scm_queries
+        self.inputs = None  # type: InputTracker # Inputs being tracked while computing definitions, if any
+        self.dir_index = None  # type: DirectoryIndex # Listing of folders consulted while computing definitions, if any
+        self.contents = None  # type: ContentCache # Contents of files read while computing definitions, if any
+        self.timings = None  # type: Timings # Time spent in each phase of the evaluation, if being measured
+
+    def __repr__(self):
+        return "context %s" % short(self.project_dir)
+
+    def __enter__(self):
+        stack = getattr(_LOCAL, "stack", None)
+        if stack is None:
+            stack = _LOCAL.stack = []
+
+        stack.append(self)
+        return self
+
+    def __exit__(self, *_):
+        _LOCAL.stack.pop()
+
+    @property
+    def subprocess_env(self):
+        """Env vars to pass to subprocesses (None: inherit from current process)"""
+        return self.environ
+
+
+class ProcessContext(EvaluationContext):
+    """Default context, when no explicit context is active: project_dir from MetaDefs, sys.argv and os.environ"""
+
+    def __init__(self):
+        # Not calling EvaluationContext.__init__(): project_dir, argv and environ are process-wide here
+        self.scm_queries = None
+        self.inputs = None
+        self.dir_index = None
+        self.contents = None
+        self.timings = None
+
+    @property
+    def project_dir(self):
+        return MetaDefs.project_dir
+
+    @project_dir.setter
+    def project_dir(self, value):
+        MetaDefs.project_dir = value
+
+    @property
+    def argv(self):
+        return sys.argv
+
+    @property
+    def environ(self):
+        return os.environ
+
+    @property
+    def subprocess_env(self):
+        return None
+
+
+class InputTracker:
+    """
+    Keeps track of files, folders and env vars that were consulted while computing definitions.
+    Used to fingerprint cached definitions, see setupmeta.cache
+    """
+
+    def __init__(self):
+        self.files = {}  # type: dict[str, list] # Full path -> file_signature()
+        self.folders = {}  # type: dict[str, int] # Full path -> folder_signature()
+        self.env = {}  # type: dict[str, str] # Env var name (as given to env_value()) -> value
+        self.warnings = []  # type: list[str] # Warnings issued while tracking
+        self.previous = None  # type: InputTracker # Tracker that was active before this one
+
+    def __enter__(self):
+        context = current_context()
+        self.previous = context.inputs
+        context.inputs = self
+        return self
+
+    def __exit__(self, *_):
+        current_context().inputs = self.previous
+
+    def changed_input(self):
+        """
+        Returns:
+            (str | None): Description of first input that changed since it was tracked, if any
+        """
+        for path, signature in self.files.items():
+            if file_signature(path) != signature:
+                return "file %s" % relative_path(path)
+
+        for path, signature in self.folders.items():
+            if folder_signature(path) != signature:
+                return "folder %s" % (relative_path(path) or ".")
+
+        for name, value in self.env.items():
+            if _env_lookup(name) != value:
+                return "env var %s" % name
+
+    def latest_mtime(self):
+        """
+        Returns:
+            (int): Most recent mtime_ns among tracked files and folders
+        """
+        mtimes = [s[0] for s in self.files.values() if s] + [s for s in self.folders.values() if s]
+        return max(mtimes) if mtimes else 0
+
+    def to_dict(self):
+        return {"files": self.files, "folders": self.folders, "env": self.env, "warnings": self.warnings}
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls()
+        result.files = data["files"]
+        result.folders = data["folders"]
+        result.env = data["env"]
+        result.warnings = data["warnings"]
+        return result
+
+
+def folder_entries(folder):
+    """
+    Args:
+        folder (str): Path to folder
+
+    Returns:
+        (dict[str, bool] | None): Entries of 'folder' (name -> True if entry is a folder), None if 'folder' is not a folder
+    """
+    dir_index = current_context().dir_index
+    if dir_index is not None:
+        return dir_index.entries(folder)
+
+    return DirectoryIndex.scanned_entries(folder)
+
+
+def is_file(path):
+    """Same as os.path.isfile(), served from current directory index when there is one"""
+    dir_index = current_context().dir_index
+    if dir_index is None:
+        return os.path.isfile(path)
+
+    return dir_index.kind(path) is False
+
+
+def is_dir(path):
+    """Same as os.path.isdir(), served from current directory index when there is one"""
+    dir_index = current_context().dir_index
+    if dir_index is None:
+        return os.path.isdir(path)
+
+    return dir_index.kind(path) is True
+
+
+def glob_paths(pattern):
+    """Same as sorted(glob.glob(pattern)) for patterns with wildcards in their basename only"""
+    folder, name_pattern = os.path.split(pattern)
+    entries = folder_entries(folder or ".")
+    if not entries:
+        return []
+
+    names = [n for n in entries if not n.startswith(".") or name_pattern.startswith(".")]
+    return sorted(os.path.join(folder, name) for name in fnmatch.filter(names, name_pattern))
+
+
+class DirectoryIndex:
+    """
+    Listing of folders, built with one os.scandir() per folder, and consulted by all file probes done while computing definitions.
+    Probing for a file this way costs one syscall per folder instead of one per probe (stat calls are expensive on network drives)
+    """
+
+    def __init__(self):
+        self.folders = {}  # type: dict[str, dict[str, bool]] # Full path -> scanned_entries()
+        self.probes = 0  # type: int # Number of file probes served
+        self.scandirs = 0  # type: int # Number of os.scandir() calls performed
+        self.previous = None  # type: DirectoryIndex # Index that was active before this one
+
+    def __repr__(self):
+        return "%s probes served by %s scandir calls" % (self.probes, self.scandirs)
+
+    def __enter__(self):
+        context = current_context()
+        self.previous = context.dir_index
+        context.dir_index = self
+        return self
+
+    def __exit__(self, *_):
+        current_context().dir_index = self.previous
+        trace("directory index: %s", self)
+
+    @staticmethod
+    def scanned_entries(folder):
+        try:
+            with os.scandir(folder) as it:
+                return {e.name: e.is_dir() for e in it if e.is_dir() or e.is_file()}
+
+        except OSError:
+            return None
+
+    def entries(self, folder):
+        """
+        Args:
+            folder (str): Path to folder
+
+        Returns:
+            (dict[str, bool] | None): Entries of 'folder' (name -> True if entry is a folder), None if 'folder' is not a folder
+        """
+        folder = os.path.abspath(folder)
+        if folder not in self.folders:
+            self.scandirs += 1
+            self.folders[folder] = self.scanned_entries(folder)
+
+        return self.folders[folder]
+
+    def kind(self, path):
+        """
+        Args:
+            path (str): Path to probe
+
+        Returns:
+            (bool | None): True if 'path' is a folder, False if it's a file, None if it doesn't exist
+        """
+        self.probes += 1
+        path = os.path.abspath(path)
+        folder, name = os.path.split(path)
+        if not name:
+            return os.path.isdir(path) or None  # Root folder
+
+        entries = self.entries(folder)
+        if entries:
+            return entries.get(name)
+
+    def forget(self, path):
+        """Forget listing of folder containing 'path' (to be called when 'path' gets created or deleted)"""
+        self.folders.pop(os.path.dirname(os.path.abspath(path)), None)
+
+
+def file_lines(path):
+    """
+    Args:
+        path (str): Path to file
+
+    Returns:
+        (list[str]): Lines of file (as iterating over a file opened in text mode would yield), served from current content cache if any
+    """
+    contents = current_context().contents
+    if contents is not None:
+        return contents.lines(path)
+
+    with open(path, "rt") as fh:
+        record_read(os.fstat(fh.fileno()).st_size)
+        return list(fh)
+
+
+class ContentCache:
+    """
+    Contents of files read while computing definitions, each file is read once (but re-validated by size and mtime on each access).
+    Files can then be served as bytes, text or lines (README files for example are looked at by several auto-fill steps)
+    """
+
+    def __init__(self):
+        self.files = {}  # type: dict[str, tuple] # Full path -> (file_signature(), bytes)
+        self.decoded = {}  # type: dict[str, str] # Full path -> decoded text
+        self.hits = 0  # type: int # Number of times contents were served from cache
+        self.misses = 0  # type: int # Number of times a file had to be read
+        self.previous = None  # type: ContentCache # Cache that was active before this one
+
+    def __repr__(self):
+        return "%s hits, %s misses" % (self.hits, self.misses)
+
+    def __enter__(self):
+        context = current_context()
+        self.previous = context.contents
+        context.contents = self
+        return self
+
+    def __exit__(self, *_):
+        current_context().contents = self.previous
+        trace("content cache: %s", self)
+
+    def data(self, path):
+        """
+        Args:
+            path (str): Path to file
+
+        Returns:
+            (bytes): Contents of file, raises OSError if file can't be read
+        """
+        path = os.path.abspath(path)
+        signature = file_signature(path)
+        cached = self.files.get(path)
+        if cached is not None and signature is not None and cached[0] == signature:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        self.decoded.pop(path, None)
+        with open(path, "rb") as fh:
+            data = fh.read()
+
+        record_read(len(data))
+        self.files[path] = (signature, data)
+        return data
+
+    def text(self, path):
+        """
+        Args:
+            path (str): Path to file
+
+        Returns:
+            (str): Contents of file, decoded as open(path, "rt") would
+        """
+        data = self.data(path)
+        path = os.path.abspath(path)
+        text = self.decoded.get(path)
+        if text is None:
+            with io.TextIOWrapper(io.BytesIO(data)) as fh:
+                text = fh.read()
+
+            self.decoded[path] = text
+
+        return text
+
+    def lines(self, path):
+        """
+        Args:
+            path (str): Path to file
+
+        Returns:
+            (list[str]): Lines of file, with their line ending (as iterating over a file opened in text mode would yield)
+        """
+        return list(io.StringIO(self.text(path)))
+
+
+class PhaseTiming:
+    """Time spent, subprocesses run and files read during one phase of an evaluation"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0  # type: int # Number of times this phase was entered
+        self.seconds = 0.0  # type: float # Wall time spent in this phase (excluding nested phases)
+        self.programs = 0  # type: int # Number of subprocesses run
+        self.program_seconds = 0.0  # type: float # Wall time spent waiting on subprocesses
+        self.files = 0  # type: int # Number of files read
+        self.bytes = 0  # type: int # Number of bytes read
+
+    def __repr__(self):
+        return "%s: %.1f ms" % (self.name, self.seconds * 1000)
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "seconds": round(self.seconds, 6),
+            "programs": self.programs,
+            "program_seconds": round(self.program_seconds, 6),
+            "files": self.files,
+            "bytes": self.bytes,
+        }
+
+
+class Timings:
+    """
+    Wall time, subprocesses and file reads of each phase of the evaluation of a project (see 'setup.py explain --timings').
+    Time and I/O are attributed to the innermost active phase, anything outside of an explicit phase goes to 'other'.
+    """
+
+    def __init__(self):
+        self.phases = {}  # type: dict[str, PhaseTiming] # Phase name -> timing, in order of first occurrence
+        self.total = 0.0  # type: float # Total wall time spent while these timings were active
+        self.current = None  # type: PhaseTiming # Phase currently being timed
+        self.previous = None  # type: Timings # Timings that were active before this one
+        self.started = None  # type: float
+
+    def __repr__(self):
+        return "%.1f ms in %s phases" % (self.total * 1000, len(self.phases))
+
+    def __enter__(self):
+        context = current_context()
+        self.previous = context.timings
+        context.timings = self
+        self.started = time.perf_counter()
+        self.current = self.timing("other")
+        self.current.calls += 1
+        return self
+
+    def __exit__(self, *_):
+        elapsed = time.perf_counter() - self.started
+        self.total += elapsed
+        self.current.seconds += elapsed
+        self.current = None
+        current_context().timings = self.previous
+
+    def timing(self, name):
+        timing = self.phases.get(name)
+        if timing is None:
+            timing = self.phases[name] = PhaseTiming(name)
+
+        return timing
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager measuring time spent in phase 'name' (time spent in nested phases is not counted twice)"""
+        outer = self.current
+        timing = self.current = self.timing(name)
+        timing.calls += 1
+        started = time.perf_counter()
+        try:
+            yield timing
+
+        finally:
+            elapsed = time.perf_counter() - started
+            timing.seconds += elapsed
+            outer.seconds -= elapsed
+            self.current = outer
+
+    def to_dict(self):
+        return {"total": round(self.total, 6), "phases": {name: timing.to_dict() for name, timing in self.phases.items() if timing.calls}}
+
+    def report(self):
+        """
+        Returns:
+            (list[str]): Table of timings, one line per phase (slowest first)
+        """
+        columns = ("phase", "calls", "ms", "programs", "programs ms", "files", "bytes")
+        rows = []
+        for timing in sorted(self.phases.values(), key=lambda x: -x.seconds):
+            rows.append(
+                (
+                    timing.name,
+                    timing.calls,
+                    "%.1f" % (timing.seconds * 1000),
+                    timing.programs,
+                    "%.1f" % (timing.program_seconds * 1000),
+                    timing.files,
+                    timing.bytes,
+                )
+            )
+
+        phases = self.phases.values()
+        rows.append(
+            (
+                "total",
+                "",
+                "%.1f" % (self.total * 1000),
+                sum(t.programs for t in phases),
+                "%.1f" % (sum(t.program_seconds for t in phases) * 1000),
+                sum(t.files for t in phases),
+                sum(t.bytes for t in phases),
+            )
+        )
+        widths = [max(len(str(row[i])) for row in [columns, *rows]) for i in range(len(columns))]
+        form = "  ".join("%%-%ss" % w if i == 0 else "%%%ss" % w for i, w in enumerate(widths))
+        return [form % columns] + [form % row for row in rows]
+
+
+def timed_phase(name):
+    """
+    Args:
+        name (str): Name of phase to time
+
+    Returns:
+        Context manager measuring time spent in phase 'name', if timings are being measured in current context
+    """
+    timings = current_context().timings
+    if timings is None:
+        return contextlib.nullcontext()
+
+    return timings.phase(name)
+
+
+def record_program(elapsed):
+    """Account for one subprocess that ran for 'elapsed' seconds"""
+    timings = current_context().timings
+    if timings is not None:
+        timings.current.programs += 1
+        timings.current.program_seconds += elapsed
+
+
+def record_read(size):
+    """Account for one file read of 'size' bytes"""
+    timings = current_context().timings
+    if timings is not None:
+        timings.current.files += 1
+        timings.current.bytes += size
+
+
 class FullPathCache:
     """Used to find and trace full paths to programs once."""
 
@@ -171,7 +860,7 @@ class FullPathCache:
         if program not in self.cache:
             full_path = shutil.which(program)
             self.cache[program] = full_path
-            trace(f"Full path for {program}: {full_path or '-not installed-'}")
+            trace("Full path for %s: %s", program, full_path or "-not installed-")
 
         return self.cache[program]
 
@@ -198,6 +887,9 @@ class RunResult:
             sys.stderr.write(f"{self.represented_args} exited with code {self.returncode}:\n{self.stderr or '-no stderr-'}\n")
             sys.exit(self.returncode)
 
+    def __str__(self):
+        return self.trace_message()
+
     def trace_message(self):
         trace_msg = f"{self.represented_args} exited with code: {self.returncode}"
         if self.stdout:
@@ -243,16 +935,120 @@ def run_program(program, *args, announce=False, cwd=None, dryrun=False, env=None
         return result
 
     if not announce:
-        trace(f"Running: {result.represented_args}")
+        trace("Running: %s", result.represented_args)
 
+    started = time.perf_counter()
     r = subprocess.run(result.full_args, capture_output=True, cwd=cwd, env=env, text=True)  # noqa: S603
+    record_program(time.perf_counter() - started)
     result.returncode = r.returncode
     result.stdout = r.stdout.rstrip()
     result.stderr = r.stderr.rstrip()
-    trace(result.trace_message())
+    trace("%s", result, program=program, returncode=result.returncode)
     return result
 
 
+def concurrently(*funcs):
+    """
+    Args:
+        *funcs (callable): Independent functions to call (typically running programs, or doing network queries)
+
+    Returns:
+        (list): Results of each function, in the same order as 'funcs', first exception raised (if any) is re-raised
+    """
+    if len(funcs) < 2:
+        return [func() for func in funcs]
+
+    import concurrent.futures
+
+    context = current_context()
+
+    def run(func):
+        with context:  # Evaluation context of caller applies to worker threads as well
+            return func()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(funcs), MAX_WORKERS)) as executor:
+        futures = [executor.submit(run, func) for func in funcs]
+        return [future.result() for future in futures]
+
+
+@contextlib.contextmanager
+def folder_lock(folder):
+    """
+    Advisory exclusive lock on 'folder' (no lock file is created), serializes concurrent writers (such as parallel builds)
+    Lock is not taken on platforms without flock() (writes done via atomic_write() remain safe for readers there)
+
+    Args:
+        folder (str): Folder to lock
+    """
+    fd = None
+    try:
+        import fcntl
+
+        fd = os.open(folder, os.O_RDONLY)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    except (ImportError, OSError) as e:
+        trace("could not lock %s: %s", folder, e)
+
+    try:
+        yield
+
+    finally:
+        if fd is not None:
+            os.close(fd)  # Releases lock
+
+
+def atomic_write(path, text):
+    """
+    Write 'text' to 'path', readers see either previous or new contents (never a partially written file)
+    Permissions of 'path' are preserved, a new file gets the same permissions as with a regular open() (as per umask)
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+
+    except OSError:
+        mode = None
+
+    temp_path = os.path.join(os.path.dirname(path), ".tmp-%s" % os.urandom(8).hex())
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)  # Unlike tempfile.mkstemp(): mode 0o600
+    try:
+        with os.fdopen(fd, "w") as fh:
+            fh.write(text)
+
+        if mode is not None:
+            os.chmod(temp_path, mode)
+
+        os.replace(temp_path, path)
+
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+
+        raise
+
+
+def write_if_changed(path, text):
+    """
+    Args:
+        path (str): Path to file to write
+        text (str): Contents to write, atomically (see atomic_write()), and only if they differ from current contents of 'path'
+
+    Returns:
+        (bool): True if file was written, False if it already had the expected contents (its mtime is left untouched then)
+    """
+    with folder_lock(os.path.dirname(path) or "."):
+        try:
+            with open(path) as fh:
+                if fh.read() == text:
+                    return False
+
+        except (OSError, UnicodeDecodeError):
+            pass
+
+        atomic_write(path, text)
+        return True
+
+
 def quoted(text):
     """Quoted text, with single or double-quotes"""
     if text:
@@ -322,12 +1118,13 @@ def listify(text, separator=None):
 
 def project_path(*relative_paths):
     """Full path corresponding to 'relative_paths' components"""
-    return os.path.join(MetaDefs.project_dir, *relative_paths)
+    return os.path.join(current_context().project_dir, *relative_paths)
 
 
 def relative_path(full_path):
     """Relative path to current project_dir"""
-    return full_path[len(MetaDefs.project_dir) + 1 :] if full_path and full_path.startswith(MetaDefs.project_dir) else full_path
+    project_dir = current_context().project_dir
+    return full_path[len(project_dir) + 1 :] if full_path and full_path.startswith(project_dir) else full_path
 
 
 def readlines(relative_path, limit=0):
@@ -335,15 +1132,18 @@ def readlines(relative_path, limit=0):
         try:
             result = []
             full_path = project_path(relative_path)
-            with open(full_path, "rt") as fh:
-                for line in fh:
-                    limit -= 1
-                    if limit == 0:
-                        break
+            track_file(full_path)
+            if current_context().dir_index is not None and not is_file(full_path):
+                return None
+
+            for line in file_lines(full_path):
+                limit -= 1
+                if limit == 0:
+                    break
 
-                    result.append(line)
+                result.append(line)
 
-            trace("read %s lines from %s" % (len(result), relative_path))
+            trace("read %s lines from %s", len(result), relative_path, level=TRACE_DEBUG)
 
         except IOError:
             return None
@@ -474,7 +1274,7 @@ class ReqEntry(object):
                     name = m.group(1)
                     spec = m.group(3)
                     self.requirement = name if not spec else "%s%s" % (name, spec)
-                    trace("  abstracted [%s] -> [%s]" % (prev, self.requirement))
+                    trace("  abstracted [%s] -> [%s]", prev, self.requirement, level=TRACE_DEBUG)
                     self.abstracted = True
 
     def __repr__(self):
@@ -548,7 +1348,7 @@ def iterate_req_txt(seen, parent, source_path, lines):
 
                 continue
 
-            trace("  req entry: %s" % req_entry)
+            trace("  req entry: %s", req_entry, level=TRACE_DEBUG)
             if req_entry.refers and req_entry.refers not in seen:
                 seen.add(req_entry.refers)
                 for r in iterate_req_txt(seen, parent, req_entry.refers, readlines(req_entry.refers)):
@@ -630,9 +1430,10 @@ def find_requirements(*relative_paths):
     for path in relative_paths:
         if path:
             path = project_path(path)
-            if os.path.isfile(path):
+            track_folder(os.path.dirname(path))
+            if is_file(path):
                 do_abstract = not path.endswith(".in")
-                trace("found requirements: %s %s" % (path, " (auto-abstracted)" if do_abstract else ""))
+                trace("found requirements: %s %s", path, " (auto-abstracted)" if do_abstract else "")
                 r = RequirementsFile.from_file(path, do_abstract=do_abstract)
                 if r is not None:
                     return r
@@ -714,7 +1515,7 @@ class MetaDefs:
     # Our own commands (populated by @MetaCommand decorator)
     commands = []
 
-    # Determined project directory
+    # Determined project directory (when no explicit evaluation context is active, see current_context())
     project_dir = os.getcwd()
 
     # Fields that setuptools expects in `dist.metadata`
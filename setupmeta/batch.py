@@ -0,0 +1,197 @@
+"""
+Evaluate many projects in one go, for example all setupmeta projects of a monorepo
+
+Usage:
+    python -m setupmeta.batch [--jobs N] PROJECT_DIR...
+
+Outputs one JSON line per project, with resolved definitions and where they came from, and time spent evaluating them.
+Projects are spread over a process pool, git queries are done once per checkout and shared with all workers.
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import contextlib
+import json
+import os
+import sys
+import warnings
+
+import setupmeta
+from setupmeta.model import evaluated_project
+from setupmeta.versioning import find_scm_root
+
+
+def setup_py_attrs(project_dir):
+    """
+    Args:
+        project_dir (str): Path to project folder
+
+    Returns:
+        (dict, list[str]): Attributes passed to setup() in project's setup.py that are literals, and names of those that are not
+    """
+    path = os.path.join(project_dir, "setup.py")
+    try:
+        with open(path) as fh:
+            tree = ast.parse(fh.read(), filename=path)
+
+    except (OSError, SyntaxError, ValueError):
+        return {}, []
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = getattr(node.func, "id", None) or getattr(node.func, "attr", None)
+            if name == "setup":
+                result = {}
+                non_literal = []
+                for keyword in node.keywords:
+                    if keyword.arg:
+                        try:
+                            result[keyword.arg] = ast.literal_eval(keyword.value)
+
+                        except ValueError:
+                            setupmeta.trace("ignoring non-literal setup() attribute '%s' in %s", keyword.arg, path)
+                            non_literal.append(keyword.arg)
+
+                return result, non_literal
+
+    return {}, []
+
+
+def project_entry(project_dir, scm_queries=None):
+    """
+    Args:
+        project_dir (str): Path to project folder
+        scm_queries (dict | None): Results of read-only SCM queries, shared between projects of the same checkout
+
+    Returns:
+        (dict): JSON-serializable resolved definitions of project, with their provenance
+    """
+    entry = {"project": project_dir}
+    if not os.path.isdir(project_dir):
+        entry["error"] = "not a folder"
+        return entry
+
+    attrs, non_literal = setup_py_attrs(project_dir)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        if non_literal:
+            # Batch mode doesn't run setup.py, its output would silently differ from 'python setup.py' for these
+            setupmeta.warn("setup() attributes ignored, as they are not literals: %s" % ", ".join(non_literal))
+
+        try:
+            meta = evaluated_project(project_dir, attrs=attrs, scm_queries=scm_queries)
+            entry["definitions"] = {
+                d.key: {"value": d.value, "sources": [[s.source, s.value] for s in d.sources]}
+                for d in sorted(meta.definitions.values())
+                if d.is_meaningful
+            }
+            entry["timings"] = meta.timings.to_dict()
+
+        except (setupmeta.UsageError, OSError, ValueError, SystemExit) as e:  # Report problem with this project, keep going with others
+            entry["error"] = str(e) or e.__class__.__name__
+
+    if caught:
+        entry["warnings"] = [str(w.message) for w in caught]
+
+    return entry
+
+
+def evaluated_chunk(project_dirs, scm_queries=None):
+    """
+    Evaluate 'project_dirs' (from the same checkout), sharing git queries (runs in worker process)
+
+    Args:
+        project_dirs (list[str]): Full paths to project folders
+        scm_queries (dict | None): Results of git queries already done for this checkout, if any
+
+    Returns:
+        (list[dict], dict): Entries of each project (see project_entry()), and git queries done for this checkout
+    """
+    scm_queries = {} if scm_queries is None else scm_queries
+    return [project_entry(project_dir, scm_queries=scm_queries) for project_dir in project_dirs], scm_queries
+
+
+def grouped_by_checkout(project_dirs):
+    """
+    Args:
+        project_dirs (list[str]): Full paths to project folders
+
+    Returns:
+        (list[list[str]]): Projects grouped by git checkout
+    """
+    groups = {}
+    for project_dir in project_dirs:
+        groups.setdefault(find_scm_root(project_dir, ".git"), []).append(project_dir)
+
+    return list(groups.values())
+
+
+def chunked(project_dirs, jobs):
+    """
+    Args:
+        project_dirs (list[str]): Full paths to project folders (from the same checkout)
+        jobs (int): Number of worker processes
+
+    Returns:
+        (list[list[str]]): 'project_dirs' split in up to 'jobs' chunks
+    """
+    size = max(1, -(-len(project_dirs) // jobs))  # Ceiling division
+    return [project_dirs[i : i + size] for i in range(0, len(project_dirs), size)]
+
+
+def batch_entries(project_dirs, jobs=None):
+    """
+    Args:
+        project_dirs (list[str]): Paths to project folders
+        jobs (int | None): Number of worker processes (default: number of CPUs), 1 to evaluate in current process
+
+    Yields:
+        (dict): Resolved definitions of each project (see project_entry()), in the same order as 'project_dirs'
+    """
+    project_dirs = [os.path.abspath(p) for p in project_dirs]
+    jobs = jobs or os.cpu_count() or 1
+    groups = grouped_by_checkout(project_dirs)
+    entries = {}
+    with contextlib.ExitStack() as stack:
+        evaluate = map
+        if jobs > 1 and len(project_dirs) > 1:
+            executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=jobs))
+            evaluate = executor.map
+
+        # First project of each checkout is evaluated on its own, its git queries are then reused by all chunks of that checkout
+        seeds = []
+        for chunk_entries, scm_queries in evaluate(evaluated_chunk, [group[:1] for group in groups]):
+            entries.update((entry["project"], entry) for entry in chunk_entries)
+            seeds.append(scm_queries)
+
+        chunks = []
+        chunk_seeds = []
+        for i, group in enumerate(groups):
+            for chunk in chunked(group[1:], jobs):
+                chunks.append(chunk)
+                chunk_seeds.append(seeds[i])
+
+        for chunk_entries, _ in evaluate(evaluated_chunk, chunks, chunk_seeds):
+            entries.update((entry["project"], entry) for entry in chunk_entries)
+
+    for project_dir in project_dirs:
+        yield entries[project_dir]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m setupmeta.batch", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("projects", nargs="+", help="Folders of projects to evaluate")
+    args = parser.parse_args(args)
+    failed = False
+    for entry in batch_entries(args.projects, jobs=args.jobs):
+        failed = failed or "error" in entry
+        sys.stdout.write("%s\n" % json.dumps(entry, sort_keys=True, default=str))
+
+    sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
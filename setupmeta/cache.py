@@ -0,0 +1,508 @@
+"""
+Persistent cache of resolved definitions
+
+pip and other build frontends invoke setup.py several times per build (egg_info, dist_info, bdist_wheel...),
+cached definitions allow to skip the whole auto-fill pipeline when none of its inputs changed.
+
+Cached definitions are fingerprinted with:
+- the explicit attributes given to setup()
+- signature (mtime + size) of all files that were read, and of all folders that were scanned
+- env vars that were consulted
+- state of the SCM (git HEAD, index, tags)
+
+Results of git queries used to determine version (git describe etc) are also cached, see VersionCache,
+as well as an index of tags (see TagIndex), which allows to find the most recent version tag without 'git describe',
+and path-scoped commit distances (see DistanceCache), extended incrementally as new commits are made.
+
+Cache is stored under .git/setupmeta/ by default, set env var SETUPMETA_CACHE to:
+- 0 (or false, off, no) to disable caching
+- a path to a folder to use as cache location
+"""
+
+import bisect
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+
+import setupmeta
+
+CACHE_FORMAT = 1
+MAX_DISTANCE_ENTRIES = 64  # Max number of HEAD commits remembered per (version tag, path) in distance cache
+MAX_CHANGED_TAGS = 256  # Rebuild tag index from scratch when more tags than this changed since last update
+MAX_VERSION_ENTRIES = 64  # Max number of entries kept in version cache (one per HEAD commit + tags state)
+RACY_SECONDS = 2  # Don't cache definitions computed from files modified this recently (mtime granularity can be coarse)
+DISABLED = {"0", "false", "off", "no"}
+
+
+def is_json_native(value):
+    """
+    Args:
+        value: Value to inspect
+
+    Returns:
+        (bool): True if 'value' survives a json round-trip unchanged
+    """
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return True
+
+    if isinstance(value, list):
+        return all(is_json_native(v) for v in value)
+
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and is_json_native(v) for k, v in value.items())
+
+    return False
+
+
+def code_fingerprint():
+    """
+    Returns:
+        (list): Signatures of setupmeta's own modules, so that upgrading setupmeta invalidates cached definitions
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    return sorted([e.name, setupmeta.file_signature(e.path)] for e in os.scandir(folder) if e.name.endswith(".py"))
+
+
+def cache_folder(scm):
+    """
+    Args:
+        scm (setupmeta.scm.Scm | None): SCM of project
+
+    Returns:
+        (str | None): Folder where to store cached definitions, if any
+    """
+    configured = setupmeta.getenv("SETUPMETA_CACHE")
+    if configured:
+        return None if configured.lower() in DISABLED else os.path.abspath(os.path.expanduser(configured))
+
+    common_dir = getattr(scm, "common_dir", None)
+    if common_dir and os.path.isdir(common_dir):
+        return os.path.join(common_dir, "setupmeta")
+
+
+class MetaCache:
+    """Persisted definitions of one project"""
+
+    def __init__(self, project_dir, attrs, scm):
+        """
+        Args:
+            project_dir (str): Path to project folder
+            attrs (dict): Explicit attributes given to setup()
+            scm (setupmeta.scm.Scm | None): SCM of project
+        """
+        self.project_dir = project_dir
+        self.scm = scm
+        self.path = None  # type: str # Path to file holding the cache
+        self.served = False  # type: bool # True if definitions were served from cache
+        self.status = None  # type: str # Human friendly reason why definitions were (or were not) served from cache
+        self.attrs_hash = is_json_native(attrs) and hashlib.sha256(json.dumps(attrs, sort_keys=True).encode()).hexdigest()
+        folder = cache_folder(scm)
+        if not folder:
+            self.status = "cache disabled" if setupmeta.getenv("SETUPMETA_CACHE") else "no cache location (project not in a git checkout)"
+
+        elif not self.attrs_hash:
+            self.status = "setup() attributes are not cacheable"
+
+        else:
+            name = hashlib.sha256(project_dir.encode()).hexdigest()[:16]
+            self.path = os.path.join(folder, "meta-%s.json" % name)
+
+    def __repr__(self):
+        return self.status or "-no status-"
+
+    def scm_fingerprint(self):
+        if self.scm is not None:
+            return {"name": self.scm.name, "state": self.scm.fingerprint()}
+
+    def load(self):
+        """
+        Returns:
+            (dict | None): Cached entry, if it is still valid
+        """
+        if not self.path:
+            return None
+
+        try:
+            with open(self.path) as fh:
+                entry = json.load(fh)
+
+        except (OSError, ValueError):
+            self.status = "no cached definitions yet"
+            return None
+
+        if entry.get("format") != CACHE_FORMAT or entry.get("code") != code_fingerprint():
+            self.status = "setupmeta itself changed"
+            return None
+
+        if entry.get("attrs") != self.attrs_hash:
+            self.status = "setup() attributes changed"
+            return None
+
+        if entry.get("scm") != self.scm_fingerprint():
+            self.status = "%s state changed" % (self.scm and self.scm.name)
+            return None
+
+        changed = setupmeta.InputTracker.from_dict(entry["inputs"]).changed_input()
+        if changed:
+            self.status = "%s changed" % changed
+            return None
+
+        if "dirty" in entry and bool(self.scm.is_dirty()) != entry["dirty"]:
+            self.status = "checkout dirtiness changed"
+            return None
+
+        return entry
+
+    def restore(self, meta):
+        """
+        Args:
+            meta (setupmeta.model.SetupMeta): Meta object to fill with cached definitions
+
+        Returns:
+            (bool): True if definitions were served from cache
+        """
+        entry = self.load()
+        if entry is None:
+            setupmeta.trace("not using cached definitions: %s", self.status)
+            return False
+
+        from setupmeta.model import Definition, DefinitionEntry
+
+        meta.definitions = {}
+        for key, value, sources in entry["definitions"]:
+            definition = Definition(key)
+            definition.value = value
+            definition.sources = [DefinitionEntry(*source) for source in sources]
+            meta.definitions[key] = definition
+
+        for message in entry["inputs"]["warnings"]:
+            setupmeta.warn(message)
+
+        self.served = True
+        self.status = "served from %s" % setupmeta.short(self.path)
+        setupmeta.trace("definitions %s", self.status)
+        return True
+
+    def store(self, meta, inputs):
+        """
+        Args:
+            meta (setupmeta.model.SetupMeta): Meta object with freshly computed definitions
+            inputs (setupmeta.InputTracker): Inputs that were used to compute definitions
+        """
+        if not self.path:
+            return
+
+        definitions = []
+        for definition in meta.definitions.values():
+            sources = [[s.key, s.value, s.source] for s in definition.sources]
+            definitions.append([definition.key, definition.value, sources])
+
+        if not is_json_native(definitions):
+            self.status = "%s, definitions are not cacheable" % self.status
+            return
+
+        if inputs.latest_mtime() > (time.time() - RACY_SECONDS) * 1e9:
+            self.status = "%s, inputs were modified too recently to be cached" % self.status
+            return
+
+        entry = {
+            "attrs": self.attrs_hash,
+            "code": code_fingerprint(),
+            "definitions": definitions,
+            "format": CACHE_FORMAT,
+            "inputs": inputs.to_dict(),
+            "scm": self.scm_fingerprint(),
+        }
+        versioning = meta.versioning
+        if versioning and versioning.enabled and not versioning.problem and versioning.scm_version is not None:
+            entry["dirty"] = bool(versioning.scm_version.dirty)
+
+        try:
+            atomic_json_dump(entry, self.path)
+            setupmeta.trace("stored definitions in %s", self.path)
+
+        except OSError as e:
+            setupmeta.trace("could not store definitions in %s: %s", self.path, e)
+
+
+def atomic_json_dump(data, path):
+    """Write 'data' as json to 'path', readers see either previous or new contents (never a partially written file)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    setupmeta.atomic_write(path, json.dumps(data))  # json.dumps() uses C encoder, json.dump() doesn't
+
+
+class VersionCache:
+    """
+    Results of git queries determining version at a given HEAD (such as 'git describe' output).
+    Entries are keyed by everything those queries depend on: HEAD commit, tags, version tag patterns and pack files
+    (abbreviated commit ids get longer as repo grows). Dirtiness is not cached: it depends on the whole working tree.
+    """
+
+    def __init__(self, folder, key):
+        """
+        Args:
+            folder (str | None): Folder where to store cache (None: caching disabled)
+            key (dict): State the cached queries depend on
+        """
+        self.path = folder and os.path.join(folder, "versions.json")
+        self.key = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        self._entries = None
+
+    def __repr__(self):
+        return "version cache %s" % (setupmeta.short(self.path) if self.path else "disabled")
+
+    @property
+    def entries(self):
+        """
+        Returns:
+            (dict): Cached entries, by key
+        """
+        if self._entries is None:
+            self._entries = {}
+            if self.path:
+                try:
+                    with open(self.path) as fh:
+                        data = json.load(fh)
+
+                    if data.get("format") == CACHE_FORMAT:
+                        self._entries = data["entries"]
+
+                except (OSError, ValueError, KeyError, AttributeError):
+                    pass
+
+        return self._entries
+
+    def get(self, name):
+        """
+        Args:
+            name (str): Name of cached query
+
+        Returns:
+            Cached result of query, None if not cached
+        """
+        value = self.entries.get(self.key, {}).get(name)
+        if value is not None:
+            setupmeta.trace("%s served from %s", name, self)
+
+        return value
+
+    def set(self, name, value):
+        """
+        Args:
+            name (str): Name of query
+            value: Result of query (json serializable)
+        """
+        if not self.path:
+            return
+
+        entries = self.entries
+        entry = entries.pop(self.key, {})
+        entry[name] = value
+        entries[self.key] = entry  # Most recently used entries are last
+        for key in list(entries)[:-MAX_VERSION_ENTRIES]:
+            del entries[key]
+
+        try:
+            atomic_json_dump({"format": CACHE_FORMAT, "entries": entries}, self.path)
+
+        except OSError as e:
+            setupmeta.trace("could not store %s in %s: %s", name, self, e)
+
+
+class DistanceCache:
+    """
+    Number of first-parent commits since a version tag that touched a given path (project folder in a monorepo), by HEAD commit.
+    Allows to extend distance incrementally from a previously seen HEAD, instead of walking the whole path-filtered history again.
+    """
+
+    def __init__(self, folder, base, path):
+        """
+        Args:
+            folder (str | None): Folder where to store cache (None: caching disabled)
+            base (str | None): Commit id of version tag distance is counted from (None: counted from root commit)
+            path (str): Path (relative to checkout root) commits must touch to be counted
+        """
+        self.path = folder and os.path.join(folder, "distances.json")
+        self.key = "%s:%s" % (base or "", path)
+        self._entries = None
+
+    def __repr__(self):
+        return "distance cache %s" % (setupmeta.short(self.path) if self.path else "disabled")
+
+    @property
+    def entries(self):
+        """
+        Returns:
+            (dict): Cached distances, by (tag, path) key, then by HEAD commit
+        """
+        if self._entries is None:
+            self._entries = {}
+            if self.path:
+                try:
+                    with open(self.path) as fh:
+                        data = json.load(fh)
+
+                    if data.get("format") == CACHE_FORMAT:
+                        self._entries = data["entries"]
+
+                except (OSError, ValueError, KeyError, AttributeError):
+                    pass
+
+        return self._entries
+
+    @property
+    def heads(self):
+        """
+        Returns:
+            (dict[str, int]): Distance by HEAD commit, for version tag and path of this cache
+        """
+        return self.entries.get(self.key, {})
+
+    def set(self, head, distance):
+        """
+        Args:
+            head (str): HEAD commit id
+            distance (int): Number of first-parent commits between version tag and 'head' that touched path
+        """
+        if not self.path:
+            return
+
+        entries = self.entries
+        heads = entries.pop(self.key, {})
+        heads.pop(head, None)
+        heads[head] = distance  # Most recently used entries are last
+        for key in list(heads)[:-MAX_DISTANCE_ENTRIES]:
+            del heads[key]
+
+        entries[self.key] = heads
+        for key in list(entries)[:-MAX_DISTANCE_ENTRIES]:
+            del entries[key]
+
+        try:
+            atomic_json_dump({"format": CACHE_FORMAT, "entries": entries}, self.path)
+
+        except OSError as e:
+            setupmeta.trace("could not store distance in %s: %s", self, e)
+
+
+def version_key(name):
+    """
+    Args:
+        name (str): Tag name
+
+    Returns:
+        (list | None): Sortable [major, minor, patch, extra] if 'name' looks like a version tag (such as 'v1.2.3'), None otherwise
+    """
+    name = name.rpartition("/")[2]
+    if name.startswith("v"):
+        return list(setupmeta.version_components(name[1:])[:4])
+
+    if name[:1].isdigit():
+        return list(setupmeta.version_components(name)[:4])
+
+
+class TagIndex:
+    """
+    Tags of a git repository, with the commit each one points to, and version tags sorted by version.
+    Persisted, and kept up to date incrementally: only tag refs that changed since last time are queried again.
+    """
+
+    def __init__(self, folder):
+        """
+        Args:
+            folder (str | None): Folder where to store index (None: index is not persisted)
+        """
+        self.path = folder and os.path.join(folder, "tags.json")
+        self.fingerprint = None  # type: list # Fingerprint of tag refs as of last update (see Git.refs_fingerprint())
+        self.tags = {}  # type: dict # Tag name -> [commit id, id of object tag points to (None if same as commit), is annotated, tagger date]
+        self.versions = []  # type: list # [major, minor, patch, extra, name] of tags that look like versions, sorted by version
+        try:
+            with open(self.path or "") as fh:
+                data = json.load(fh)
+
+            if data.get("format") == CACHE_FORMAT:
+                self.fingerprint = data["fingerprint"]
+                self.tags = data["tags"]
+                self.versions = data["versions"]
+
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def __repr__(self):
+        return "tag index %s (%s tags)" % (setupmeta.short(self.path) if self.path else "in memory", len(self.tags))
+
+    def changed_names(self, fingerprint):
+        """
+        Args:
+            fingerprint (list): Current fingerprint of tag refs
+
+        Returns:
+            (set[str] | None): Names of tags that were added, modified or removed since last update, None if index must be rebuilt
+        """
+        if not self.fingerprint or self.fingerprint[0] != fingerprint[0]:
+            return None  # First use, or 'packed-refs' changed (gc, fetch...)
+
+        previous = dict(self.fingerprint[1:])
+        current = dict(fingerprint[1:])
+        changed = {name for name in previous.keys() | current.keys() if previous.get(name) != current.get(name)}
+        if len(changed) <= MAX_CHANGED_TAGS:
+            return changed
+
+    def update(self, fingerprint, tags, names=None):
+        """
+        Args:
+            fingerprint (list): Fingerprint of tag refs, taken before 'tags' were queried
+            tags (dict): Tag name -> [commit id, target id, is annotated, tagger date], as queried from git
+            names (set[str] | None): Names of tags that were queried (None: 'tags' holds all tags)
+        """
+        if names is None:
+            self.tags = tags
+            self.versions = sorted(key + [name] for name, key in ((n, version_key(n)) for n in tags) if key)
+
+        else:
+            for name in names | tags.keys():
+                if name in self.tags:
+                    del self.tags[name]
+                    key = version_key(name)
+                    if key:
+                        self.versions.remove(key + [name])
+
+                if name in tags:
+                    self.tags[name] = tags[name]
+                    key = version_key(name)
+                    if key:
+                        bisect.insort(self.versions, key + [name])
+
+        self.fingerprint = fingerprint
+        setupmeta.trace("%s: %s", self, "rebuilt" if names is None else "updated %s tag(s)" % len(names))
+        if not self.path:
+            return
+
+        try:
+            atomic_json_dump({"format": CACHE_FORMAT, "fingerprint": fingerprint, "tags": self.tags, "versions": self.versions}, self.path)
+
+        except OSError as e:
+            setupmeta.trace("could not store %s: %s", self, e)
+
+    def tagged_commits(self, pattern):
+        """
+        Args:
+            pattern (str): Glob pattern tag names must match (as in 'git describe --match')
+
+        Returns:
+            (dict[str, str]): Commit id -> name of tag git describe would pick for that commit
+        """
+        best = {}
+        matches = re.compile(fnmatch.translate(pattern)).match
+        for name in sorted(name for name in self.tags if matches(name)):  # git iterates over refs sorted by name, keeps first on ties
+            commit, _, annotated, date = self.tags[name]
+            if commit:
+                current = best.get(commit)
+                # Annotated tags win over lightweight ones, git picks the most recent one when several annotated tags are on a commit
+                if current is None or (annotated and (not current[1] or current[2] < date)):
+                    best[commit] = (name, annotated, date)
+
+        return {commit: entry[0] for commit, entry in best.items()}
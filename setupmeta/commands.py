@@ -2,6 +2,8 @@
 Commands contributed by setupmeta
 """
 
+import json
+import sys
 from distutils.command.check import check as check_cmd
 
 import setuptools
@@ -84,6 +86,7 @@ class VersionCommand(setuptools.Command):
     user_options = [
         ("bump=", "b", "bump specified part of version"),
         ("commit", "c", "commit bump"),
+        ("log=", "l", "show version of each commit in first-parent history of given ref ('-': of refs given on stdin), as JSON lines"),
         ("push", None, "push version bump"),
         ("show-next=", "a", "show what the next bump of the specified part of version will be"),
         ("simulate-branch=", "s", "simulate branch name (useful for testing)"),
@@ -92,6 +95,7 @@ class VersionCommand(setuptools.Command):
     def initialize_options(self):
         self.bump = None
         self.commit = 0
+        self.log = None
         self.push = 0
         self.simulate_branch = None
         self.show_next = None
@@ -110,6 +114,13 @@ class VersionCommand(setuptools.Command):
             elif self.bump:
                 self.setupmeta.versioning.bump(self.bump, commit=self.commit, push=self.push, simulate_branch=self.simulate_branch)
 
+            elif self.log:
+                refs = [line.strip() for line in sys.stdin if line.strip()] if self.log == "-" else None
+                for entry in self.setupmeta.versioning.version_log(refs=refs, rev=self.log):
+                    sys.stdout.write("%s\n" % json.dumps(entry, sort_keys=True))
+
+                sys.stdout.flush()
+
             else:
                 print(self.setupmeta.version)
 
@@ -119,21 +130,64 @@ class VersionCommand(setuptools.Command):
             raise SetupError(e) from None
 
 
+@MetaCommand
+class ExportEnvCommand(setuptools.Command):
+    """export version info determined from git, for later (CI) steps to reuse without querying git"""
+
+    user_options = [
+        ("format=", "f", "format to use: dotenv (default, can be sourced by shell too) or json"),
+        ("output=", "o", "file to write to (default: %s in project folder, '-' for stdout)" % setupmeta.EXPORT_FILE),
+    ]
+
+    def initialize_options(self):
+        self.format = None
+        self.output = None
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        if not self.setupmeta:
+            return
+
+        from setupmeta.scm import exported_text
+
+        try:
+            output = self.output or setupmeta.project_path(setupmeta.EXPORT_FILE)
+            fmt = self.format or ("json" if output.endswith(".json") else "dotenv")
+            text = exported_text(self.setupmeta.versioning.exported_values(), fmt=fmt)
+            if output == "-":
+                sys.stdout.write(text)
+                return
+
+            setupmeta.atomic_write(output, text)  # Parallel CI steps reading exported values never see a partially written file
+            print("Exported version %s to %s" % (self.setupmeta.version, setupmeta.short(output)))
+
+        except setupmeta.UsageError as e:
+            from setuptools.errors import SetupError
+
+            raise SetupError(e) from None
+
+
 @MetaCommand
 class ExplainCommand(setuptools.Command):
     """Show a report of where key/values setup(attr) come from"""
 
     user_options = [
+        ("cached", None, "show whether definitions were served from setupmeta's cache"),
         ("dependencies", "d", "show auto-filled dependencies"),
         ("expand", "x", "show expanded setup.py, as it would be without setupmeta"),
         ("recommend", "r", "show more recommendations"),
+        ("timings", None, "show time spent in each phase of setupmeta's evaluation, subprocesses run and files read"),
         ("chars=", "c", "max chars to show"),
     ]
 
     def initialize_options(self):
+        self.cached = False
         self.dependencies = False
         self.expand = False
         self.recommend = False
+        self.timings = False
         self.chars = setupmeta.Console.columns()
 
     def finalize_options(self):
@@ -262,6 +316,22 @@ class ExplainCommand(setuptools.Command):
         if self.dependencies:
             return self.show_dependencies()
 
+        if self.cached:
+            cache = self.setupmeta.cache
+            if cache and cache.served:
+                print("Definitions %s" % cache.status)
+
+            else:
+                print("Definitions computed, not served from cache: %s" % (cache.status if cache else "cache not applicable"))
+
+            return
+
+        if self.timings:
+            for line in self.setupmeta.timings.report():
+                print(line)
+
+            return
+
         self.chars = setupmeta.to_int(self.chars, default=setupmeta.Console.columns())
 
         definitions = self.setupmeta.definitions
@@ -2,7 +2,6 @@
 Functionality related to interacting with project and distutils content
 """
 
-import glob
 import os
 import re
 
@@ -65,7 +64,8 @@ def resolved_paths(relative_paths):
         # De-dupe and respect order (especially for globbed paths)
         if "*" in path:
             full_path = setupmeta.project_path(path)
-            for expanded in sorted(glob.glob(full_path)):
+            setupmeta.track_folder(os.path.dirname(full_path))
+            for expanded in setupmeta.glob_paths(full_path):
                 relative_path = os.path.basename(expanded)
                 if relative_path not in candidates:
                     candidates.append(relative_path)
@@ -0,0 +1,999 @@
+"""
+Read-only access to a .git folder, without spawning git
+
+Allows to compute what 'git describe --tags --long --first-parent --match ...' would output, in-process.
+Enabled via env var SETUPMETA_GIT_BACKEND=python (see Git.git_describe_output()).
+
+Only what setupmeta needs is supported: HEAD, loose refs, packed-refs, loose objects, pack files (v2 index),
+the commit-graph file (used to count commits without reading each commit object),
+and the index (v2 to v4, used to tell whether checkout is clean without spawning git).
+Repositories using anything else (sha256 object format, reftable, alternates, replace refs, grafts,
+multi-pack-index, custom core.abbrev...) raise Unsupported, caller then falls back to running git.
+"""
+
+import fnmatch
+import mmap
+import os
+import struct
+import zlib
+
+OBJ_COMMIT = 1
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+OBJ_TYPES = {b"commit": 1, b"tree": 2, b"blob": 3, b"tag": 4}
+GRAPH_NO_PARENT = 0x70000000  # Parent position in commit-graph meaning "no parent"
+GRAPH_EXTRA_EDGES = 0x80000000  # Flag in commit-graph 2nd parent position meaning "index in list of extra edges" (octopus merges)
+FALLBACK_ABBREV = 7  # Minimum length of abbreviated object ids, as in git
+UNSUPPORTED_CONFIG = ("abbrev", "objectformat", "refstorage", "preciousobjects")  # Config settings we don't emulate
+INDEX_ENTRY = struct.Struct(">10I20sH")  # ctime, mtime (seconds, nanoseconds), dev, ino, mode, uid, gid, size, oid, flags
+INDEX_ASSUME_VALID = 0x8000
+INDEX_EXTENDED = 0x4000
+INDEX_STAGE = 0x3000
+INDEX_SKIP_WORKTREE = 0x4000  # In extended flags
+INDEX_INTENT_TO_ADD = 0x2000  # In extended flags
+MAX_INDEX_ENTRIES = 1000  # Beyond that, 'git status' (which stats files in parallel, or asks fsmonitor) is faster than python
+MODE_GITLINK = 0o160000  # Submodules
+MODE_SYMLINK = 0o120000
+
+
+class Unsupported(Exception):
+    """Raised when .git folder can't be read in-process (caller should fall back to running git)"""
+
+
+class CorruptedPack(Unsupported):
+    """Raised when an entry of a pack file can't be decoded"""
+
+    def __init__(self, part):
+        super().__init__("corrupted pack file %s" % part)
+
+
+class CommitGraphUnusable(Unsupported):
+    """Raised when commit-graph can't be used to count commits"""
+
+    def __init__(self, reason):
+        super().__init__("commit-graph can't be used: %s" % reason)
+
+
+class IndexUnusable(Unsupported):
+    """Raised when index can't be used to tell whether checkout is clean"""
+
+    def __init__(self, reason):
+        super().__init__("index can't be used: %s" % reason)
+
+
+class GitIsFaster(Unsupported):
+    """Raised when running git is faster than reading .git in-process"""
+
+    def __init__(self, reason):
+        super().__init__("git status is faster: %s" % reason)
+
+
+class UnresolvedRef(Unsupported):
+    """Raised when a ref can't be resolved to an object id"""
+
+    def __init__(self, ref):
+        super().__init__("could not resolve %s" % ref)
+
+
+READ_ERRORS = (Unsupported, OSError, LookupError, ValueError, struct.error, zlib.error)  # Possible errors when reading .git directly
+
+
+def varint_le(data, pos):
+    """
+    Args:
+        data (bytes): Data to decode from
+        pos (int): Position of little-endian base-128 varint in 'data'
+
+    Returns:
+        (int, int): Position after varint, decoded value
+    """
+    result = shift = 0
+    while True:
+        c = data[pos]
+        pos += 1
+        result |= (c & 0x7F) << shift
+        shift += 7
+        if not c & 0x80:
+            return pos, result
+
+
+def varint_offset(data, pos):
+    """
+    Args:
+        data (bytes): Data to decode from
+        pos (int): Position of big-endian "offset" varint in 'data' (as used by ofs-delta and index v4 path compression)
+
+    Returns:
+        (int, int): Position after varint, decoded value
+    """
+    c = data[pos]
+    pos += 1
+    result = c & 0x7F
+    while c & 0x80:
+        c = data[pos]
+        pos += 1
+        result = ((result + 1) << 7) | (c & 0x7F)
+
+    return pos, result
+
+
+def inflated(data, pos, size):
+    """
+    Args:
+        data (bytes | mmap.mmap): Data holding a zlib stream
+        pos (int): Position where zlib stream starts
+        size (int): Expected size of decompressed data
+
+    Returns:
+        (bytes): Decompressed data
+    """
+    decompressor = zlib.decompressobj()
+    step = size + 64
+    chunks = []
+    while not decompressor.eof:
+        chunk = data[pos : pos + step]
+        if not chunk:
+            raise CorruptedPack("entry")
+
+        chunks.append(decompressor.decompress(chunk))
+        pos += step
+
+    result = b"".join(chunks)
+    if len(result) != size:
+        raise CorruptedPack("entry")
+
+    return result
+
+
+def applied_delta(base, delta):
+    """
+    Args:
+        base (bytes): Contents of base object
+        delta (bytes): Git delta to apply on 'base'
+
+    Returns:
+        (bytes): Resulting object contents
+    """
+    pos, _ = varint_le(delta, 0)  # Size of base object
+    pos, size = varint_le(delta, pos)
+    result = bytearray()
+    end = len(delta)
+    while pos < end:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:  # Copy from base
+            offset = length = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+
+            for i in range(3):
+                if op & (0x10 << i):
+                    length |= delta[pos] << (8 * i)
+                    pos += 1
+
+            result += base[offset : offset + (length or 0x10000)]
+
+        elif op:  # Insert literal data
+            result += delta[pos : pos + op]
+            pos += op
+
+        else:
+            raise CorruptedPack("delta")
+
+    if len(result) != size:
+        raise CorruptedPack("delta")
+
+    return bytes(result)
+
+
+def common_hex_prefix(a, b):
+    """
+    Args:
+        a (str): Hex object id
+        b (str): Another hex object id
+
+    Returns:
+        (int): Length of common prefix of 'a' and 'b'
+    """
+    shortest = min(len(a), len(b))  # Comparison stops at end of shortest id
+    i = 0
+    while i < shortest and a[i] == b[i]:
+        i += 1
+
+    return i
+
+
+class PackIndex:
+    """Version 2 .idx file of a pack, object ids are looked up by bisecting its memory-mapped sorted table"""
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[:8] != b"\377tOc\x00\x00\x00\x02":
+            raise Unsupported("pack index %s is not in v2 format" % os.path.basename(path))
+
+        self.fanout = struct.unpack_from(">256I", self.data, 8)
+        self.count = self.fanout[255]  # type: int # Number of objects in pack
+        self.names_at = 8 + 256 * 4
+        self.offsets_at = self.names_at + 24 * self.count  # 20 bytes per object id, then 4 bytes per crc
+        self.large_offsets_at = self.offsets_at + 4 * self.count
+        self.pack_path = path[:-4] + ".pack"
+        self._pack = None
+
+    def __repr__(self):
+        return "%s (%s objects)" % (os.path.basename(self.pack_path), self.count)
+
+    @property
+    def pack(self):
+        """Memory-mapped .pack file, opened on first use"""
+        if self._pack is None:
+            with open(self.pack_path, "rb") as fh:
+                self._pack = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self._pack
+
+    def name(self, i):
+        """Binary object id at position 'i'"""
+        start = self.names_at + 20 * i
+        return self.data[start : start + 20]
+
+    def position(self, oid):
+        """
+        Args:
+            oid (bytes): Binary object id to look up
+
+        Returns:
+            (int): Position of 'oid' in sorted table (or where it would be inserted)
+        """
+        lo = self.fanout[oid[0] - 1] if oid[0] else 0
+        hi = self.fanout[oid[0]]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name(mid) < oid:
+                lo = mid + 1
+
+            else:
+                hi = mid
+
+        return lo
+
+    def offset(self, oid):
+        """
+        Args:
+            oid (bytes): Binary object id to look up
+
+        Returns:
+            (int | None): Offset of object in .pack file, if present in this pack
+        """
+        i = self.position(oid)
+        if i >= self.count or self.name(i) != oid:
+            return None
+
+        (offset,) = struct.unpack_from(">I", self.data, self.offsets_at + 4 * i)
+        if offset & 0x80000000:
+            (offset,) = struct.unpack_from(">Q", self.data, self.large_offsets_at + 8 * (offset & 0x7FFFFFFF))
+
+        return offset
+
+    def neighbors(self, oid):
+        """
+        Args:
+            oid (bytes): Binary object id
+
+        Yields:
+            (bytes): Object ids that sort right before and right after 'oid' in this pack (those sharing the longest prefix with it)
+        """
+        i = self.position(oid)
+        if i > 0:
+            yield self.name(i - 1)
+
+        if i < self.count and self.name(i) == oid:
+            i += 1
+
+        if i < self.count:
+            yield self.name(i)
+
+    def read(self, offset):
+        """
+        Args:
+            offset (int): Offset of object in .pack file
+
+        Returns:
+            (int, bytes | None, bytes): Object type, binary id of base object (for ref-deltas), contents (or delta)
+        """
+        data = self.pack
+        c = data[offset]
+        kind = (c >> 4) & 7
+        size = c & 0x0F
+        shift = 4
+        pos = offset + 1
+        while c & 0x80:
+            c = data[pos]
+            pos += 1
+            size |= (c & 0x7F) << shift
+            shift += 7
+
+        base = None
+        if kind == OBJ_OFS_DELTA:
+            pos, distance = varint_offset(data, pos)
+            base = offset - distance
+
+        elif kind == OBJ_REF_DELTA:
+            base = data[pos : pos + 20]
+            pos += 20
+
+        return kind, base, inflated(data, pos, size)
+
+
+class CommitGraph:
+    """Memory-mapped 'objects/info/commit-graph' file: parents of each commit, by position in a sorted table of commit ids"""
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature, version, hash_version, chunk_count, base_count = struct.unpack_from(">4sBBBB", self.data, 0)
+        if signature != b"CGPH" or version != 1 or hash_version != 1 or base_count:
+            raise CommitGraphUnusable("format")
+
+        self.chunks = {}  # type: dict[bytes, int] # Chunk id -> offset in file
+        for i in range(chunk_count):
+            chunk_id, offset = struct.unpack_from(">4sQ", self.data, 8 + 12 * i)
+            self.chunks[chunk_id] = offset
+
+        self.fanout = struct.unpack_from(">256I", self.data, self.chunks[b"OIDF"])
+        self.count = self.fanout[255]  # type: int # Number of commits in graph
+        self.names_at = self.chunks[b"OIDL"]
+        self.commits_at = self.chunks[b"CDAT"]
+        self.edges_at = self.chunks.get(b"EDGE")
+
+    def __repr__(self):
+        return "commit-graph (%s commits)" % self.count
+
+    def position(self, oid):
+        """
+        Args:
+            oid (bytes): Binary commit id
+
+        Returns:
+            (int | None): Position of commit in graph, if present
+        """
+        lo = self.fanout[oid[0] - 1] if oid[0] else 0
+        hi = self.fanout[oid[0]]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.names_at + 20 * mid
+            name = self.data[start : start + 20]
+            if name == oid:
+                return mid
+
+            if name < oid:
+                lo = mid + 1
+
+            else:
+                hi = mid
+
+        return None
+
+    def parents(self, position):
+        """
+        Args:
+            position (int): Position of commit in graph
+
+        Returns:
+            (list[int]): Positions of parents of commit
+        """
+        first, second = struct.unpack_from(">II", self.data, self.commits_at + 36 * position + 20)
+        if first == GRAPH_NO_PARENT:
+            return []
+
+        if second == GRAPH_NO_PARENT:
+            return [first]
+
+        if not second & GRAPH_EXTRA_EDGES:
+            return [first, second]
+
+        result = [first]
+        i = second & ~GRAPH_EXTRA_EDGES
+        while True:
+            (edge,) = struct.unpack_from(">I", self.data, self.edges_at + 4 * i)
+            result.append(edge & ~GRAPH_EXTRA_EDGES)
+            if edge & GRAPH_EXTRA_EDGES:
+                return result
+
+            i += 1
+
+    def reachable_count(self, positions):
+        """
+        Args:
+            positions (list[int]): Positions of commits to start from
+
+        Returns:
+            (int): Number of distinct commits reachable from 'positions' (included)
+        """
+        seen = bytearray(self.count)
+        pending = []
+        for position in positions:
+            if not seen[position]:
+                seen[position] = 1
+                pending.append(position)
+
+        count = 0
+        while pending:
+            count += 1
+            for parent in self.parents(pending.pop()):
+                if not seen[parent]:
+                    seen[parent] = 1
+                    pending.append(parent)
+
+        return count
+
+
+class GitIndex:
+    """Entries and cache-tree of a git index file ('.git/index')"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to index file
+        """
+        self.path = path
+        with open(path, "rb") as fh:
+            self.mtime_ns = os.fstat(fh.fileno()).st_mtime_ns
+            self.data = fh.read()
+
+        signature, self.version, self.count = struct.unpack_from(">4sII", self.data)
+        if signature != b"DIRC" or self.version not in (2, 3, 4):
+            raise Unsupported("index version %s is not supported" % self.version)
+
+        self.tree_oid = None  # type: str # Tree object id of the whole index, if cache-tree extension has it (and it's valid)
+        self.extensions_at = None  # type: int # Position of first extension, known once all entries were parsed
+
+    def __repr__(self):
+        return "index %s" % self.path
+
+    def entries(self):
+        """
+        Yields:
+            (bytes, int, int, int, int, int, int): Path, mode, mtime in nanoseconds, size, inode, flags and extended flags
+        """
+        data = self.data
+        pos = 12
+        path = b""
+        for _ in range(self.count):
+            _, _, mtime_s, mtime_ns, _, ino, mode, _, _, size, _, flags = INDEX_ENTRY.unpack_from(data, pos)
+            start = pos
+            pos += INDEX_ENTRY.size
+            extended = 0
+            if flags & INDEX_EXTENDED:
+                extended = struct.unpack_from(">H", data, pos)[0]
+                pos += 2
+
+            if self.version == 4:  # Path is prefix-compressed: drop N bytes from previous path, then append NUL-terminated suffix
+                pos, strip = varint_offset(data, pos)
+                end = data.index(b"\0", pos)
+                path = path[: len(path) - strip] + data[pos:end]
+                pos = end + 1
+
+            else:  # NUL-terminated path, entry padded with NULs to a multiple of 8 bytes
+                end = data.index(b"\0", pos)
+                path = data[pos:end]
+                pos = start + ((end - start + 8) & ~7)
+
+            yield path, mode, mtime_s * 1000000000 + mtime_ns, size, ino, flags, extended
+
+        self.extensions_at = pos
+
+    def read_extensions(self):
+        """Read extensions that follow entries (all entries must have been iterated through first)"""
+        data = self.data
+        pos = self.extensions_at
+        while pos + 8 <= len(data) - 20:
+            signature, size = struct.unpack_from(">4sI", data, pos)
+            pos += 8
+            if signature in (b"link", b"sdir"):
+                raise IndexUnusable("split/sparse")
+
+            if signature == b"TREE":
+                # Root entry comes first: empty path, entry count (-1 if invalidated), subtree count, then tree id
+                end = data.index(b"\n", pos)
+                entry_count = int(data[data.index(b"\0", pos) + 1 : end].split(b" ")[0])
+                if entry_count >= 0:
+                    self.tree_oid = data[end + 1 : end + 21].hex()
+
+            pos += size
+
+    def first_change(self, root, head_tree):
+        """
+        Args:
+            root (str): Path to worktree
+            head_tree (str | None): Tree object id of HEAD commit
+
+        Returns:
+            (str | None): First tracked path that may differ from HEAD (stops at first one found), None if checkout is clean,
+                          as 'git status --untracked-files=no --ignore-submodules' would determine
+        """
+        if self.count > MAX_INDEX_ENTRIES:
+            raise GitIsFaster("index has %s entries" % self.count)
+
+        fd = os.open(root, os.O_RDONLY)
+        try:
+            for path, mode, mtime_ns, size, ino, flags, extended in self.entries():
+                if mode == MODE_GITLINK or flags & INDEX_ASSUME_VALID or extended & INDEX_SKIP_WORKTREE:
+                    continue
+
+                if flags & INDEX_STAGE or extended & INDEX_INTENT_TO_ADD or mtime_ns >= self.mtime_ns:
+                    return os.fsdecode(
+                        path
+                    )  # Conflicted, intent-to-add, or "racily clean" (modified in the same instant index was written)
+
+                try:
+                    st = os.stat(path, dir_fd=fd, follow_symlinks=False)
+
+                except OSError:
+                    return os.fsdecode(path)
+
+                if (
+                    st.st_mtime_ns != mtime_ns
+                    or st.st_size & 0xFFFFFFFF != size
+                    or st.st_ino & 0xFFFFFFFF != ino
+                    or (mode == MODE_SYMLINK) != (st.st_mode & 0o170000 == MODE_SYMLINK)
+                    or (mode != MODE_SYMLINK and (st.st_mode & 0o100) != (mode & 0o100))
+                ):
+                    return os.fsdecode(path)  # Stat info differs from what was recorded in index, contents may have changed
+
+        finally:
+            os.close(fd)
+
+        self.read_extensions()
+        if self.tree_oid is None:
+            raise IndexUnusable("cache-tree")
+
+        if self.tree_oid != head_tree:
+            return "staged changes"
+
+        return None
+
+
+class GitDir:
+    """Objects and refs of a git repository, read directly from its .git folder"""
+
+    def __init__(self, git_dir, common_dir=None):
+        """
+        Args:
+            git_dir (str): Path to .git folder (of the worktree)
+            common_dir (str | None): Path to folder holding refs and objects (differs from 'git_dir' for worktrees)
+        """
+        self.git_dir = git_dir
+        self.common_dir = common_dir or git_dir
+        self.objects_dir = os.path.join(self.common_dir, "objects")
+        self._packs = None
+        self._packed_refs = None
+        self._fully_peeled = False
+        self._commit_graph = None
+        self._shallow = None
+        self.check_supported()
+
+    def __repr__(self):
+        return "gitdir %s" % self.git_dir
+
+    def check_supported(self):
+        """Raise Unsupported if repository uses a feature that would make our reading differ from git's"""
+        for path in ("objects/info/alternates", "objects/pack/multi-pack-index", "info/grafts", "refs/replace", "reftable"):
+            if os.path.exists(os.path.join(self.common_dir, path)):
+                raise Unsupported("%s is not supported" % path)
+
+        for folder in {self.common_dir, self.git_dir}:
+            path = os.path.join(folder, "config")
+            if os.path.isfile(path):
+                with open(path, errors="replace") as fh:
+                    config = fh.read().lower()
+
+                for setting in UNSUPPORTED_CONFIG:
+                    if setting in config:
+                        raise Unsupported("config setting '%s' is not supported" % setting)
+
+    @property
+    def packs(self):
+        """
+        Returns:
+            (list[PackIndex]): Indexes of all pack files
+        """
+        if self._packs is None:
+            folder = os.path.join(self.objects_dir, "pack")
+            names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+            self._packs = [PackIndex(os.path.join(folder, name)) for name in names if name.endswith(".idx")]
+
+        return self._packs
+
+    @property
+    def commit_graph(self):
+        """
+        Returns:
+            (CommitGraph | None): Commit-graph of repository, if there is one
+        """
+        if self._commit_graph is None:
+            if os.path.isdir(os.path.join(self.objects_dir, "info", "commit-graphs")):
+                raise CommitGraphUnusable("split")
+
+            path = os.path.join(self.objects_dir, "info", "commit-graph")
+            self._commit_graph = CommitGraph(path) if os.path.isfile(path) else False
+
+        return self._commit_graph or None
+
+    @property
+    def packed_refs(self):
+        """
+        Returns:
+            (dict[str, tuple]): Ref name -> (object id, peeled object id or None) from 'packed-refs' file
+        """
+        if self._packed_refs is None:
+            self._packed_refs = {}
+            path = os.path.join(self.common_dir, "packed-refs")
+            if os.path.isfile(path):
+                name = None
+                with open(path) as fh:
+                    for line in fh:
+                        line = line.strip()
+                        if line.startswith("# pack-refs with:"):
+                            self._fully_peeled = "fully-peeled" in line.split()
+
+                        elif line.startswith("^") and name:
+                            self._packed_refs[name] = (self._packed_refs[name][0], line[1:])
+
+                        elif line and not line.startswith("#"):
+                            oid, _, name = line.partition(" ")
+                            self._packed_refs[name] = (oid, None)
+
+        return self._packed_refs
+
+    @property
+    def shallow(self):
+        """
+        Returns:
+            (set[str]): Commits at the boundary of a shallow clone (their parents are not available)
+        """
+        if self._shallow is None:
+            self._shallow = set()
+            path = os.path.join(self.common_dir, "shallow")
+            if os.path.isfile(path):
+                with open(path) as fh:
+                    self._shallow = {line.strip() for line in fh if line.strip()}
+
+        return self._shallow
+
+    def resolved_ref(self, ref, depth=0):
+        """
+        Args:
+            ref (str): Ref name, example: HEAD, refs/heads/main
+            depth (int): Number of symbolic refs followed so far
+
+        Returns:
+            (str | None): Object id 'ref' points to (symbolic refs are followed)
+        """
+        if depth > 5:
+            raise UnresolvedRef(ref)
+
+        for folder in (self.git_dir, self.common_dir):
+            path = os.path.join(folder, ref)
+            if os.path.isfile(path):
+                with open(path) as fh:
+                    value = fh.read().strip()
+
+                if value.startswith("ref:"):
+                    return self.resolved_ref(value[4:].strip(), depth=depth + 1)
+
+                return value
+
+        packed = self.packed_refs.get(ref)
+        return packed and packed[0]
+
+    def tag_refs(self):
+        """
+        Returns:
+            (dict[str, tuple]): Tag name -> (object id, peeled commit id), peeled id is False when tag is known to not be annotated,
+                                None when unknown
+        """
+        result = {}
+        for name, (oid, peeled) in self.packed_refs.items():
+            if name.startswith("refs/tags/"):
+                # With 'fully-peeled' trait, packed-refs has a peeled line for every annotated tag
+                result[name[10:]] = (oid, False if peeled is None and self._fully_peeled else peeled)
+
+        top = os.path.join(self.common_dir, "refs", "tags")
+        for root, _, files in os.walk(top):
+            for fname in files:
+                path = os.path.join(root, fname)
+                name = os.path.relpath(path, top).replace(os.sep, "/")
+                result[name] = (self.resolved_ref("refs/tags/%s" % name), None)  # Loose refs take precedence over packed ones
+
+        return result
+
+    def read_object(self, oid):
+        """
+        Args:
+            oid (str): Hex object id
+
+        Returns:
+            (int, bytes): Object type and contents
+        """
+        binary = bytes.fromhex(oid)
+        for pack in self.packs:
+            offset = pack.offset(binary)
+            if offset is not None:
+                return self.read_packed(pack, offset)
+
+        path = os.path.join(self.objects_dir, oid[:2], oid[2:])
+        if not os.path.isfile(path):
+            raise Unsupported("object %s not found" % oid)
+
+        with open(path, "rb") as fh:
+            data = zlib.decompress(fh.read())
+
+        header, _, contents = data.partition(b"\0")
+        kind = OBJ_TYPES.get(header.partition(b" ")[0])
+        if kind is None:
+            raise Unsupported("unknown object type in %s" % oid)
+
+        return kind, contents
+
+    def read_packed(self, pack, offset):
+        """
+        Args:
+            pack (PackIndex): Pack holding object
+            offset (int): Offset of object in pack
+
+        Returns:
+            (int, bytes): Object type and contents, with deltas resolved
+        """
+        deltas = []
+        kind, base, contents = pack.read(offset)
+        while kind in (OBJ_OFS_DELTA, OBJ_REF_DELTA):
+            deltas.append(contents)
+            if kind == OBJ_OFS_DELTA:
+                kind, base, contents = pack.read(base)
+
+            else:
+                kind, contents = self.read_object(base.hex())
+                break
+
+        for delta in reversed(deltas):
+            contents = applied_delta(contents, delta)
+
+        return kind, contents
+
+    def parents(self, oid):
+        """
+        Args:
+            oid (str): Hex commit id
+
+        Returns:
+            (list[str]): Parent commit ids (empty for root commits and shallow boundaries)
+        """
+        if oid in self.shallow:
+            return []
+
+        kind, contents = self.read_object(oid)
+        if kind != OBJ_COMMIT:
+            raise Unsupported("%s is not a commit" % oid)
+
+        result = []
+        for line in contents.split(b"\n"):
+            if not line:
+                break
+
+            if line.startswith(b"parent "):
+                result.append(line[7:].decode())
+
+        return result
+
+    def tree(self, oid):
+        """
+        Args:
+            oid (str): Hex commit id
+
+        Returns:
+            (str): Tree object id of commit
+        """
+        kind, contents = self.read_object(oid)
+        if kind != OBJ_COMMIT or not contents.startswith(b"tree "):
+            raise Unsupported("%s is not a commit" % oid)
+
+        return contents[5:45].decode()
+
+    def first_change(self, root):
+        """
+        Args:
+            root (str): Path to worktree
+
+        Returns:
+            (str | None): First tracked path that may differ from HEAD, None if checkout is clean (see GitIndex.first_change())
+        """
+        for folder in {self.common_dir, self.git_dir}:
+            path = os.path.join(folder, "config")
+            if os.path.isfile(path):
+                with open(path, errors="replace") as fh:
+                    if "fsmonitor" in fh.read().lower():
+                        raise GitIsFaster("fsmonitor")
+
+        head = self.resolved_ref("HEAD")
+        if not head:
+            raise UnresolvedRef("HEAD")
+
+        return GitIndex(os.path.join(self.git_dir, "index")).first_change(root, self.tree(head))
+
+    def peeled_tag(self, oid):
+        """
+        Args:
+            oid (str): Object id a tag ref points to
+
+        Returns:
+            (str | None, int | None): Commit id tag points to (None if not a commit), tagger timestamp for annotated tags
+        """
+        kind, contents = self.read_object(oid)
+        date = None
+        while kind == OBJ_TAG:
+            headers = dict(line.split(b" ", 1) for line in contents.partition(b"\n\n")[0].split(b"\n") if b" " in line)
+            if date is None:
+                tagger = headers.get(b"tagger", b"").rsplit(b" ", 2)
+                date = int(tagger[1]) if len(tagger) == 3 and tagger[1].isdigit() else 0
+
+            oid = headers[b"object"].decode()
+            kind, contents = self.read_object(oid)
+
+        return (oid if kind == OBJ_COMMIT else None), date
+
+    def tagged_commits(self, pattern):
+        """
+        Args:
+            pattern (str): Glob pattern tag names must match (as in 'git describe --match')
+
+        Returns:
+            (dict[str, str]): Commit id -> name of tag git describe would pick for that commit
+        """
+        best = {}  # Commit id -> [priority, tag object id, tagger date, name], priority: 2 for annotated tags, 1 for lightweight ones
+        refs = self.tag_refs()
+        for name in sorted(refs):  # git iterates over refs sorted by name, and keeps the first one on ties
+            oid, peeled = refs[name]
+            if not oid or not fnmatch.fnmatchcase(name, pattern):
+                continue
+
+            if peeled:
+                candidate = [2, oid, None, name]
+                commit = peeled
+
+            elif peeled is False:
+                candidate = [1, oid, None, name]
+                commit = oid
+
+            else:
+                commit, date = self.peeled_tag(oid)
+                candidate = [1 if date is None else 2, oid, date, name]
+
+            if not commit:
+                continue
+
+            current = best.get(commit)
+            if current is None or current[0] < candidate[0]:
+                best[commit] = candidate
+
+            elif current[0] == candidate[0] == 2:
+                # Several annotated tags on the same commit, git picks the most recent one
+                for entry in (current, candidate):
+                    if entry[2] is None:
+                        entry[2] = self.peeled_tag(entry[1])[1]
+
+                if current[2] < candidate[2]:
+                    best[commit] = candidate
+
+        return {commit: entry[3] for commit, entry in best.items()}
+
+    def describe(self, *patterns):
+        """
+        Args:
+            *patterns (str): Glob patterns of tags to consider, in order of preference
+
+        Returns:
+            (str, int, str) | None: Tag name, number of first-parent commits since tag, and abbreviated id of HEAD
+        """
+        head = self.resolved_ref("HEAD")
+        if not head:
+            return None
+
+        candidates = [self.tagged_commits(pattern) for pattern in patterns]
+        if not any(candidates):
+            return None
+
+        found = [None] * len(patterns)
+        preferred = next(
+            i for i, tagged in enumerate(candidates) if tagged
+        )  # Patterns without any tag can't match, no need to wait for them
+        oid = head
+        distance = 0
+        while oid and found[preferred] is None:
+            for i, tagged in enumerate(candidates):
+                if found[i] is None and oid in tagged:
+                    found[i] = (tagged[oid], distance)
+
+            parents = self.parents(oid)
+            oid = parents[0] if parents else None
+            distance += 1
+
+        for match in found:
+            if match:
+                tag, distance = match
+                described = head
+                if not distance:
+                    # On exact match, git shows the object an annotated tag directly points to (differs from HEAD for nested tags)
+                    kind, contents = self.read_object(self.tag_refs()[tag][0])
+                    if kind == OBJ_TAG:
+                        described = contents.partition(b"\n")[0].partition(b" ")[2].decode()
+
+                return tag, distance, self.abbreviated(described)
+
+    def commit_count(self, oid):
+        """
+        Args:
+            oid (str): Hex commit id
+
+        Returns:
+            (int): Number of commits reachable from 'oid' (as 'git rev-list --count' would report),
+                   without materializing history: commits are counted from commit-graph, only commits more recent than it are read
+        """
+        graph = self.commit_graph
+        if graph is None:
+            raise CommitGraphUnusable("missing")
+
+        if self.shallow:
+            raise CommitGraphUnusable("shallow")
+
+        count = 0
+        seen = set()
+        positions = []
+        pending = [oid]
+        while pending:
+            oid = pending.pop()
+            if oid in seen:
+                continue
+
+            seen.add(oid)
+            position = graph.position(bytes.fromhex(oid))
+            if position is not None:
+                positions.append(position)
+
+            else:  # Commit made after commit-graph was written
+                count += 1
+                pending.extend(self.parents(oid))
+
+        return count + graph.reachable_count(positions)
+
+    def approximate_object_count(self):
+        """Number of packed objects, used by git to determine default abbreviation length"""
+        return sum(pack.count for pack in self.packs)
+
+    def abbreviated(self, oid):
+        """
+        Args:
+            oid (str): Hex object id
+
+        Returns:
+            (str): Shortest unambiguous abbreviation of 'oid', as 'git rev-parse --short' would show it
+        """
+        length = max(FALLBACK_ABBREV, (self.approximate_object_count().bit_length() + 1) // 2)
+        binary = bytes.fromhex(oid)
+        for pack in self.packs:
+            for other in pack.neighbors(binary):
+                length = max(length, common_hex_prefix(oid, other.hex()) + 1)
+
+        folder = os.path.join(self.objects_dir, oid[:2])
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                other = oid[:2] + name
+                if other != oid:
+                    length = max(length, common_hex_prefix(oid, other) + 1)
+
+        return oid[:length]
@@ -1,12 +1,30 @@
 """
 Hook for setuptools/distutils
+
+This module is loaded by setuptools for every build in an environment where setupmeta is installed,
+so it must stay cheap to import: `setupmeta.model` (and everything it pulls in) is imported only
+once we know that the project being built actually uses setupmeta.
 """
 
 import functools
 
 import setuptools.dist
 
-from setupmeta.model import MetaDefs, SetupMeta
+from setupmeta import MetaDefs
+
+
+def is_using_setupmeta(setup_requires):
+    """
+    Args:
+        setup_requires (list | str | None): Value of 'setup_requires' as given to setup()
+
+    Returns:
+        (bool): True if 'setup_requires' mentions setupmeta
+    """
+    if setup_requires and not isinstance(setup_requires, (list, tuple)):
+        setup_requires = [setup_requires]
+
+    return bool(setup_requires) and any(dep.startswith("setupmeta") for dep in setup_requires if hasattr(dep, "startswith"))
 
 
 def finalize_dist(dist, setup_requires=None):
@@ -18,9 +36,9 @@ def finalize_dist(dist, setup_requires=None):
     the usual spec. This step is *before* configuration is additionally read
     from config files.
     """
-    setup_requires = setup_requires or dist.setup_requires
-    setup_requires = setup_requires if isinstance(setup_requires, list) else [setup_requires]
-    if setup_requires and any(dep.startswith("setupmeta") for dep in setup_requires if hasattr(dep, "startswith")):
+    if is_using_setupmeta(setup_requires or dist.setup_requires):
+        from setupmeta.model import SetupMeta
+
         dist._setupmeta = SetupMeta().preprocess(dist)
         MetaDefs.fill_dist(dist, dist._setupmeta.to_dict(only_meaningful=False))
 
@@ -2,30 +2,49 @@
 Model of our view on how setup.py + files in a project can come together
 """
 
-import inspect
-import io
+import contextlib
+import locale
 import os
 import re
 import sys
 
-import setuptools
-
 from setupmeta import (
-    current_folder,
+    ContentCache,
+    current_context,
+    DirectoryIndex,
+    env_value,
+    EvaluationContext,
+    file_lines,
+    file_signature,
+    folder_entries,
+    folder_signature,
     get_words,
+    InputTracker,
+    is_dir,
+    is_file,
+    LazyShort,
     listify,
     MetaDefs,
     PKGID,
     project_path,
     readlines,
+    record_read,
     relative_path,
     Requirements,
     requirements_from_file,
     RequirementsFile,
     short,
+    timed_phase,
+    Timings,
+    to_int,
     trace,
+    TRACE_DEBUG,
+    TRACE_SINK,
+    track_file,
+    track_folder,
     warn,
 )
+from setupmeta.cache import MetaCache
 from setupmeta.content import find_contents, load_contents, load_readme, resolved_paths
 from setupmeta.license import determined_license
 from setupmeta.versioning import project_scm, Versioning
@@ -40,6 +59,12 @@ RE_EMAIL = re.compile(r"(.+)[\s<>()\[\],:;]+([^@]+@[a-zA-Z0-9._-]+)")
 # Finds simple values of the form: __author__ = 'Someone'
 RE_PY_VALUE = re.compile(r'^__([a-z_]+)__\s*=\s*u?[\'"](.+?)[\'"]\s*(#.+)?$')
 
+# Marks the end of the header of a python module (docstring, imports, dunder assignments...)
+RE_PY_CODE_START = re.compile(r"^(async\s+def|def|class)\s|^@")
+
+# Modules larger than this (in bytes) have only their header scanned (and at most this many bytes of it)
+DEFAULT_SCAN_BUDGET = 64 * 1024
+
 # Finds simple docstring entries like: author: Zoran Simic
 RE_DOC_VALUE = re.compile(r"^([a-z_]+)\s*[:=]\s*(.+?)(\s*#.+)?$")
 
@@ -58,6 +83,82 @@ PKG_CANONICAL_KEYS = {
 }
 PKG_LIST_TYPES = {"classifiers", "long_description"}
 
+# Folders that are never looked into when discovering packages (can be extended via env var SETUPMETA_IGNORED_FOLDERS)
+IGNORED_FOLDERS = {
+    ".eggs",
+    ".git",
+    ".hg",
+    ".mypy_cache",
+    ".nox",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".svn",
+    ".tox",
+    ".venv",
+    "__pycache__",
+    "build",
+    "dist",
+    "node_modules",
+    "venv",
+}
+
+# Auto-fill steps that must run before a given step can run
+STEP_DEPENDENCIES = {
+    "contacts": {"modules"},
+    "license": {"modules"},
+    "long_description": {"modules"},
+    "urls": {"modules", "version"},
+    "version": {"modules"},
+}
+
+# Auto-fill steps needed to show informational fields, as in 'setup.py --version'
+INFORMATIONAL_OPTIONS = {
+    "--author": {"contacts"},
+    "--author-email": {"contacts"},
+    "--classifiers": {"modules"},
+    "--contact": {"contacts"},
+    "--contact-email": {"contacts"},
+    "--description": {"long_description"},
+    "--fullname": {"version"},
+    "--help-commands": set(),
+    "--keywords": {"modules"},
+    "--licence": {"license"},
+    "--license": {"license"},
+    "--long-description": {"long_description"},
+    "--maintainer": {"contacts"},
+    "--maintainer-email": {"contacts"},
+    "--name": set(),
+    "--obsoletes": {"modules"},
+    "--platforms": {"modules"},
+    "--provides": {"modules"},
+    "--requires": {"modules"},
+    "--url": {"urls"},
+    "--version": {"version"},
+}
+VERBOSITY_OPTIONS = {"-q", "--quiet", "-v", "--verbose"}
+
+
+def needed_steps(args):
+    """
+    Args:
+        args (list[str]): Command line arguments given to setup.py
+
+    Returns:
+        (set[str] | None): Auto-fill steps needed to serve informational 'args', None if all steps are needed
+    """
+    options = [arg for arg in args if arg not in VERBOSITY_OPTIONS]
+    if not options or any(arg not in INFORMATIONAL_OPTIONS for arg in options):
+        return None
+
+    steps = set()
+    pending = set().union(*(INFORMATIONAL_OPTIONS[arg] for arg in options))
+    while pending:
+        step = pending.pop()
+        steps.add(step)
+        pending.update(STEP_DEPENDENCIES.get(step, set()) - steps)
+
+    return steps
+
 
 def is_setup_py_path(path):
     """Is 'path' pointing to a setup.py module?"""
@@ -65,6 +166,30 @@ def is_setup_py_path(path):
         return os.path.basename(path).startswith("setup.py")  # Accept also setup.pyc
 
 
+_STACK_SETUP_PY = {}  # Memoized is_setup_py_path() verdict per filename of code seen in call stack
+
+
+def setup_py_from_stack():
+    """
+    Returns:
+        (str | None): Path to 'setup.py' module found in current call stack, if any
+    """
+    # Look at raw frames only, inspect.stack() would read source context of each frame (and resolve its module)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        is_setup_py = _STACK_SETUP_PY.get(filename)
+        if is_setup_py is None:
+            is_setup_py = bool(is_setup_py_path(filename))
+            _STACK_SETUP_PY[filename] = is_setup_py
+
+        if is_setup_py:
+            # 'co_filename' can be relative (eg: 'python setup.py'), resolve it against current working dir each time
+            return os.path.abspath(filename)
+
+        frame = frame.f_back
+
+
 def content_type_from_filename(filename):
     """Determined content type from 'filename'"""
     if filename:
@@ -131,7 +256,7 @@ class Definition(object):
         for entry in sources:
             if not self.value and entry.value:
                 self.value = entry.value
-                trace("[-- %s] %s=%s" % (entry.source, self.key, entry.value))
+                trace("[-- %s] %s=%s", entry.source, self.key, entry.value, level=TRACE_DEBUG)
 
             self.sources.append(entry)
 
@@ -151,11 +276,11 @@ class Definition(object):
         entry = DefinitionEntry(self.key, value, source)
         if override:
             self.sources.insert(0, entry)
-            trace("[<- %s] %s=%s" % (source, self.key, short(value)))
+            trace("[<- %s] %s=%s", source, self.key, LazyShort(value), level=TRACE_DEBUG)
 
         else:
             self.sources.append(entry)
-            trace("[-> %s] %s=%s" % (source, self.key, short(value)))
+            trace("[-> %s] %s=%s", source, self.key, LazyShort(value), level=TRACE_DEBUG)
 
     @property
     def is_meaningful(self):
@@ -170,7 +295,7 @@ class Settings:
         self.definitions = {}  # type: dict[str, Definition]
 
     def __repr__(self):
-        project_dir = short(MetaDefs.project_dir)
+        project_dir = short(current_context().project_dir)
         return "%s definitions, %s" % (len(self.definitions), project_dir)
 
     def value(self, key):
@@ -212,6 +337,39 @@ class Settings:
                 self.add_definition(definition.key, definition.value, definition.sources)
 
 
+def scan_budget():
+    """
+    Returns:
+        (int): Size in bytes above which only the header of python modules gets scanned (env var SETUPMETA_SCAN_BUDGET)
+    """
+    return to_int(env_value("SETUPMETA_SCAN_BUDGET"), default=DEFAULT_SCAN_BUDGET)
+
+
+def bounded_lines(path, budget):
+    """
+    Args:
+        path (str): Path to file
+        budget (int): Max number of bytes to read
+
+    Yields:
+        (str): Lines from file (decoded as open(path, "rt") would), stops once 'budget' is exhausted
+    """
+    encoding = locale.getpreferredencoding(False)
+    consumed = 0
+    with open(path, "rb") as fh:
+        try:
+            while consumed < budget:
+                raw = fh.readline(budget - consumed)
+                if not raw:
+                    return
+
+                consumed += len(raw)
+                yield raw.decode(encoding, errors="replace")
+
+        finally:
+            record_read(consumed)
+
+
 class SimpleModule(Settings):
     """Simple settings extracted from a module, such as __about__.py"""
 
@@ -222,39 +380,53 @@ class SimpleModule(Settings):
         Settings.__init__(self)
         self.relative_path = os.path.join(*relative_paths)
         self.full_path = project_path(*relative_paths)
-        self.exists = os.path.isfile(self.full_path)
+        track_file(self.full_path)
+        self.exists = is_file(self.full_path)
         if self.exists:
-            with io.open(self.full_path, "rt") as fh:
-                docstring_marker = None
-                docstring_start = None
-                docstring = []
-                line_number = 0
-                for line in fh:
-                    line_number += 1
-                    line = line.rstrip()
-                    if docstring_marker:
-                        if line.endswith(docstring_marker):
-                            docstring_marker = None
-                            if docstring:
-                                self.scan_docstring(docstring, line_number=docstring_start - 1)
-
-                        else:
-                            docstring.append(line)
+            budget = scan_budget()
+            size = (file_signature(self.full_path) or [0, 0])[1]
+            header_only = budget > 0 and size > budget
+            if header_only:
+                # Large modules (often generated) are scanned only up to the first def/class, within the byte budget
+                trace("scanning only header of %s (%s bytes)", self.relative_path, size)
+                lines = bounded_lines(self.full_path, budget)
 
-                        continue
+            else:
+                lines = file_lines(self.full_path)
+
+            docstring_marker = None
+            docstring_start = None
+            docstring = []
+            line_number = 0
+            for line in lines:
+                line_number += 1
+                line = line.rstrip()
+                if docstring_marker:
+                    if line.endswith(docstring_marker):
+                        docstring_marker = None
+                        if docstring:
+                            self.scan_docstring(docstring, line_number=docstring_start - 1)
+
+                    else:
+                        docstring.append(line)
 
-                    if line.startswith(('"""', "'''")):
-                        docstring_marker = line[:3]
-                        if len(line) > 3 and line.endswith(docstring_marker):
-                            # Single docstring line edge case
-                            docstring_marker = None
-                            continue
+                    continue
 
-                        docstring_start = line_number
-                        docstring.append(line[3:])
+                if line.startswith(('"""', "'''")):
+                    docstring_marker = line[:3]
+                    if len(line) > 3 and line.endswith(docstring_marker):
+                        # Single docstring line edge case
+                        docstring_marker = None
                         continue
 
-                    self.scan_line(line, RE_PY_VALUE, line_number)
+                    docstring_start = line_number
+                    docstring.append(line[3:])
+                    continue
+
+                if header_only and RE_PY_CODE_START.match(line):
+                    break
+
+                self.scan_line(line, RE_PY_VALUE, line_number)
 
     def add_pair(self, key, value, line, **kwargs):
         if key and value:
@@ -376,7 +548,7 @@ class PackageInfo:
                 self.info[key].append(line[8:].rstrip())
 
             elif line.strip():
-                trace("Unknown format line %s in %s: %s" % (line_number, self.path, line))
+                trace("Unknown format line %s in %s: %s", line_number, self.path, line)
 
         self.name = self.info.get("name")
         self.pythonified_name = pythonified_name(self.name)
@@ -400,17 +572,21 @@ class PackageInfo:
         :param int depth: Do not scan folder for more than 'depth'
         :return bool: True when .egg-info was found and leveraged
         """
-        if not self.name or not os.path.isdir(folder) or depth <= 0:
+        entries = self.name and depth > 0 and folder_entries(folder)
+        if not entries:
             return False
 
+        track_folder(folder)
         path = os.path.join(folder, "%s.egg-info" % self.pythonified_name)
-        if os.path.isdir(path):
+        if entries.get(os.path.basename(path)):
+            track_folder(path)
             self.entry_points_txt = self.checked_file(path, "entry_points.txt")
             self.requires_txt = self.checked_file(path, "requires.txt")
             return True
 
-        for fname in os.listdir(folder):
-            if self.load_more_info(os.path.join(folder, fname), depth=depth - 1):
+        ignored = ignored_folders()
+        for fname, is_folder in sorted(entries.items()):
+            if is_folder and fname not in ignored and self.load_more_info(os.path.join(folder, fname), depth=depth - 1):
                 return True
 
     @staticmethod
@@ -424,28 +600,129 @@ class PackageInfo:
             (str | None): Full path, if it exists
         """
         path = os.path.join(folder, basename)
-        if os.path.exists(path):
+        if is_file(path):
             return path
 
 
+def ignored_folders():
+    """
+    Returns:
+        (set[str]): Names of folders to never look into when discovering packages or looking for .egg-info
+    """
+    extra = env_value("SETUPMETA_IGNORED_FOLDERS")
+    return IGNORED_FOLDERS.union(listify(extra or "", separator=","))
+
+
+_DISCOVERED_PACKAGES = {}  # Memoized find_packages() results, per (root, prefix, ignored), valid as long as visited folders don't change
+
+
+def find_packages(root, prefix=None):
+    """
+    Same as setuptools.find_packages(where=root), but prunes top-level ignored folders, and top-level folders not starting with 'prefix'
+
+    Args:
+        root (str): Folder to look into
+        prefix (str | None): If provided, consider only top-level packages whose name starts with 'prefix'
+
+    Returns:
+        (list[str]): Packages found (folders with an __init__.py, and whose parents are packages as well)
+    """
+    ignored = ignored_folders()  # Always consulted, so that SETUPMETA_IGNORED_FOLDERS stays part of cache fingerprints
+    key = (root, prefix, frozenset(ignored))
+    memoized = _DISCOVERED_PACKAGES.get(key)
+    if memoized and all(folder_signature(f) == signature for f, signature in memoized[0].items()):
+        for folder in memoized[0]:
+            track_folder(folder)
+
+        return list(memoized[1])
+
+    visited = {}
+    packages = []
+    pending = [(root, None)]
+    while pending:
+        folder, package = pending.pop(0)
+        visited[folder] = folder_signature(folder)
+        track_folder(folder)
+        for name, is_folder in sorted((folder_entries(folder) or {}).items()):
+            if not is_folder or "." in name or (package is None and name in ignored):
+                continue  # Ignored folders are pruned at top level only: sub-packages can legitimately be named 'build', 'dist' etc
+
+            if package is None and prefix and not name.startswith(prefix):
+                trace("not looking for packages in %s", name, level=TRACE_DEBUG)
+                continue
+
+            path = os.path.join(folder, name)
+            if (folder_entries(path) or {}).get("__init__.py") is False:
+                sub_package = name if package is None else "%s.%s" % (package, name)
+                packages.append(sub_package)
+                pending.append((path, sub_package))
+
+            elif name not in ignored:
+                # Not a package, but could become one if an __init__.py gets added to it
+                visited[path] = folder_signature(path)
+                track_folder(path)
+
+    _DISCOVERED_PACKAGES[key] = (visited, packages)
+    return list(packages)
+
+
 class SetupMeta(Settings):
     """Find usable definitions throughout a project SetupPy SetupMeta"""
 
+    cache = None  # type: MetaCache # Persistent cache of definitions, when applicable
     pkg_info = None  # type: PackageInfo
-    requirements = None  # type: Requirements
     versioning = None  # type: Versioning
 
-    def __init__(self):
+    def __init__(self, context=None):
+        """
+        Args:
+            context (setupmeta.EvaluationContext | None): Explicit evaluation context (default: process-wide one)
+        """
         Settings.__init__(self)
+        self.context = context
         self.attrs = {}
+        self.timings = Timings()  # type: Timings # Time spent in each phase of the evaluation of this project
+        self._requirements = None
+
+    def __repr__(self):
+        with self.activated():
+            return Settings.__repr__(self)
+
+    def activated(self):
+        """Context manager activating the explicit evaluation context of this project, if any"""
+        return self.context if self.context is not None else contextlib.nullcontext()
+
+    @property
+    def requirements(self):
+        """
+        Returns:
+            (Requirements): Requirements auto-filled from requirements.txt (or PKG-INFO), determined lazily when served from cache
+        """
+        if self._requirements is None:
+            with self.activated():
+                if self.pkg_info is None:
+                    self.pkg_info = PackageInfo(current_context().project_dir)
+
+                self._requirements = Requirements(self.pkg_info)
+
+        return self._requirements
 
     def preprocess(self, upstream):
-        self.find_project_dir(MetaDefs.dist_to_dict(upstream).pop("_setup_py_path", None))
+        with self.activated(), self.timings:
+            return self._preprocess(upstream)
+
+    def _preprocess(self, upstream):
+        if self.context is None:
+            self.find_project_dir(MetaDefs.dist_to_dict(upstream).pop("_setup_py_path", None))
+
         for require_field in ("install_requires",):
             value = getattr(upstream, require_field)
             if isinstance(value, str) and value.startswith("@"):
                 self.add_definition(require_field, value, EXPLICIT)
-                self.add_definition(require_field, requirements_from_file(value[1:]) or [], source=value[1:], override=True)
+                with timed_phase("requirements"):
+                    requirements = requirements_from_file(value[1:]) or []
+
+                self.add_definition(require_field, requirements, source=value[1:], override=True)
 
         if isinstance(upstream.extras_require, dict) and any(
             isinstance(deps, str) and deps.startswith("@") for deps in upstream.extras_require.values()
@@ -464,29 +741,86 @@ class SetupMeta(Settings):
         return self
 
     def finalize(self, upstream):
+        try:
+            with self.activated(), self.timings:
+                return self._finalize(upstream)
+
+        finally:
+            TRACE_SINK.flush()
+
+    def _finalize(self, upstream):
         self.attrs.update(MetaDefs.dist_to_dict(upstream))
-        self.find_project_dir(self.attrs.pop("_setup_py_path", None))
+        setup_py_path = self.attrs.pop("_setup_py_path", None)
+        if self.context is None:
+            self.find_project_dir(setup_py_path)
+
+        project_dir = current_context().project_dir
         scm = self.attrs.pop("scm", None)
+        if scm is None:
+            with timed_phase("scm"):
+                scm = project_scm(project_dir)
+
+            with timed_phase("cache"):
+                self.cache = MetaCache(project_dir, self.attrs, scm)
+                restored = self.cache.restore(self)
+
+            if restored:
+                self.versioning = self.new_versioning(scm)
+                return self
+
+        with InputTracker() as inputs, DirectoryIndex(), ContentCache():
+            complete = self.auto_fill_definitions(scm)
+
+        if complete and self.cache:
+            with timed_phase("cache"):
+                self.cache.store(self, inputs)
+
+        return self
+
+    def new_versioning(self, scm):
+        """Versioning object for this project"""
+        versioning = Versioning(self, scm)
+        if scm and versioning.strategy:
+            versioning.strategy.configured_scm(scm)
+
+        return versioning
+
+    def auto_fill_definitions(self, scm):
+        """
+        Args:
+            scm (setupmeta.scm.Scm | None): SCM to use for versioning
+
+        Returns:
+            (bool): True if all definitions were auto-filled (False when only a subset was needed)
+        """
+        steps = needed_steps(current_context().argv[1:])
+        if steps is not None:
+            trace("informational invocation, auto-filling only: %s", ", ".join(sorted(steps)) or "-none-")
+
         # Add definitions from setup()'s attrs (highest priority)
         for key, value in self.attrs.items():
             if key not in self.definitions:
                 self.add_definition(key, value, EXPLICIT)
 
         # Add definitions from PKG-INFO, when available
-        self.pkg_info = PackageInfo(MetaDefs.project_dir)
+        with timed_phase("pkg-info"):
+            self.pkg_info = PackageInfo(current_context().project_dir)
+
         for key, value in self.pkg_info.info.items():
             if key in MetaDefs.all_fields:
                 self.add_definition(key, value, relative_path(self.pkg_info.path))
 
         # Allow to autofill 'name' from setup.py __title__, if any
-        self.merge(SimpleModule("setup.py"))
+        with timed_phase("modules"):
+            self.merge(SimpleModule("setup.py"))
+
         title = self.definitions.get("title")
         if title:
             self.auto_fill("name", title.value, source=title.source)
 
-        if "--name" in sys.argv[1:3]:
+        if steps is not None and "modules" not in steps:
             # No need to waste time filling anything if all we need to show is package name
-            return self
+            return False
 
         packages = self.attrs.get("packages", [])
         py_modules = self.attrs.get("py_modules", [])
@@ -494,10 +828,13 @@ class SetupMeta(Settings):
             # Try to auto-determine a good default from 'self.name'
             name = self.pythonified_name
             src_folder = project_path("src")
-            if os.path.isdir(src_folder):
-                trace("looking for src packages in %s" % src_folder)
-                packages = setuptools.find_packages(where=src_folder)
-                if not packages and os.path.isfile(project_path("src", "%s.py" % name)):
+            track_folder(project_path())
+            if is_dir(src_folder):
+                trace("looking for src packages in %s", src_folder)
+                with timed_phase("packages"):
+                    packages = find_packages(src_folder)
+
+                if not packages and is_file(project_path("src", "%s.py" % name)):
                     py_modules = [name]
 
                 if packages or py_modules:
@@ -505,18 +842,14 @@ class SetupMeta(Settings):
 
             else:
                 src_folder = project_path()
-                if os.path.isdir(src_folder):
-                    trace("looking for direct packages in %s" % src_folder)
-                    with current_folder(src_folder):
-                        raw_packages = setuptools.find_packages()
-                        if raw_packages:
-                            # Keep only packages that start with the expected name
-                            # For any other use-case, user must explicitly list their packages
-                            packages = [p for p in raw_packages if p.startswith(name)]
-                            if packages != raw_packages:
-                                trace("all packages found: %s" % raw_packages)
-
-                if not packages and os.path.isfile(project_path("%s.py" % name)):
+                if is_dir(src_folder):
+                    trace("looking for direct packages in %s", src_folder)
+                    # Keep only packages that start with the expected name
+                    # For any other use-case, user must explicitly list their packages
+                    with timed_phase("packages"):
+                        packages = find_packages(src_folder, prefix=name)
+
+                if not packages and is_file(project_path("%s.py" % name)):
                     py_modules = [name]
 
             if packages:
@@ -526,20 +859,21 @@ class SetupMeta(Settings):
                 self.auto_fill("py_modules", py_modules)
 
         # Scan the usual/conventional places
-        for py_module in py_modules:
-            self.merge(SimpleModule("%s.py" % py_module))
-
-        for package in packages:
-            if package and "." not in package:
-                # Look at top level modules only
-                self.merge(
-                    SimpleModule(package, "__about__.py"),
-                    SimpleModule(package, "__version__.py"),
-                    SimpleModule(package, "__init__.py"),
-                    SimpleModule("src", package, "__about__.py"),
-                    SimpleModule("src", package, "__version__.py"),
-                    SimpleModule("src", package, "__init__.py"),
-                )
+        with timed_phase("modules"):
+            for py_module in py_modules:
+                self.merge(SimpleModule("%s.py" % py_module))
+
+            for package in packages:
+                if package and "." not in package:
+                    # Look at top level modules only
+                    self.merge(
+                        SimpleModule(package, "__about__.py"),
+                        SimpleModule(package, "__version__.py"),
+                        SimpleModule(package, "__init__.py"),
+                        SimpleModule("src", package, "__about__.py"),
+                        SimpleModule("src", package, "__version__.py"),
+                        SimpleModule("src", package, "__init__.py"),
+                    )
 
         if not self.name:
             warn("'name' not specified in setup.py, auto-fill will be incomplete")
@@ -547,27 +881,58 @@ class SetupMeta(Settings):
         elif not self.definitions.get("packages") and not self.definitions.get("py_modules"):
             warn("No 'packages' or 'py_modules' defined, this is an empty python package")
 
-        scm = scm or project_scm(MetaDefs.project_dir)
-        self.versioning = Versioning(self, scm)
-        if scm and self.versioning.strategy and self.versioning.strategy.version_tag:
-            scm.version_tag = self.versioning.strategy.version_tag
+        return self.auto_fill_steps(scm, steps)
 
-        self.versioning.auto_fill_version()
+    def auto_fill_steps(self, scm, steps):
+        """
+        Auto-fill definitions that depend on modules having been scanned (version, urls, contacts, requirements...)
 
-        self.fill_urls()
+        Args:
+            scm (setupmeta.scm.Scm | None): SCM to use for versioning
+            steps (set[str] | None): Auto-fill steps needed (None: all of them)
 
-        self.auto_adjust("author", self.extract_email)
-        self.auto_adjust("contact", self.extract_email)
-        self.auto_adjust("maintainer", self.extract_email)
+        Returns:
+            (bool): True if all definitions were auto-filled (False when only a subset was needed)
+        """
+        if steps is None or "version" in steps:
+            with timed_phase("version"):
+                self.versioning = self.new_versioning(scm)
+                self.versioning.auto_fill_version()
 
-        self.requirements = Requirements(self.pkg_info)
-        self.auto_fill_requires("install_requires")
-        self.auto_fill_entry_points()
-        self.auto_fill_license()
-        self.auto_fill_long_description()
-        self.auto_fill_include_package_data()
+        if steps is None or "urls" in steps:
+            with timed_phase("urls"):
+                self.fill_urls()
 
-        return self
+        if steps is None or "contacts" in steps:
+            self.auto_adjust("author", self.extract_email)
+            self.auto_adjust("contact", self.extract_email)
+            self.auto_adjust("maintainer", self.extract_email)
+
+        if steps is not None:
+            if "license" in steps:
+                with timed_phase("license"):
+                    self.auto_fill_license()
+
+            if "long_description" in steps:
+                with timed_phase("long_description"):
+                    self.auto_fill_long_description()
+
+            return False
+
+        with timed_phase("requirements"):
+            self.auto_fill_requires("install_requires")
+
+        with timed_phase("entry_points"):
+            self.auto_fill_entry_points()
+
+        with timed_phase("license"):
+            self.auto_fill_license()
+
+        with timed_phase("long_description"):
+            self.auto_fill_long_description()
+
+        self.auto_fill_include_package_data()
+        return True
 
     def resolved_url(self, url, base=None):
         """
@@ -612,21 +977,19 @@ class SetupMeta(Settings):
         """
         if not setup_py_path:
             # Determine path to 'setup.py' module from call stack
-            for frame in inspect.stack():
-                module = inspect.getmodule(frame[0])
-                if module and is_setup_py_path(module.__file__):
-                    setup_py_path = module.__file__
-                    trace("setup.py found from call stack: %s" % setup_py_path)
-                    break
+            setup_py_path = setup_py_from_stack()
+            if setup_py_path:
+                trace("setup.py found from call stack: %s", setup_py_path)
 
-        if not setup_py_path and sys.argv and is_setup_py_path(sys.argv[0]):
-            setup_py_path = sys.argv[0]
-            trace("setup.py found from sys.argv: %s" % setup_py_path)
+        context = current_context()
+        if not setup_py_path and context.argv and is_setup_py_path(context.argv[0]):
+            setup_py_path = context.argv[0]
+            trace("setup.py found from sys.argv: %s", setup_py_path)
 
         if is_setup_py_path(setup_py_path):
             setup_py_path = os.path.abspath(setup_py_path)
-            MetaDefs.project_dir = os.path.dirname(setup_py_path)
-            trace("project dir: %s" % MetaDefs.project_dir)
+            context.project_dir = os.path.dirname(setup_py_path)
+            trace("project dir: %s", context.project_dir)
 
     def extract_short_description(self, contents):
         """
@@ -707,8 +1070,10 @@ class SetupMeta(Settings):
     def auto_fill_include_package_data(self):
         """Autofill 'include_package_data' if a MANIFEST.in file exists in project"""
         if "include_package_data" not in self.attrs:
-            manifest = os.path.join(MetaDefs.project_dir, "MANIFEST.in")
-            if os.path.isfile(manifest):
+            project_dir = current_context().project_dir
+            manifest = os.path.join(project_dir, "MANIFEST.in")
+            track_folder(project_dir)
+            if is_file(manifest):
                 self.add_definition("include_package_data", True, os.path.basename(manifest))
 
     def auto_fill(self, field, value, source="auto-fill", override=False):
@@ -737,3 +1102,23 @@ class SetupMeta(Settings):
         if m:
             yield field, m.group(1)
             yield field_email, m.group(2)
+
+
+def evaluated_project(project_dir, attrs=None, argv=None, environ=None, scm_queries=None):
+    """
+    Compute definitions of project in 'project_dir' without touching process-wide state (no chdir, sys.argv or os.environ),
+    can be called concurrently from several threads.
+
+    Args:
+        project_dir (str): Path to project folder
+        attrs (dict | None): Explicit attributes, as would be given to setup()
+        argv (list[str] | None): Command line to consider (default: none, as in a plain 'setup.py' invocation)
+        environ (dict | None): Env vars to consider (default: a snapshot of os.environ)
+        scm_queries (dict | None): Results of read-only SCM queries, shareable between projects from the same checkout
+
+    Returns:
+        (SetupMeta): Evaluated project
+    """
+    context = EvaluationContext(project_dir, argv=argv, environ=environ, scm_queries=scm_queries)
+    meta = SetupMeta(context=context)
+    return meta.finalize(dict(attrs or {}))
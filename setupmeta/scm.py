@@ -1,10 +1,31 @@
+import json
 import os
 import re
+import shlex
 import sys
 
 import setupmeta
-
-RE_BRANCH_STATUS = re.compile(r"^## (.+)\.\.\.(([^/]+)/)?([^ ]+)\s*(\[(.+)])?$")
+from setupmeta.gitdir import GitDir, READ_ERRORS
+
+SHAREABLE_QUERIES = {
+    "describe",
+    "diff",
+    "rev-list",
+    "rev-parse",
+    "status",
+}  # Read-only git commands whose output depends only on checkout state
+READ_ONLY_COMMANDS = SHAREABLE_QUERIES | {
+    "config",
+    "for-each-ref",
+    "log",
+    "ls-remote",
+    "show-ref",
+}  # Git commands that don't modify checkout state
+TAG_FORMAT = "%(refname:strip=2)%00%(objecttype)%00%(objectname)%00%(*objecttype)%00%(*objectname)%00%(creatordate:unix)"
+DESCRIBE_CHUNK = 64  # Number of first-parent commits to look at initially when looking for most recent tag (doubled as needed)
+DEEPEN_CHUNK = 64  # Number of commits to initially deepen shallow clones by, when no version tag is reachable (doubled as needed)
+DEFAULT_SHALLOW_DEPTH = 4096  # Max number of commits to deepen shallow clones by (env var SETUPMETA_SHALLOW_DEPTH, 0: don't deepen)
+RE_DESCRIBE_SUFFIX = re.compile(r"-\d+-g\w+(-dirty)?$")  # Distance, commit id and dirty marker, as output by git describe --long
 RE_GIT_DESCRIBE = re.compile(r"^v?([0-9]+\.[0-9]+.+?)(-\d+)?(-g\w+)?(-dirty)?$", re.IGNORECASE)  # Output expected from git describe
 
 
@@ -12,6 +33,7 @@ class Scm:
     """API used by setupmeta for versioning using SCM tags"""
 
     version_tag = None  # type: str # Format for tags to consider as version tags in underlying SCM, when applicable
+    distance_path = None  # type: str # Path (relative to root) commits must touch to count in version distance (None: count all)
 
     def __init__(self, root):
         """
@@ -58,6 +80,28 @@ class Scm:
         :return Version: Current version as computed from latest SCM version tag
         """
 
+    def version_history(self, refs=None, rev="HEAD"):
+        """
+        Args:
+            refs (list[str] | None): Refs to report version of (None: every commit of 'rev' first-parent history)
+            rev (str): Revision whose first-parent history to report, when no 'refs' are given
+
+        Returns:
+            (iterable | None): (ref, commit id, Version) of each ref, None if SCM can't report history
+        """
+
+    def head_oid(self):
+        """
+        Returns:
+            (str | None): Commit id of HEAD, if known
+        """
+
+    def fingerprint(self):
+        """
+        Returns:
+            (dict | None): State of the SCM that can affect computed version, None if it can't be cheaply determined
+        """
+
     def commit_files(self, commit, push, relative_paths, next_version):
         """
         Commit modified files with 'relative_paths', commit message will be of the form "Version v1.0.0"
@@ -79,6 +123,57 @@ class Scm:
         """
 
 
+def exported_text(values, fmt="dotenv"):
+    """
+    Args:
+        values (dict): Env vars to export (such as SCM_DESCRIBE)
+        fmt (str): Format to use: 'dotenv' (lines of the form 'export NAME=value', can be sourced by shell too) or 'json'
+
+    Returns:
+        (str): Contents of file to write
+    """
+    if fmt == "json":
+        return "%s\n" % json.dumps(values, indent=2, sort_keys=True)
+
+    if fmt != "dotenv":
+        setupmeta.abort("Unsupported export format '%s', use 'dotenv' or 'json'" % fmt)
+
+    return "".join("export %s=%s\n" % (name, shlex.quote(str(value))) for name, value in sorted(values.items()) if value is not None)
+
+
+def read_exported(path):
+    """
+    Args:
+        path (str): Path to file written by exported_text() (either format)
+
+    Returns:
+        (dict | None): Exported env vars, None if file could not be read
+    """
+    try:
+        with open(path) as fh:
+            text = fh.read()
+
+        if text.lstrip().startswith("{"):
+            return json.loads(text)
+
+        values = {}
+        for line in text.splitlines():
+            words = shlex.split(line, comments=True)
+            if words and words[0] == "export":
+                words = words[1:]
+
+            for word in words:
+                name, _, value = word.partition("=")
+                values[name] = value
+
+    except (OSError, ValueError) as e:
+        setupmeta.trace("could not read %s: %s", path, e)
+        return None
+
+    else:
+        return values
+
+
 class Snapshot(Scm):
     """
     Implementation for cases where project lives in a sub-folder of a git checkout
@@ -86,18 +181,36 @@ class Snapshot(Scm):
     If one runs: python -m pip wheel ...
     pip copies current folder to a temp location, and invokes setup.py there, any .git info is lost in that case
     This implementation allows to still be able to properly determine version even in that case
+
+    Also used when 'setup.py export_env' was ran by a previous (CI) step, so that later steps don't need to query git again
     """
 
+    def __init__(self, root, exported=None):
+        """
+        Args:
+            root (str): Path to project folder
+            exported (dict | None): Values exported by 'setup.py export_env', if any
+        """
+        super().__init__(root)
+        self.exported = exported or {}
+
     def is_dirty(self):
-        v = os.environ.get(setupmeta.SCM_DESCRIBE)
+        v = self.exported.get(setupmeta.SCM_DESCRIBE) or setupmeta.getenv(setupmeta.SCM_DESCRIBE)
         return v and "dirty" in v
 
     def get_branch(self):
-        """Consider branch to be always HEAD for snapshots"""
-        return "HEAD"
+        """Consider branch to be always HEAD for snapshots (unless branch was exported)"""
+        return self.exported.get("SCM_BRANCH") or "HEAD"
+
+    def head_oid(self):
+        return self.exported.get("SCM_COMMIT")
 
     def get_version(self):
-        v = os.environ.get(setupmeta.SCM_DESCRIBE)
+        v = self.exported.get(setupmeta.SCM_DESCRIBE)
+        if v:
+            return Git.parsed_git_describe(v, origin=setupmeta.EXPORT_FILE)
+
+        v = setupmeta.getenv(setupmeta.SCM_DESCRIBE)
         if v:
             return Git.parsed_git_describe(v, origin="env var SCM_DESCRIBE")
 
@@ -105,11 +218,195 @@ class Snapshot(Scm):
         with open(path) as fh:
             return Git.parsed_git_describe(fh.readline(), origin=path)
 
+    def fingerprint(self):
+        path = os.path.join(self.root, setupmeta.VERSION_FILE)
+        return {
+            "describe": setupmeta.getenv(setupmeta.SCM_DESCRIBE),
+            "exported": self.exported,
+            "version_file": setupmeta.file_signature(path),
+        }
+
+
+class GitStatus:
+    """State of a git checkout, as reported by one 'git status --porcelain=v2 --branch' invocation"""
+
+    def __init__(self, text):
+        """
+        Args:
+            text (str): Output of 'git status --porcelain=v2 --branch --untracked-files=no'
+        """
+        self.oid = None  # type: str # Commit id of HEAD (None if there are no commits yet)
+        self.branch = None  # type: str # Current branch ('HEAD' when detached, as 'git rev-parse --abbrev-ref HEAD' would report it)
+        self.upstream = None  # type: str # Upstream branch, if any (example: origin/main)
+        self.ahead = None  # type: int # Number of commits ahead of upstream (None if upstream is not known)
+        self.behind = None  # type: int # Number of commits behind upstream (None if upstream is not known)
+        self.dirty = False  # type: bool # True if there are pending changes to tracked files (staged or not)
+        for line in text.splitlines():
+            if line.startswith("# branch.oid "):
+                oid = line[13:].strip()
+                self.oid = None if oid == "(initial)" else oid
+
+            elif line.startswith("# branch.head "):
+                branch = line[14:].strip()
+                self.branch = "HEAD" if branch == "(detached)" else branch
+
+            elif line.startswith("# branch.upstream "):
+                self.upstream = line[18:].strip()
+
+            elif line.startswith("# branch.ab "):
+                ahead, _, behind = line[12:].strip().partition(" ")
+                self.ahead = setupmeta.to_int(ahead.lstrip("+"), default=0)
+                self.behind = setupmeta.to_int(behind.lstrip("-"), default=0)
+
+            elif line[:2] in ("1 ", "2 ", "u "):
+                self.dirty = True
+
+    def __repr__(self):
+        return "%s%s%s" % (self.branch, " [%s]" % self.upstream_state if self.upstream_state else "", " (dirty)" if self.dirty else "")
+
+    @property
+    def upstream_state(self):
+        """
+        Returns:
+            (str | None): State of branch compared to its upstream, if any, example: 'behind 1', 'ahead 1, behind 2', 'gone'
+        """
+        if self.upstream and self.ahead is None:
+            return "gone"
+
+        state = []
+        if self.ahead:
+            state.append("ahead %s" % self.ahead)
+
+        if self.behind:
+            state.append("behind %s" % self.behind)
+
+        return ", ".join(state) or None
+
 
 class Git(Scm):
     """Implementation for git"""
 
+    _branch_committed = False  # type: bool # True if commit_files() made a version commit, to be pushed by apply_tag()
     _has_origin = None
+    _git_dir = None
+    _status = None
+    _tag_index = None
+    _clean = None  # type: bool # Memoized result of in_process_is_clean()
+    _deepened = False  # type: bool # True if shallow clone was deepened (packs and tags changed since last look)
+
+    @property
+    def git_dir(self):
+        """
+        Returns:
+            (str): Path to .git folder (resolves 'gitdir:' indirection used by worktrees and submodules)
+        """
+        if self._git_dir is None:
+            self._git_dir = os.path.join(self.root, ".git")
+            if os.path.isfile(self._git_dir):
+                with open(self._git_dir) as fh:
+                    text = fh.read().strip()
+
+                if text.startswith("gitdir:"):
+                    self._git_dir = os.path.normpath(os.path.join(self.root, text[7:].strip()))
+
+        return self._git_dir
+
+    @property
+    def common_dir(self):
+        """
+        Returns:
+            (str): Path to folder holding refs and objects (differs from 'git_dir' for worktrees)
+        """
+        path = os.path.join(self.git_dir, "commondir")
+        if os.path.isfile(path):
+            with open(path) as fh:
+                return os.path.normpath(os.path.join(self.git_dir, fh.read().strip()))
+
+        return self.git_dir
+
+    def ref_oid(self, ref):
+        """
+        Args:
+            ref (str): Full ref name, example: refs/heads/main
+
+        Returns:
+            (str | None): Object id 'ref' points to, read directly from .git (loose ref, or packed-refs)
+        """
+        for folder in (self.git_dir, self.common_dir):
+            path = os.path.join(folder, ref)
+            if os.path.isfile(path):
+                with open(path) as fh:
+                    return fh.read().strip()
+
+        path = os.path.join(self.common_dir, "packed-refs")
+        if os.path.isfile(path):
+            with open(path) as fh:
+                for line in fh:
+                    oid, _, name = line.strip().partition(" ")
+                    if name == ref:
+                        return oid
+
+        return None
+
+    def head_oid(self):
+        """
+        Returns:
+            (str | None): Commit id of HEAD, read directly from .git (without spawning git)
+        """
+        path = os.path.join(self.git_dir, "HEAD")
+        if not os.path.isfile(path):
+            return None
+
+        with open(path) as fh:
+            head = fh.read().strip()
+
+        if head.startswith("ref:"):
+            return self.ref_oid(head[4:].strip())
+
+        return head
+
+    def refs_fingerprint(self, folder="refs/tags"):
+        """
+        Args:
+            folder (str): Refs sub-folder to fingerprint
+
+        Returns:
+            (list): Signatures of 'packed-refs' and loose refs under 'folder', changes whenever a ref is added/removed/modified
+        """
+        result = [setupmeta.file_signature(os.path.join(self.common_dir, "packed-refs"))]
+        pending = [(os.path.join(self.common_dir, folder), "")]
+        while pending:
+            path, prefix = pending.pop()
+            try:
+                entries = sorted(os.scandir(path), key=lambda e: e.name)
+
+            except OSError:
+                continue
+
+            folders = []
+            for entry in entries:
+                if entry.is_dir():
+                    folders.append((entry.path, "%s%s/" % (prefix, entry.name)))
+
+                else:
+                    st = entry.stat()
+                    result.append([prefix + entry.name, [st.st_mtime_ns, st.st_size]])
+
+            pending.extend(reversed(folders))
+
+        return result
+
+    def fingerprint(self):
+        return {
+            "describe_command": setupmeta.getenv("SETUPMETA_GIT_DESCRIBE_COMMAND"),
+            "distance_path": self.distance_path,
+            "head": self.head_oid(),
+            "index": setupmeta.file_signature(os.path.join(self.git_dir, "index")),
+            "root": self.root,
+            "shallow": setupmeta.file_signature(os.path.join(self.common_dir, "shallow")),
+            "shallow_depth": setupmeta.getenv("SETUPMETA_SHALLOW_DEPTH"),
+            "tags": self.refs_fingerprint(),
+        }
 
     def _get_tags(self, *cmd):
         text = self.git_output(*cmd)
@@ -124,8 +421,72 @@ class Git(Scm):
 
     def local_tags(self):
         """Get all local tags"""
+        index = self.tag_index()
+        if index is not None:
+            return {entry[-1].rpartition("/")[2] for entry in index.versions}
+
         return self._get_tags("show-ref", "--tags", "-d")
 
+    def tag_index(self):
+        """
+        Returns:
+            (setupmeta.cache.TagIndex | None): Up to date index of tags, if there is a cache location
+        """
+        if self._tag_index is None:
+            from setupmeta.cache import cache_folder, TagIndex
+
+            folder = self.head_oid() and cache_folder(self)
+            if not folder:
+                self._tag_index = False
+                return None
+
+            index = TagIndex(folder)
+            fingerprint = self.refs_fingerprint()
+            if index.fingerprint != fingerprint:
+                names = index.changed_names(fingerprint)
+                index.update(fingerprint, self.tag_entries(names), names)
+
+            self._tag_index = index
+
+        return self._tag_index or None
+
+    def tag_entries(self, names=None):
+        """
+        Args:
+            names (set[str] | None): Names of tags to query (None: all)
+
+        Returns:
+            (dict): Tag name -> [commit id, id of object tag points to (None if same as commit), is annotated, tagger date]
+        """
+        patterns = ["refs/tags"] if names is None else ["refs/tags/%s" % name for name in sorted(names)]
+        if not patterns:
+            return {}
+
+        result = {}
+        nested = []
+        for line in self.git_output("for-each-ref", "--format=%s" % TAG_FORMAT, *patterns).splitlines():
+            name, kind, oid, target_kind, target, date = line.split("\0")
+            if kind != "tag":
+                result[name] = [oid, None, False, None] if kind == "commit" else [None, oid, False, None]
+
+            elif target_kind == "commit":
+                result[name] = [target, None, True, setupmeta.to_int(date)]
+
+            else:
+                result[name] = [None, target, True, setupmeta.to_int(date)]
+                nested.append(name)
+
+        if nested:  # Tags of tags: peel them all the way down to the commit they point to
+            peeled = self.run_program("rev-parse", *("refs/tags/%s^{commit}" % name for name in nested))
+            commits = [] if peeled.returncode else peeled.stdout.splitlines()
+            if len(commits) != len(nested):  # Some tag doesn't peel to a commit (output is then unusable): peel them one by one
+                commits = [self.run_program("rev-parse", "-q", "--verify", "refs/tags/%s^{commit}" % n).stdout or None for n in nested]
+
+            for i, name in enumerate(nested):
+                result[name][0] = commits[i]
+
+        return result
+
     def remote_tags(self):
         """Get all remote tags"""
         return self._get_tags("ls-remote", "--tags")
@@ -146,20 +507,49 @@ class Git(Scm):
             setupmeta.warn("Ignoring invalid version from %s: %s" % (origin, text))
             return Version(main="0.0.0", dirty=True)
 
+    def status(self):
+        """
+        Returns:
+            (GitStatus): Branch, upstream state and dirtiness of checkout, queried once (until git is used to modify checkout)
+        """
+        if self._status is None:
+            self._status = GitStatus(self.git_output("status", "--porcelain=v2", "--branch", "--untracked-files=no", "--ignore-submodules"))
+
+        return self._status
+
     def is_dirty(self):
+        """Checks both the working tree and index (tracked files only)"""
+        if self._status is None and setupmeta.getenv("SETUPMETA_GIT_BACKEND") == "python":
+            if self._clean is None:
+                self._clean = self.in_process_is_clean()
+
+            if self._clean:
+                return False
+
+        return self.status().dirty
+
+    def in_process_is_clean(self):
         """
-        This checks both the working tree and index, in a single command.
-        Ref: https://stackoverflow.com/a/2659808/15690
+        Returns:
+            (bool): True if checkout is clean, determined by comparing worktree files with stat info recorded in index,
+                    stopping at first difference. False if checkout may be dirty (git status must be used to tell)
         """
-        result = self.run_git("diff", "--quiet", "--ignore-submodules", fatal=False)
-        if result.returncode == 0:
-            result = self.run_git("diff", "--quiet", "--ignore-submodules", "--staged", fatal=False)
+        try:
+            change = GitDir(self.git_dir, self.common_dir).first_change(self.root)
 
-        return result.returncode != 0
+        except READ_ERRORS as e:
+            setupmeta.trace("in-process dirty check not possible, using git: %s", e)
+            return False
+
+        if change:
+            setupmeta.trace("in-process dirty check: '%s' may have changed, using git", change)
+            return False
+
+        setupmeta.trace("in-process dirty check: clean")
+        return True
 
     def get_branch(self):
-        branch = self.git_output("rev-parse", "--abbrev-ref", "HEAD")
-        return branch and branch.strip()
+        return self.status().branch
 
     def get_diff_report(self):
         return self.git_output("diff", "--stat")
@@ -169,82 +559,488 @@ class Git(Scm):
         Determine version tag from git
         Unfortunately 'git describe --match' does not accept regexes, otherwise we'd do '^v?[0-9]+\\.'
         """
-        override = os.environ.get("SETUPMETA_GIT_DESCRIBE_COMMAND")
+        override = setupmeta.getenv("SETUPMETA_GIT_DESCRIBE_COMMAND")
         if override:
             # Override was given, just use it as-is
-            setupmeta.trace("Using SETUPMETA_GIT_DESCRIBE_COMMAND: %s" % override)
+            setupmeta.trace("Using SETUPMETA_GIT_DESCRIBE_COMMAND: %s", override)
             cmd = override.split(" ")
             return self.git_output(*cmd)
 
-        version_tag = self.version_tag
-        cmd = ["describe", "--dirty", "--tags", "--long", "--first-parent", "--match"]
-        if version_tag:
+        patterns = self.version_patterns()
+        cache = self.version_cache(patterns)
+        text = cache.get("describe")
+        if text is None:
+            text = self.described(*patterns)
+            if self._deepened:
+                cache = self.version_cache(patterns)  # Deepening fetched more history (and tags): key changed
+
+            cache.set("describe", text)
+
+        # Dirtiness is not asked from 'git describe' (nor cached), it comes from status() (which also serves branch and upstream state)
+        if text and self.is_dirty():
+            text += "-dirty"
+
+        return text
+
+    def version_patterns(self):
+        """
+        Returns:
+            (list[str]): Glob patterns of tags to consider as version tags, in order of preference
+        """
+        if self.version_tag:
             # A custom version tag was configured, use it
-            setupmeta.trace("Using configured version_tag: %s" % version_tag)
-            return self.git_output(*cmd, version_tag)
+            setupmeta.trace("Using configured version_tag: %s", self.version_tag)
+            return [self.version_tag]
 
         # No overrides, try v*.* first, then fall back to '*.*' if need be
-        text = self.git_output(*cmd, "v*.*")
-        if not text:
-            # TODO(zsimic): Remove this for setupmeta v4.0
-            text = self.git_output(*cmd, "*.*")
+        # TODO(zsimic): Remove '*.*' for setupmeta v4.0
+        return ["v*.*", "*.*"]
+
+    def is_shallow(self):
+        """
+        Returns:
+            (bool): True if checkout is a shallow clone (history is truncated, typical of CI checkouts)
+        """
+        return os.path.isfile(os.path.join(self.common_dir, "shallow"))
+
+    def described(self, *patterns):
+        """
+        Args:
+            *patterns (str): Glob patterns of tags to consider, in order of preference
+
+        Returns:
+            (str): Output of 'git describe --tags --long --first-parent --match ...' for the first pattern that matches, if any
+                   Shallow clones are deepened (by doubling chunks) until a version tag is reachable, or up to SETUPMETA_SHALLOW_DEPTH
+        """
+        text = self.reachable_describe(*patterns)
+        budget = setupmeta.to_int(setupmeta.getenv("SETUPMETA_SHALLOW_DEPTH"), default=DEFAULT_SHALLOW_DEPTH)
+        if not text and budget > 0 and self.is_shallow() and not self.has_version_tags(*patterns):
+            budget = 0  # Deepening can't help (remote has no version tags, or can't be reached: offline build for example)
+
+        deepen = DEEPEN_CHUNK
+        while not text and budget > 0 and self.is_shallow():
+            deepen = min(deepen, budget)
+            setupmeta.trace("no version tag reachable in shallow clone, deepening by %s commits", deepen)
+            if self.run_git("fetch", "--deepen=%s" % deepen, fatal=False).returncode:
+                break
+
+            self._deepened = True
+            budget -= deepen
+            deepen *= 2
+            text = self.reachable_describe(*patterns)
+
+        if not text and self.is_shallow():
+            setupmeta.trace("no version tag reachable in shallow clone, distance is relative to shallow boundary")
 
         return text
 
+    def has_version_tags(self, *patterns):
+        """
+        Args:
+            *patterns (str): Glob patterns of tags to consider
+
+        Returns:
+            (bool): True if local checkout or its 'origin' remote has tags matching any of 'patterns'
+        """
+        index = self.tag_index()
+        if index is not None and any(index.tagged_commits(pattern) for pattern in patterns):
+            return True
+
+        # Shallow clones typically have no local tags: ask remote (quietly, not via run_git(): failing to reach it is not worth a warning)
+        result = self.run_program("ls-remote", "--tags", "origin", *("refs/tags/%s" % pattern for pattern in patterns))
+        if result.returncode:
+            setupmeta.trace("could not list remote tags, not deepening shallow clone: %s", result.stderr)
+            return False
+
+        return bool(result.stdout.strip())
+
+    def reachable_describe(self, *patterns):
+        """
+        Args:
+            *patterns (str): Glob patterns of tags to consider, in order of preference
+
+        Returns:
+            (str): Output of 'git describe --tags --long --first-parent --match ...' for the first pattern that matches, if any
+        """
+        if setupmeta.getenv("SETUPMETA_GIT_BACKEND") == "python":
+            text = self.in_process_describe(*patterns)
+            if text is not None:
+                return text
+
+        text = self.indexed_describe(*patterns)
+        if text is not None:
+            return text
+
+        text = ""
+        for pattern in patterns:
+            text = self.git_output("describe", "--tags", "--long", "--first-parent", "--match", pattern)
+            if text:
+                break
+
+        return text
+
+    def version_cache(self, patterns):
+        """
+        Args:
+            patterns (list[str]): Version tag patterns in use
+
+        Returns:
+            (setupmeta.cache.VersionCache): Cached results of git queries determining version at current HEAD
+        """
+        from setupmeta.cache import cache_folder, VersionCache
+
+        head = self.head_oid()
+        key = {
+            "head": head,
+            "packs": setupmeta.folder_signature(os.path.join(self.common_dir, "objects", "pack")),  # Abbreviations depend on repo size
+            "patterns": patterns,
+            "shallow": [setupmeta.file_signature(os.path.join(self.common_dir, "shallow")), setupmeta.getenv("SETUPMETA_SHALLOW_DEPTH")],
+            "tags": self.refs_fingerprint(),
+        }
+        return VersionCache(head and cache_folder(self), key)
+
+    def indexed_describe(self, *patterns):
+        """
+        Args:
+            *patterns (str): Glob patterns of tags to consider, in order of preference
+
+        Returns:
+            (str | None): Same output as 'git describe --tags --long --first-parent --match ...', computed by looking up
+                          first-parent commits (fetched in growing chunks) in the tag index, None if there is no tag index
+        """
+        index = self.tag_index()
+        if index is None:
+            return None
+
+        candidates = [index.tagged_commits(pattern) for pattern in patterns]
+        if not any(candidates):
+            return ""
+
+        found = [None] * len(patterns)
+        preferred = next(
+            i for i, tagged in enumerate(candidates) if tagged
+        )  # Patterns without any tag can't match, no need to wait for them
+        chain = []
+        count = DESCRIBE_CHUNK
+        while found[preferred] is None:
+            fmt = "--format=%H %h"
+            lines = self.git_output("log", "--first-parent", fmt, "--skip=%s" % len(chain), "-n", str(count), "HEAD").splitlines()
+            for line in lines:
+                oid, _, abbrev = line.partition(" ")
+                chain.append(abbrev)
+                for i, tagged in enumerate(candidates):
+                    if found[i] is None and oid in tagged:
+                        found[i] = (tagged[oid], len(chain) - 1)
+
+            if len(lines) < count:
+                break  # Reached root commit
+
+            count *= 2
+
+        for match in found:
+            if match:
+                tag, distance = match
+                abbrev = chain[0]
+                target = index.tags[tag][1]
+                if not distance and target:
+                    # On exact match, git shows the object an annotated tag directly points to (differs from HEAD for nested tags)
+                    abbrev = self.git_output("rev-parse", "--short", target)
+
+                text = "%s-%s-g%s" % (tag, distance, abbrev)
+                setupmeta.trace("indexed git describe: %s", text)
+                return text
+
+        return ""
+
+    def in_process_describe(self, *patterns):
+        """
+        Args:
+            *patterns (str): Glob patterns of tags to consider, in order of preference
+
+        Returns:
+            (str | None): Same output as 'git describe --tags --long --first-parent --match ...', computed by reading .git directly
+                          None if .git folder can't be read in-process (git must be used instead)
+        """
+        try:
+            described = GitDir(self.git_dir, self.common_dir).describe(*patterns)
+
+        except READ_ERRORS as e:  # Any problem reading .git directly: let git itself handle it
+            setupmeta.trace("in-process git describe not possible, using git: %s", e)
+            return None
+
+        if not described:
+            return ""
+
+        text = "%s-%s-g%s" % described
+        setupmeta.trace("in-process git describe: %s", text)
+        return text
+
+    def version_history(self, refs=None, rev="HEAD"):
+        """
+        Versions of many commits, computed in one walk of their first-parent history (instead of one 'git describe' per commit)
+
+        Args:
+            refs (list[str] | None): Refs to report version of (None: every commit of 'rev' first-parent history)
+            rev (str): Revision whose first-parent history to report, when no 'refs' are given
+
+        Yields:
+            (str, str | None, Version | None): Ref, commit id it points to and its version (both None if ref is not a known revision)
+        """
+        tips = [rev] if refs is None else self.resolved_commits(refs)
+        chain = {}  # Commit id -> (abbreviated commit id, first parent)
+        commits = []
+        tips_to_walk = [tip for tip in tips if tip]
+        if tips_to_walk:
+            for line in self.git_output("log", "--first-parent", "--format=%H %h %P", *tips_to_walk).splitlines():
+                oid, abbrev, *parents = line.split(" ")
+                chain[oid] = (abbrev, parents[0] if parents else None)
+                commits.append(oid)
+
+        index = self.tag_index()
+        if index is None:
+            from setupmeta.cache import TagIndex
+
+            index = TagIndex(None)
+            index.update(None, self.tag_entries())
+
+        candidates = [index.tagged_commits(pattern) for pattern in self.version_patterns()]
+        nearest = {}  # Commit id -> [(tag, distance)] for each pattern, tag being None (and distance counted to root) if none is reachable
+        for oid in commits:
+            path = []
+            while oid in chain and oid not in nearest:
+                path.append(oid)
+                oid = chain[oid][1]
+
+            below = nearest.get(oid) or [(None, 0)] * len(candidates)  # Root (or shallow boundary) reached if not computed yet
+            for oid in reversed(path):
+                below = [(candidates[i][oid], 0) if oid in candidates[i] else (tag, d + 1) for i, (tag, d) in enumerate(below)]
+                nearest[oid] = below
+
+        if refs is None:
+            refs = tips = commits
+
+        for i, ref in enumerate(refs):
+            oid = tips[i]  # resolved_commits() yields exactly one entry per ref (None for unknown revisions)
+            if oid not in chain:
+                yield ref, None, None
+                continue
+
+            abbrev = chain[oid][0]
+            version = None
+            for tag, distance in nearest[oid]:
+                if tag:
+                    version = self.parsed_git_describe("%s-%s-g%s" % (tag, distance, abbrev))
+                    break
+
+            if version is None:  # No version tag reachable, as in get_version() (but counting first-parent commits only)
+                version = Version(main=None, distance=nearest[oid][0][1], commitid="g%s" % abbrev)
+
+            yield ref, oid, version
+
+    def resolved_commits(self, refs):
+        """
+        Args:
+            refs (list[str]): Refs to resolve (branch or tag names, commit ids, 'HEAD~2' etc)
+
+        Returns:
+            (list[str | None]): Commit id each ref points to, None for refs that are not known revisions
+        """
+        if not refs:
+            return []
+
+        revisions = [None if not ref or ref.startswith("-") else "%s^{commit}" % ref for ref in refs]
+        if all(revisions):
+            result = self.run_program("rev-parse", *revisions)  # Not via run_git(): an invalid ref is not worth a warning
+            lines = result.stdout.splitlines()
+            if not result.returncode and len(lines) == len(refs):
+                return lines
+
+        # At least one ref is not valid: resolve them one by one, to tell which
+        return [(revision and self.git_output("rev-parse", "--verify", "--quiet", revision)) or None for revision in revisions]
+
     def get_version(self):
         text = self.git_describe_output()
         version = self.parsed_git_describe(text)
         if version:
+            if self.distance_path and version.distance:
+                tag = RE_DESCRIBE_SUFFIX.sub("", text)
+                distance = self.scoped_distance(self.tag_commit(tag))
+                if distance is not None:
+                    text = "%s-%s-%s%s" % (tag, distance, version.commitid, "-dirty" if version.dirty else "")
+                    version = self.parsed_git_describe(text)
+
             return version
 
         # Try harder
-        commitid = self.git_output("rev-parse", "--short", "HEAD")
-        commitid = "g%s" % commitid if commitid else ""
-        distance = self.git_output("rev-list", "HEAD")
-        distance = distance.count("\n") + 1 if distance else 0
+        cache = self.version_cache(None)
+        untagged = cache.get("untagged")
+        if untagged is None:
+            commitid = self.git_output("rev-parse", "--short", "HEAD")
+            untagged = ["g%s" % commitid if commitid else "", self.commit_count()]
+            cache.set("untagged", untagged)
+
+        commitid, distance = untagged
+        if self.distance_path and distance:
+            distance = self.scoped_distance(None)
+
         return Version(main=None, distance=distance, commitid=commitid, dirty=self.is_dirty())
 
+    def tag_commit(self, tag):
+        """
+        Args:
+            tag (str): Name of tag
+
+        Returns:
+            (str | None): Commit id 'tag' points to
+        """
+        index = self.tag_index()
+        if index is not None and tag in index.tags:
+            return index.tags[tag][0]
+
+        return self.git_output("rev-parse", "--verify", "--quiet", "refs/tags/%s^{commit}" % tag) or None
+
+    def scoped_distance(self, base):
+        """
+        Number of first-parent commits since 'base' that touched 'distance_path' (typically project folder in a monorepo)
+        Counts are cached per HEAD: when HEAD moves, only commits since the most recent cached HEAD are walked (path-filtered)
+
+        Args:
+            base (str | None): Commit id of version tag to count from (None: count from root commit)
+
+        Returns:
+            (int | None): Distance scoped to 'distance_path', None if it could not be determined
+        """
+        from setupmeta.cache import cache_folder, DistanceCache
+
+        head = self.head_oid()
+        if not head:
+            return None
+
+        cache = DistanceCache(cache_folder(self), base, self.distance_path)
+        cached = cache.heads
+        distance = cached.get(head)
+        if distance is not None:
+            return distance
+
+        # Look for most recent first-parent ancestor of HEAD whose scoped distance is already known
+        since = None
+        if cached:
+            walked = 0
+            count = DESCRIBE_CHUNK
+            while since is None:
+                cmd = ["rev-list", "--first-parent", "--skip=%s" % walked, "-n", str(count), head]
+                if base:
+                    cmd.append("^%s" % base)
+
+                lines = self.git_output(*cmd).splitlines()
+                since = next((oid for oid in lines if oid in cached), None)
+                if len(lines) < count:
+                    break  # Reached 'base' (or root commit)
+
+                walked += count
+                count *= 2
+
+        cmd = ["rev-list", "--first-parent", "--count", head]
+        if since:
+            cmd.append("^%s" % since)
+
+        elif base:
+            cmd.append("^%s" % base)
+
+        distance = setupmeta.to_int(self.git_output(*cmd, "--", self.distance_path), default=None)
+        if distance is None:
+            return None
+
+        if since:
+            distance += cached[since]
+
+        setupmeta.trace("distance scoped to '%s': %s", self.distance_path, distance)
+        cache.set(head, distance)
+        return distance
+
+    def commit_count(self):
+        """
+        Returns:
+            (int): Number of commits reachable from HEAD (counted without transferring the whole history from git)
+        """
+        if setupmeta.getenv("SETUPMETA_GIT_BACKEND") == "python":
+            try:
+                gitdir = GitDir(self.git_dir, self.common_dir)
+                head = gitdir.resolved_ref("HEAD")
+                return gitdir.commit_count(head) if head else 0
+
+            except READ_ERRORS as e:
+                setupmeta.trace("in-process commit count not possible, using git: %s", e)
+
+        return setupmeta.to_int(self.git_output("rev-list", "--count", "HEAD"), default=0)
+
     def has_origin(self):
         if self._has_origin is None:
             self._has_origin = bool(self.git_output("config", "--get", "remote.origin.url"))
 
         return self._has_origin
 
-    def commit_files(self, commit, push, relative_paths, next_version):
+    def commit_files(self, commit, push, relative_paths, next_version):  # noqa: ARG002, branch is pushed by apply_tag()
         if not relative_paths:
             return
 
         relative_paths = sorted(set(relative_paths))
         self.run_git("add", *relative_paths, dryrun=not commit, passthrough=True)
         self.run_git("commit", "-m", "Version %s" % next_version, "--no-verify", dryrun=not commit, passthrough=True)
-        if push:
-            if self.has_origin():
-                self.run_git("push", "origin", dryrun=not commit, passthrough=True)
+        self._branch_committed = True  # Branch is pushed by apply_tag(), atomically with the new tag
 
-            else:
-                print("Won't push: no origin defined")
+    def upstream(self, branch):
+        """
+        Args:
+            branch (str): Local branch name
+
+        Returns:
+            (tuple[str, str] | None): Remote name and ref that 'branch' tracks, if any (example: 'origin', 'refs/heads/main')
+        """
+        output = self.git_output("for-each-ref", "--format=%(upstream:remotename)%00%(upstream:remoteref)", "refs/heads/%s" % branch)
+        remote, _, ref = output.partition("\0")
+        if remote and ref:
+            return remote, ref
+
+    def upstream_state(self, branch):
+        """
+        Args:
+            branch (str): Local branch name
+
+        Returns:
+            (str): State of 'branch' compared to its upstream (example: 'behind 1', 'ahead 1, behind 2', 'gone'), without scanning worktree
+        """
+        return self.git_output("for-each-ref", "--format=%(upstream:track,nobracket)", "refs/heads/%s" % branch)
 
     def apply_tag(self, commit, push, next_version, branch):
-        self.run_git("fetch", "--all", dryrun=not commit, passthrough=True)
-        output = self.git_output("status", "--porcelain", "--branch")
-        for line in output.splitlines():
-            m = RE_BRANCH_STATUS.match(line)
-            if m and m.group(1) == branch:
-                state = m.group(6)
-                if state and ("behind" in state or "gone" in state):
-                    # Example: Local branch 'main' is out of date (behind 1), can't bump
-                    setupmeta.abort("Local branch '%s' is out of date (%s), can't bump" % (branch, state))
+        current_branch = self.get_branch()
+        upstream = current_branch == branch and self.upstream(branch)
+        if upstream:
+            # Fetch only the upstream branch (no tags): cost doesn't grow with number of tags or remotes
+            self.run_git("fetch", "--no-tags", *upstream, dryrun=not commit, passthrough=True)
+
+        state = current_branch == branch and self.upstream_state(branch)
+        if state and ("behind" in state or "gone" in state):
+            # Example: Local branch 'main' is out of date (behind 1), can't bump
+            setupmeta.abort("Local branch '%s' is out of date (%s), can't bump" % (branch, state))
 
         bump_msg = "Version %s" % next_version
         tag = "v%s" % next_version
 
         self.run_git("tag", "-a", tag, "-m", bump_msg, dryrun=not commit, passthrough=True)
         if push:
-            if self.has_origin():
-                self.run_git("push", "--tags", "origin", dryrun=not commit, passthrough=True)
+            # Push version commit (if any) and new tag in one go, to the remote branch is tracking: either both make it, or neither does
+            remote, remote_ref = upstream or ("origin", "refs/heads/%s" % current_branch)
+            refs = []
+            if self._branch_committed:
+                refs.append(current_branch if remote_ref == "refs/heads/%s" % current_branch else "%s:%s" % (current_branch, remote_ref))
+
+            refs.append("refs/tags/%s" % tag)
+            if upstream or self.has_origin():
+                self.run_git("push", "--atomic", remote, *refs, dryrun=not commit, passthrough=True)
 
             else:
-                print("Not running 'git push --tags origin' as you don't have an origin")
+                print("Not running 'git push --atomic origin %s' as you don't have an origin" % " ".join(refs))
 
     def git_output(self, *args) -> str:
         result = self.run_git(*args, fatal=False)
@@ -252,7 +1048,12 @@ class Git(Scm):
 
     def run_program(self, cmd, *args, announce=False, dryrun=False):
         """Used to make mocking easier"""
-        return setupmeta.run_program("git", cmd, *args, announce=announce, cwd=self.root, dryrun=dryrun)
+        env = setupmeta.current_context().subprocess_env
+        if cmd in READ_ONLY_COMMANDS:
+            # Don't refresh index as a side effect of queries ('git status' would), avoids contending on index.lock in parallel builds
+            env = dict(os.environ if env is None else env, GIT_OPTIONAL_LOCKS="0")
+
+        return setupmeta.run_program("git", cmd, *args, announce=announce, cwd=self.root, dryrun=dryrun, env=env)
 
     def run_git(self, *args, dryrun=False, fatal=True, passthrough=False):
         """
@@ -273,7 +1074,21 @@ class Git(Scm):
         -------
         setupmeta.RunResult
         """
-        result = self.run_program(*args, announce=passthrough, dryrun=dryrun)
+        queries = setupmeta.current_context().scm_queries
+        key = None
+        if queries is not None and not dryrun and not passthrough and args[0] in SHAREABLE_QUERIES:
+            # Projects evaluated in batch share the same queries, when they live in the same git checkout
+            key = (self.root, args)
+
+        result = queries.get(key) if key else None
+        if result is None:
+            result = self.run_program(*args, announce=passthrough, dryrun=dryrun)
+            if key:
+                queries[key] = result
+
+        if not dryrun and args[0] not in READ_ONLY_COMMANDS:
+            self._status = self._clean = self._tag_index = None  # Checkout state may have changed (fetch, commit, tag...)
+
         if result.returncode and result.stderr:
             if self.should_ignore_error(result):
                 result.returncode = 0
@@ -285,7 +1100,7 @@ class Git(Scm):
                 sys.stderr.write(f"{result.stderr}\n")
                 result.stderr = ""
 
-        if passthrough and os.environ.get("SETUPMETA_RUNNING_SCENARIOS"):
+        if passthrough and setupmeta.getenv("SETUPMETA_RUNNING_SCENARIOS"):
             passthrough = False  # Reduce chatter when running test scenarios
 
         if passthrough and result.stdout:
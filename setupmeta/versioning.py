@@ -3,10 +3,11 @@ import os
 import re
 
 import setupmeta
-from setupmeta.scm import Git, Snapshot, Version
+from setupmeta.scm import Git, read_exported, Snapshot, Version
 
 BUMPABLE = {"major", "minor", "patch"}
 DEFAULT_BRANCHES = "main,master"
+DISTANCE_SCOPES = (None, "checkout", "project")  # Which commits count in version distance: all commits, or only those touching project
 MAIN_BITS = {"{major}", "{minor}", "{patch}", "{distance}", "{post}", "{dev}"}
 RE_VERSIONING = re.compile(r"^(branch(\([\w\s,\-]+\))?:)?(.*?)([ +@#%^/;]!?(.*))?$")
 RE_BITS = re.compile(r"{[^}]*}")
@@ -38,23 +39,34 @@ def find_scm_root(root, name):
     return find_scm_root(parent, name)
 
 
-def project_scm(root):
+def project_scm(root, use_exported=True):
     """
     :param str root: Path to project folder
+    :param bool use_exported: Use values exported by a previous 'setup.py export_env', if any (instead of querying git)
     :return setupmeta.scm.Scm: SCM used by project, if any
     """
-    if os.environ.get(setupmeta.SCM_DESCRIBE):
+    if setupmeta.getenv(setupmeta.SCM_DESCRIBE):
         return Snapshot(root)
 
     scm_root = find_scm_root(os.path.abspath(root), ".git")
+    export_file = os.path.join(root, setupmeta.EXPORT_FILE)
+    if use_exported and setupmeta.is_file(export_file):
+        exported = read_exported(export_file)
+        if exported and exported.get(setupmeta.SCM_DESCRIBE):
+            # Exported by a previous step: use it as long as it's for the commit currently checked out (read without spawning git)
+            if not scm_root or Git(scm_root).head_oid() == exported.get("SCM_COMMIT"):
+                return Snapshot(root, exported=exported)
+
+            setupmeta.trace("ignoring stale %s, it was exported for another commit", export_file)
+
     if scm_root:
         return Git(scm_root)
 
     version_file = os.path.join(root, setupmeta.VERSION_FILE)
-    if os.path.isfile(version_file):
+    if setupmeta.is_file(version_file):
         return Snapshot(root)
 
-    setupmeta.trace("could not determine SCM for '%s'" % root)
+    setupmeta.trace("could not determine SCM for '%s'", root)
     return None
 
 
@@ -126,26 +138,7 @@ class VersionBit:
         """
         i = self.text.index("$")
         prefix = self.text[:i]
-        env_var = self.text[i + 1 :]
-        if env_var.startswith("*") and env_var.endswith("*"):
-            env_var = env_var[1:-1]
-            candidates = [n for n in os.environ if env_var in n]
-
-        elif env_var.startswith("*"):
-            env_var = env_var[1:]
-            candidates = [n for n in os.environ if n.endswith(env_var)]
-
-        elif env_var.endswith("*"):
-            env_var = env_var[:-1]
-            candidates = [n for n in os.environ if n.startswith(env_var)]
-
-        else:
-            candidates = [env_var]
-
-        value = None
-        if candidates:
-            value = os.environ.get(sorted(candidates)[0])
-
+        value = setupmeta.env_value(self.text[i + 1 :])
         if value is None:
             value = self.alternative
 
@@ -175,6 +168,7 @@ class Strategy:
         self.main = main
         self.extra = extra
         self.version_tag = kwargs.pop("version_tag", None)
+        self.distance_scope = kwargs.pop("distance_scope", None)
         if kwargs:
             setupmeta.warn("Ignored fields for 'versioning': %s" % kwargs)
 
@@ -201,8 +195,29 @@ class Strategy:
             all_bits = all_bits + self.extra_bits
 
         problems = [bit.problem for bit in all_bits if bit.problem]
+        if self.distance_scope not in DISTANCE_SCOPES:
+            problems.append("Invalid distance_scope '%s', expecting one of: %s" % (self.distance_scope, ", ".join(DISTANCE_SCOPES[1:])))
+
         self.problem = "\n".join(problems) if problems else None
 
+    def configured_scm(self, scm):
+        """
+        Args:
+            scm (Scm): SCM to configure as per this strategy (version tag pattern, path commits must touch to count in distance)
+
+        Returns:
+            (Scm): 'scm', configured
+        """
+        if self.version_tag:
+            scm.version_tag = self.version_tag
+
+        if self.distance_scope == "project":
+            path = os.path.relpath(setupmeta.current_context().project_dir, scm.root)
+            if path != ".":  # Project at root of checkout: all commits count anyway
+                scm.distance_path = path.replace(os.sep, "/")
+
+        return scm
+
     @staticmethod
     def formatted(branches, main, extra):
         if isinstance(branches, list):
@@ -415,8 +430,11 @@ class Versioning:
         self.strategy = Strategy.from_meta(given)
         self.enabled = bool(given and self.strategy and not self.strategy.problem)
         self.scm = scm
-        self.generate_version_file = scm and scm.root != setupmeta.MetaDefs.project_dir and not os.environ.get(setupmeta.SCM_DESCRIBE)
+        self.generate_version_file = (
+            scm and scm.root != setupmeta.current_context().project_dir and not setupmeta.getenv(setupmeta.SCM_DESCRIBE)
+        )
         self.problem = None
+        self.scm_version = None  # type: Version # Version as reported by SCM (before rendering via 'strategy')
         if not self.strategy:
             self.problem = "setupmeta versioning not enabled"
 
@@ -426,7 +444,7 @@ class Versioning:
         elif not self.scm:
             self.problem = "project not under a supported SCM"
 
-        setupmeta.trace("versioning given: '%s', strategy: [%s], problem: [%s]" % (given, self.strategy, self.problem))
+        setupmeta.trace("versioning given: '%s', strategy: [%s], problem: [%s]", given, self.strategy, self.problem)
 
     def auto_fill_version(self):
         """Autofill version as defined by 'self.strategy'"""
@@ -447,14 +465,13 @@ class Versioning:
             if self.strategy:
                 setupmeta.warn(self.problem)
 
-            setupmeta.trace("not auto-filling version due to problem: [%s]" % self.problem)
+            setupmeta.trace("not auto-filling version due to problem: [%s]", self.problem)
             return
 
         gv = self.scm.get_version()
+        self.scm_version = gv
         if self.generate_version_file:
-            path = setupmeta.project_path(setupmeta.VERSION_FILE)
-            with open(path, "w") as fh:
-                fh.write("%s" % gv)
+            self.write_version_file(gv)
 
         if gv.patch and "patch" not in self.strategy.bumpable:
             msg = "patch version component should be .0 for versioning strategy '%s', " % self.strategy
@@ -473,6 +490,51 @@ class Versioning:
 
         self.meta.auto_fill("version", rendered, self.scm.name, override=True)
 
+    def write_version_file(self, version):
+        """
+        :param Version|str version: Version to write to .setupmeta.version (used when project is in a sub-folder of a git checkout)
+        """
+        path = setupmeta.project_path(setupmeta.VERSION_FILE)
+        if not setupmeta.write_if_changed(path, "%s" % version):
+            return  # Unchanged: don't churn mtime (parallel builds of sibling projects, downstream build caches)
+
+        dir_index = setupmeta.current_context().dir_index
+        if dir_index is not None:
+            dir_index.forget(path)
+
+    def live_scm(self):
+        """
+        Returns:
+            (Scm): SCM reflecting current checkout (values exported by a previous 'setup.py export_env' are for read-only evaluation)
+        """
+        scm = self.scm
+        if isinstance(scm, Snapshot) and scm.exported:
+            scm = self.strategy.configured_scm(project_scm(scm.root, use_exported=False))
+
+        return scm
+
+    def exported_values(self):
+        """
+        Returns:
+            (dict): Env vars describing current version (to be exported for later steps, see 'setup.py export_env')
+        """
+        if self.problem:
+            setupmeta.abort(self.problem)
+
+        scm = self.live_scm()  # Export afresh, not from a previous export
+        gv = self.scm_version if scm is self.scm else scm.get_version()
+        describe = gv.text
+        if gv.dirty and not describe.endswith("-dirty"):
+            describe += "-dirty"  # Untagged versions don't have the '-dirty' marker (as they don't come from 'git describe')
+
+        return {
+            "SCM_BRANCH": scm.get_branch(),
+            "SCM_COMMIT": scm.head_oid(),
+            setupmeta.SCM_DESCRIBE: describe,
+            "SCM_DIRTY": "1" if gv.dirty else "0",
+            "SETUPMETA_VERSION": self.strategy.rendered(gv),
+        }
+
     def get_bump(self, what):
         if self.problem:
             setupmeta.abort(self.problem)
@@ -480,10 +542,38 @@ class Versioning:
         gv = self.scm.get_version()
         return self.strategy.bumped(what, gv)
 
-    def verify_remote_tags(self):
-        """Verify that remote tags are identical to local tags"""
-        local_tags = self.scm.local_tags()
-        remote_tags = self.scm.remote_tags()
+    def version_log(self, refs=None, rev="HEAD"):
+        """
+        Args:
+            refs (list[str] | None): Refs to report version of (None: every commit of 'rev' first-parent history)
+            rev (str): Revision whose first-parent history to report, when no 'refs' are given
+
+        Yields:
+            (dict): Ref, commit id, version as reported by SCM and as rendered by 'strategy' (or error) of each commit
+        """
+        if self.problem:
+            setupmeta.abort(self.problem)
+
+        history = self.scm.version_history(refs=refs, rev=rev)
+        if history is None:
+            setupmeta.abort("Version history is not available from %s" % self.scm.name)
+
+        for ref, commit, version in history:
+            if version is None:
+                yield {"ref": ref, "error": "unknown revision"}
+
+            else:
+                yield {"ref": ref, "commit": commit, "scm": version.text, "version": self.strategy.rendered(version)}
+
+    @staticmethod
+    def verify_remote_tags(local_tags, remote_tags):
+        """
+        Verify that remote tags are identical to local tags
+
+        Args:
+            local_tags (set[str]): Local tags
+            remote_tags (set[str]): Remote tags
+        """
         local_only = local_tags.difference(remote_tags)
         remote_only = remote_tags.difference(local_tags)
         if remote_only:
@@ -500,18 +590,24 @@ class Versioning:
         if self.problem:
             setupmeta.abort(self.problem)
 
+        self.scm = self.live_scm()  # Commit and tag via git, even if a previous step exported version info
+
         branch = simulate_branch or self.scm.get_branch()
         if branch not in self.strategy.branches:
             setupmeta.abort("Can't bump branch '%s', need one of %s" % (branch, self.strategy.branches))
 
-        gv = self.scm.get_version()
+        def local_state():
+            return self.scm.get_version(), self.scm.local_tags()
+
+        # Local queries and remote ones (network bound) are independent: run them concurrently
+        (gv, local_tags), remote_tags = setupmeta.concurrently(local_state, self.scm.remote_tags)
         if gv and gv.dirty:
             if commit:
                 setupmeta.abort("You have pending changes, can't bump")
 
             print("Note: you have pending changes, commit (or stash) them before using --commit")
 
-        self.verify_remote_tags()
+        self.verify_remote_tags(local_tags, remote_tags)
 
         next_version = self.strategy.bumped(what, gv)
 
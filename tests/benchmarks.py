@@ -0,0 +1,376 @@
+"""
+Micro-benchmarks of setupmeta hot paths
+
+Usage:
+    python tests/benchmarks.py [NAME...]
+"""
+
+import inspect
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import conftest
+
+import setupmeta.model
+from setupmeta.gitdir import GitDir
+from setupmeta.scm import Git
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register 'func' as a benchmark"""
+    BENCHMARKS[func.__name__.replace("bench_", "")] = func
+    return func
+
+
+def timed(func, number):
+    """
+    Returns:
+        (float): Average time, in microseconds, of one call to 'func'
+    """
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def at_depth(depth, func):
+    """Call 'func' with 'depth' extra frames on the call stack"""
+    if depth <= 0:
+        return func()
+
+    return at_depth(depth - 1, func)
+
+
+def legacy_stack_lookup():
+    """How setup.py used to be looked up in call stack"""
+    for frame in inspect.stack():
+        module = inspect.getmodule(frame[0])
+        if module and setupmeta.model.is_setup_py_path(module.__file__):
+            return module.__file__
+
+
+def uncached_stack_lookup():
+    setupmeta.model._STACK_SETUP_PY.clear()
+    return setupmeta.model.setup_py_from_stack()
+
+
+@benchmark
+def bench_find_project_dir(depth=200):
+    """Cost of finding setup.py from a call stack that is 'depth' frames deep"""
+    print("setup.py lookup with a %s frames deep call stack:" % depth)
+    for title, func, number in (
+        ("inspect.stack()", legacy_stack_lookup, 20),
+        ("frame walk", uncached_stack_lookup, 2000),
+        ("memoized", setupmeta.model.setup_py_from_stack, 2000),
+    ):
+        code = compile("result = at_depth(%s, func)" % depth, "setup.py", "exec")
+        namespace = {"at_depth": at_depth, "func": func}
+        # Code is compiled upfront (with a setup.py filename, to fake a setup.py frame), so that compilation is not timed
+        elapsed = timed(lambda code=code, namespace=namespace: exec(code, namespace), number)  # noqa: S102
+        print("  %-16s %10.1f us" % (title, elapsed))
+
+    setupmeta.model._STACK_SETUP_PY.clear()
+
+
+class SyscallCounter:
+    """Count calls to os.stat() and os.scandir() (isfile/isdir/exists/glob all end up calling one of those)"""
+
+    def __init__(self):
+        self.counts = {}
+        self.originals = {}
+
+    def __enter__(self):
+        for name in ("stat", "scandir"):
+            original = getattr(os, name)
+            self.originals[name] = original
+            setattr(os, name, self.counted(name, original))
+
+        return self
+
+    def __exit__(self, *_):
+        for name, original in self.originals.items():
+            setattr(os, name, original)
+
+    def counted(self, name, original):
+        def wrapper(*args, **kwargs):
+            self.counts[name] = self.counts.get(name, 0) + 1
+            return original(*args, **kwargs)
+
+        return wrapper
+
+    def __repr__(self):
+        return ", ".join("%s %s" % (v, k) for k, v in sorted(self.counts.items()))
+
+
+class NoIndex:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+def finalized_project(folder, name):
+    meta = setupmeta.model.SetupMeta()
+    meta.attrs["_setup_py_path"] = os.path.join(folder, "setup.py")
+    return meta.finalize({"name": name})
+
+
+@benchmark
+def bench_directory_index(folder=None, name="setupmeta"):
+    """File probes done by one finalize() of project in 'folder', with and without directory index"""
+    folder = folder or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ["SETUPMETA_CACHE"] = "0"
+    print("syscalls done by one finalize() of %s:" % folder)
+    for title, index in (("no index", NoIndex), ("with index", setupmeta.DirectoryIndex)):
+        setupmeta.model.DirectoryIndex = index
+        try:
+            with SyscallCounter() as counter:
+                finalized_project(folder, name)
+
+            print("  %-16s %s" % (title, counter))
+
+        finally:
+            setupmeta.model.DirectoryIndex = setupmeta.DirectoryIndex
+
+
+def fast_import_stream(commits, tag_distance=None):
+    """Stream for 'git fast-import', creating 'commits' commits, with a v1.0.0 tag 'tag_distance' commits behind HEAD (if given)"""
+    for i in range(1, commits + 1):
+        content = b"%d\n" % i
+        yield b"commit refs/heads/main\nmark :%d\n" % i
+        yield b"committer Tester <test@example.com> %d +0000\n" % (1500000000 + i)
+        yield b"data 1\nc\n"
+        if i > 1:
+            yield b"from :%d\n" % (i - 1)
+
+        yield b"M 644 inline counter.txt\ndata %d\n%s\n" % (len(content), content)
+        if tag_distance is not None and i == commits - tag_distance:
+            yield b"tag v1.0.0\nfrom :%d\ntagger Tester <test@example.com> %d +0000\ndata 1\nt\n" % (i, 1500000000 + i)
+
+
+def fast_import(folder, stream):
+    """Run 'git fast-import' in 'folder', feeding it given 'stream' of commands"""
+    # run_program() can't feed stdin, arguments are all known upfront here
+    subprocess.run([shutil.which("git"), "fast-import", "--quiet"], cwd=folder, input=b"".join(stream), check=True)  # noqa: S603
+
+
+def synthetic_repo(folder, commits, tag_distance=None):
+    """Create a git repo in 'folder' with a linear history of 'commits' commits"""
+    conftest.run_git("init", "-q", "-b", "main", folder)
+    fast_import(folder, fast_import_stream(commits, tag_distance))
+    conftest.run_git("checkout", "-q", "main", cwd=folder)
+
+
+@benchmark
+def bench_git_describe(commits=100000, tag_distance=50):
+    """'git describe' vs in-process describe, on a repo with 'commits' commits"""
+    with tempfile.TemporaryDirectory() as folder:
+        synthetic_repo(folder, commits, tag_distance=tag_distance)
+        git = Git(folder)
+        cmd = ["describe", "--tags", "--long", "--first-parent", "--match", "v*.*"]
+        expected = git.git_output(*cmd)
+        assert "%s-%s-g%s" % GitDir(git.git_dir).describe("v*.*") == expected
+        print("describe on a %s commits repo (tag %s commits behind HEAD): %s" % (commits, tag_distance, expected))
+        for title, func, number in (
+            ("git describe", lambda: git.git_output(*cmd), 20),
+            ("in-process", lambda: GitDir(git.git_dir).describe("v*.*"), 20),
+        ):
+            print("  %-16s %10.1f us" % (title, timed(func, number)))
+
+
+def wide_repo(folder, files):
+    """Create a git repo in 'folder' with one commit of 'files' files (spread over sub-folders of 100 files)"""
+    conftest.run_git("init", "-q", "-b", "main", folder)
+    stream = [b"commit refs/heads/main\ncommitter Tester <test@example.com> 1500000000 +0000\ndata 1\nc\n"]
+    stream.extend(b"M 644 inline d%d/f%d.txt\ndata 2\n%d\n\n" % (i // 100, i, i % 10) for i in range(files))
+    fast_import(folder, stream)
+    conftest.run_git("checkout", "-q", "main", cwd=folder)
+    conftest.run_git("commit", "-q", "--allow-empty", "-m", "cache-tree", cwd=folder)  # Populates cache-tree
+    time.sleep(0.1)  # Files written in the same instant as the index are "racily clean" (and reported as possibly dirty)
+    conftest.run_git("status", "--porcelain", cwd=folder)  # Rewrites index when it has racily clean entries
+
+
+def fresh_git_status(git):
+    return Git(git.root).status().dirty
+
+
+def fresh_in_process_check(git):
+    return GitDir(git.git_dir).first_change(git.root) is not None
+
+
+@benchmark
+def bench_dirty_check(files=1000):
+    """'git status' vs in-process dirty check (comparing worktree with stat info in index), on a checkout with 'files' files"""
+    with tempfile.TemporaryDirectory() as folder:
+        wide_repo(folder, files)
+        git = Git(folder)
+        assert fresh_git_status(git) is fresh_in_process_check(git) is False
+        print("dirty check of a %s files checkout:" % files)
+        for title, func in (("git status", fresh_git_status), ("in-process", fresh_in_process_check)):
+            print("  %-16s %10.1f us" % ("%s (clean)" % title, timed(lambda func=func: func(git), 3)))
+
+        with open(os.path.join(folder, "d0", "f0.txt"), "a") as fh:
+            fh.write("dirty\n")
+
+        for title, func in (("git status", fresh_git_status), ("in-process", fresh_in_process_check)):
+            print("  %-16s %10.1f us" % ("%s (dirty)" % title, timed(lambda func=func: func(git), 3)))
+
+
+def tagged_repo(folder, tags, untagged=3):
+    """Create a git repo in 'folder' with 'tags' commits each tagged with an annotated tag, followed by 'untagged' commits"""
+    conftest.run_git("init", "-q", "-b", "main", folder)
+    stream = []
+    for i in range(1, tags + untagged + 1):
+        stream.append(b"commit refs/heads/main\nmark :%d\ncommitter Tester <test@example.com> %d +0000\ndata 1\nc\n" % (i, 1500000000 + i))
+        if i > 1:
+            stream.append(b"from :%d\n" % (i - 1))
+
+        if i <= tags:
+            stream.append(b"tag v1.%d.0\nfrom :%d\ntagger Tester <test@example.com> %d +0000\ndata 1\nt\n" % (i, i, 1500000000 + i))
+
+    fast_import(folder, stream)
+    conftest.run_git("checkout", "-q", "main", cwd=folder)
+    conftest.run_git("pack-refs", "--all", cwd=folder)
+
+
+@benchmark
+def bench_tag_index(tags=40000):
+    """'git describe' vs tag index lookup, on a repo with 'tags' version tags"""
+    with tempfile.TemporaryDirectory() as folder:
+        tagged_repo(folder, tags)
+        git = Git(folder)
+        cmd = ["describe", "--tags", "--long", "--first-parent", "--match", "v*.*"]
+        expected = git.git_output(*cmd)
+        print("most recent tag in a repo with %s tags: %s" % (tags, expected))
+        started = time.perf_counter()
+        assert git.indexed_describe("v*.*") == expected
+        print("  %-16s %10.1f us" % ("index build", (time.perf_counter() - started) * 1e6))
+        conftest.run_git("tag", "v2.0.0", "HEAD~1", cwd=folder)
+        started = time.perf_counter()
+        text = Git(folder).indexed_describe("v*.*")
+        print("  %-16s %10.1f us" % ("index update", (time.perf_counter() - started) * 1e6))
+        assert text == git.git_output(*cmd)
+        for title, func, number in (
+            ("git describe", lambda: git.git_output(*cmd), 5),
+            ("show-ref -d", lambda: git._get_tags("show-ref", "--tags", "-d"), 5),
+            ("tag index", lambda: Git(folder).indexed_describe("v*.*"), 5),
+            ("tag index tags", lambda: Git(folder).local_tags(), 5),
+        ):
+            print("  %-16s %10.1f us" % (title, timed(func, number)))
+
+
+def legacy_bump_queries(folder):
+    """Queries 'version --bump' used to run one after the other"""
+    git = Git(folder)
+    git.get_branch()
+    git.get_version()
+    git._get_tags("show-ref", "--tags", "-d")
+    git.remote_tags()
+    return git.git_output("status", "--porcelain", "--branch", "--untracked-files=no")  # Used to re-scan worktree for ahead/behind
+
+
+def bump_queries(folder):
+    git = Git(folder)
+    branch = git.get_branch()
+
+    def local_state():
+        return git.get_version(), git.local_tags()
+
+    setupmeta.concurrently(local_state, git.remote_tags)
+    return git.upstream_state(branch)
+
+
+@benchmark
+def bench_bump_queries(files=20000):
+    """Queries done by 'version --bump', on a checkout with 'files' files and a local bare origin"""
+    os.environ["SETUPMETA_CACHE"] = "0"
+    with tempfile.TemporaryDirectory() as folder:
+        checkout = os.path.join(folder, "checkout")
+        origin = os.path.join(folder, "origin.git")
+        wide_repo(checkout, files)
+        conftest.run_git("tag", "v1.0.0", cwd=checkout)
+        conftest.run_git("clone", "-q", "--bare", checkout, origin)
+        conftest.run_git("remote", "add", "origin", "file://%s" % origin, cwd=checkout)
+        conftest.run_git("fetch", "-q", "origin", cwd=checkout)
+        conftest.run_git("branch", "-q", "--set-upstream-to", "origin/main", cwd=checkout)
+        print("bump queries on a %s files checkout:" % files)
+        for title, func in (("sequential", legacy_bump_queries), ("concurrent", bump_queries)):
+            print("  %-16s %10.1f us" % (title, timed(lambda func=func: func(checkout), 3)))
+
+
+def legacy_commit_count(git):
+    """How distance used to be determined when there is no version tag"""
+    output = git.git_output("rev-list", "HEAD")
+    return output.count("\n") + 1 if output else 0
+
+
+def in_process_commit_count(git):
+    gitdir = GitDir(git.git_dir)
+    return gitdir.commit_count(gitdir.resolved_ref("HEAD"))
+
+
+@benchmark
+def bench_commit_count(commits=100000):
+    """Counting commits of an untagged repo with 'commits' commits (used as distance when there is no version tag)"""
+    with tempfile.TemporaryDirectory() as folder:
+        synthetic_repo(folder, commits)
+        conftest.run_git("commit-graph", "write", "--reachable", cwd=folder)
+        git = Git(folder)
+        assert legacy_commit_count(git) == git.commit_count() == in_process_commit_count(git) == commits
+        print("commit count of a %s commits repo (with commit-graph):" % commits)
+        for title, func in (
+            ("rev-list", legacy_commit_count),
+            ("rev-list --count", Git.commit_count),
+            ("in-process", in_process_commit_count),
+        ):
+            elapsed = timed(lambda func=func: func(git), 3)
+            tracemalloc.start()
+            func(git)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print("  %-16s %10.1f us, peak python memory: %8.1f KB" % (title, elapsed, peak / 1024))
+
+
+def describe_each_commit(git):
+    """One 'git describe' per commit, as release notes tooling used to do"""
+    cmd = ["describe", "--tags", "--long", "--first-parent", "--match", "v*.*"]
+    return [git.run_program(*cmd, commit).stdout for commit in git.git_output("log", "--first-parent", "--format=%H").splitlines()]
+
+
+def history_walk(git):
+    return [version.text for _, _, version in Git(git.root).version_history()]
+
+
+@benchmark
+def bench_version_history(commits=500, tag_distance=250):
+    """Versions of every commit of a repo with 'commits' commits: one 'git describe' per commit vs one history walk"""
+    os.environ["SETUPMETA_CACHE"] = "0"
+    with tempfile.TemporaryDirectory() as folder:
+        synthetic_repo(folder, commits, tag_distance=tag_distance)
+        git = Git(folder)
+        described = describe_each_commit(git)
+        assert history_walk(git)[: tag_distance + 1] == described[: tag_distance + 1]  # Commits before tag are untagged
+        print("versions of all %s commits (tag %s commits behind HEAD):" % (commits, tag_distance))
+        for title, func, number in (
+            ("describe each", describe_each_commit, 1),
+            ("history walk", history_walk, 3),
+        ):
+            print("  %-16s %10.1f us" % (title, timed(lambda func=func: func(git), number)))
+
+
+def main(args):
+    names = args or sorted(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
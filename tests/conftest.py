@@ -9,7 +9,7 @@ import pytest
 
 import setupmeta
 from setupmeta.model import SetupMeta
-from setupmeta.scm import Git
+from setupmeta.scm import Git, GitStatus
 
 TESTS = os.path.abspath(os.path.dirname(__file__))
 PROJECT_DIR = os.path.dirname(TESTS)
@@ -44,6 +44,20 @@ def run_git(*args, cwd=None):
     return result
 
 
+@pytest.fixture
+def git_calls(monkeypatch):
+    """Record arguments of each git invocation done via Git.run_program(), yield the list of recorded argv tuples"""
+    calls = []
+    original = Git.run_program
+
+    def recorded_run_program(self, *args, **kwargs):
+        calls.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(Git, "run_program", recorded_run_program)
+    return calls
+
+
 @pytest.fixture
 def sample_project():
     """Yield a sample git project, seeded with files from tests/sample"""
@@ -247,7 +261,9 @@ class MockGit(Git):
         self.describe = describe
         self.branch = branch
         self.commitid = commitid
-        self.status_message = "## %s...origin/%s" % (branch, branch)
+        self.status_message = "# branch.head %s\n# branch.upstream origin/%s\n# branch.ab +0 -0" % (branch, branch)
+        if "-dirty" in describe:
+            self.status_message += "\n1 .M N... 100644 100644 100644 abc123 abc123 setup.py"
         self._local_tags = local_tags
         self._remote_tags = remote_tags
         Git.__init__(self, TESTS)
@@ -283,6 +299,8 @@ class MockGit(Git):
 
         if cmd == "describe":
             result.stdout = self.describe
+            if "--match" in args:
+                result.stdout = result.stdout.replace("-dirty", "")  # setupmeta gets dirtiness from 'git status'
             return result
 
         if cmd == "rev-parse":
@@ -290,7 +308,7 @@ class MockGit(Git):
             return result
 
         if cmd == "rev-list":
-            result.stdout = self.commitid
+            result.stdout = str(len(self.commitid.splitlines()))
             return result
 
         if cmd == "config":
@@ -305,6 +323,17 @@ class MockGit(Git):
             result.stdout = self._remote_tags
             return result
 
+        if cmd == "for-each-ref":
+            status = GitStatus(self.status_message)
+            if "remotename" in args[0]:
+                remote, _, branch = (status.upstream or "").partition("/")
+                result.stdout = "%s\0refs/heads/%s" % (remote, branch) if status.upstream else ""
+
+            else:
+                result.stdout = status.upstream_state or ""
+
+            return result
+
         if cmd.startswith("status"):
             result.stdout = self.status_message
             return result
@@ -0,0 +1,82 @@
+import concurrent.futures
+import json
+import os
+import shutil
+
+import setupmeta.batch
+from setupmeta.batch import batch_entries, main, project_entry, setup_py_attrs
+from setupmeta.scm import SHAREABLE_QUERIES
+
+from . import conftest
+
+SUB_PROJECT = """
+from setuptools import setup
+
+VERSIONING = "post"
+
+setup(name="%s", setup_requires=["setupmeta"], versioning="post", entry_points=VERSIONING)
+"""
+
+
+def add_sub_projects(sample_project, *names):
+    for name in names:
+        folder = os.path.join(sample_project, name)
+        os.mkdir(folder)
+        shutil.copy(os.path.join(sample_project, "sample.py"), os.path.join(folder, "%s.py" % name))
+        with open(os.path.join(folder, "setup.py"), "w") as fh:
+            fh.write(SUB_PROJECT % name)
+
+    conftest.run_git("add", *names)
+    conftest.run_git("commit", "-m", "Added sub-projects")
+
+
+def test_setup_py_attrs(sample_project):
+    add_sub_projects(sample_project, "foo")
+    attrs = {"name": "foo", "setup_requires": ["setupmeta"], "versioning": "post"}
+    assert setup_py_attrs(os.path.join(sample_project, "foo")) == (attrs, ["entry_points"])
+    assert setup_py_attrs(os.path.join(sample_project, "subfolder")) == ({}, [])
+
+
+def test_batch(sample_project, monkeypatch, git_calls):
+    add_sub_projects(sample_project, "foo", "bar")
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    projects = ["foo", "bar", "no-such-project"]
+    with conftest.capture_output():
+        foo, bar, missing = batch_entries(projects, jobs=1)
+
+    assert foo["project"] == os.path.join(sample_project, "foo")
+    assert foo["definitions"]["version"] == {"value": "0.0.0.post2", "sources": [["git", "0.0.0.post2"]]}
+    assert foo["definitions"]["name"]["value"] == "foo"
+    assert bar["definitions"]["name"]["value"] == "bar"
+    assert bar["definitions"]["py_modules"] == {"value": ["bar"], "sources": [["auto-fill", ["bar"]]]}
+    assert missing == {"project": os.path.join(sample_project, "no-such-project"), "error": "not a folder"}
+
+    # Both projects live in the same git checkout, git queries were done only once
+    assert git_calls
+    assert len(git_calls) == len(set(git_calls))
+
+    with conftest.capture_output() as logged:
+        assert main(["-j2", "foo", "bar"]) == 0
+        lines = logged.pop().splitlines()
+        assert [json.loads(line)["project"] for line in lines] == [foo["project"], bar["project"]]
+        assert main(["no-such-project"]) == 1
+
+    # Non-literal setup() attributes are reported, as output then differs from running setup.py
+    monkeypatch.undo()
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    entry = project_entry(foo["project"])
+    assert entry["warnings"] == ["setup() attributes ignored, as they are not literals: entry_points"]
+
+
+def test_batch_shares_queries_across_workers(sample_project, monkeypatch, git_calls):
+    names = ["foo", "bar", "baz", "qux"]
+    add_sub_projects(sample_project, *names)
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    monkeypatch.setattr(setupmeta.batch.concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor)  # To count calls
+    with conftest.capture_output():
+        entries = list(batch_entries(names, jobs=4))
+
+    assert [entry["definitions"]["name"]["value"] for entry in entries] == names
+    shared = [args for args in git_calls if args[0] in SHAREABLE_QUERIES]
+    assert shared
+    assert len(shared) == len(set(shared))  # Done once for the whole checkout, not once per worker
@@ -0,0 +1,133 @@
+import os
+import time
+
+import setupmeta
+from setupmeta.cache import is_json_native, MetaCache
+
+from . import conftest
+
+
+def backdate(folder, seconds=3600):
+    """Make all files in 'folder' look old enough to be cacheable"""
+    stamp = time.time() - seconds
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for name in files + dirs:
+            os.utime(os.path.join(root, name), (stamp, stamp))
+
+    os.utime(folder, (stamp, stamp))
+
+
+def finalized_sample(project):
+    with conftest.capture_output(), conftest.TestMeta(setup=os.path.join(project, "setup.py"), **SAMPLE_ATTRS) as meta:
+        return meta
+
+
+def sources_of(meta):
+    return {key: [str(s) for s in definition.sources] for key, definition in meta.definitions.items()}
+
+
+SAMPLE_ATTRS = {"name": "sample", "setup_requires": ["setupmeta"], "versioning": "post"}
+
+
+def test_json_native():
+    assert is_json_native(None)
+    assert is_json_native({"a": [1, 2.5, "b", True, None]})
+    assert not is_json_native(("a",))
+    assert not is_json_native({1: "a"})
+    assert not is_json_native([len])
+
+
+def test_cached_definitions(sample_project, monkeypatch):
+    monkeypatch.delenv("SETUPMETA_CACHE", raising=False)
+    backdate(sample_project)
+    cold = finalized_sample(sample_project)
+    assert not cold.cache.served
+    assert cold.cache.status == "no cached definitions yet"
+    assert cold.version == "0.0.0.post1"
+
+    with conftest.capture_output(), conftest.TestMeta(setup=os.path.join(sample_project, "setup.py"), **SAMPLE_ATTRS) as warm:
+        assert warm.cache.served
+        assert warm.cache.status.startswith("served from ")
+        assert warm.to_dict() == cold.to_dict()
+        assert sources_of(warm) == sources_of(cold)
+        assert warm.versioning.enabled
+        assert warm.requirements.install_requires.filled_requirements == ["click>7.0"]
+
+    # Explicit setup() attributes are part of the fingerprint
+    with conftest.capture_output(), conftest.TestMeta(setup=os.path.join(sample_project, "setup.py"), name="other") as meta:
+        assert not meta.cache.served
+        assert meta.cache.status == "setup() attributes changed"
+
+    # Modifying a file that was read invalidates cache
+    finalized_sample(sample_project)
+    with open(os.path.join(sample_project, "subfolder", "sub.txt"), "a") as fh:
+        fh.write("\nfoo\n")
+
+    meta = finalized_sample(sample_project)
+    assert meta.cache.status == "file subfolder/sub.txt changed, inputs were modified too recently to be cached"
+
+    # Inputs that were just modified are not cached (their mtime could still change within timestamp granularity)
+    meta = finalized_sample(sample_project)
+    assert not meta.cache.served
+    assert meta.cache.status == "file subfolder/sub.txt changed, inputs were modified too recently to be cached"
+
+    # Adding a file that was looked for (but absent) invalidates cache
+    backdate(sample_project)
+    finalized_sample(sample_project)
+    with open(os.path.join(sample_project, "README.rst"), "w") as fh:
+        fh.write("Sample project\n")
+
+    meta = finalized_sample(sample_project)
+    assert meta.cache.status == "file README.rst changed, inputs were modified too recently to be cached"
+    assert meta.value("description") == "Sample project"
+
+    # Committing changes HEAD, making checkout dirty is detected even if the modified file is not read by setupmeta
+    conftest.run_git("add", "README.rst", "subfolder/sub.txt")
+    conftest.run_git("commit", "-m", "Added README")
+    backdate(sample_project)
+    meta = finalized_sample(sample_project)
+    assert meta.cache.status == "git state changed"
+    assert meta.version == "0.0.0.post2"
+    with open(os.path.join(sample_project, ".gitignore"), "a") as fh:
+        fh.write("foo\n")
+
+    meta = finalized_sample(sample_project)
+    assert meta.cache.status == "checkout dirtiness changed"
+    assert meta.version == "0.0.0.post2+dirty"
+
+
+def test_cache_location(sample_project, monkeypatch):
+    backdate(sample_project)
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    meta = finalized_sample(sample_project)
+    assert not meta.cache.path
+    assert meta.cache.status == "cache disabled"
+
+    folder = os.path.join(os.path.dirname(sample_project), "cache")
+    monkeypatch.setenv("SETUPMETA_CACHE", folder)
+    finalized_sample(sample_project)
+    names = sorted(os.listdir(folder))
+    assert len(names) == 3
+    assert names[0].startswith("meta-")
+    assert names[1:] == ["tags.json", "versions.json"]
+    meta = finalized_sample(sample_project)
+    assert meta.cache.served
+
+    monkeypatch.delenv("SETUPMETA_CACHE")
+    cache = MetaCache(setupmeta.MetaDefs.project_dir, {}, None)
+    assert not cache.path
+    assert cache.status == "no cache location (project not in a git checkout)"
+
+    cache = MetaCache(sample_project, {"foo": {"bar"}}, meta.versioning.scm)
+    assert not cache.path
+    assert str(cache) == "setup() attributes are not cacheable"
+
+
+def test_explain_cached(sample_project):
+    backdate(sample_project)
+    output = conftest.invoke_setup_py(sample_project, "explain", "--cached")
+    assert output == "Definitions computed, not served from cache: no cached definitions yet"
+
+    output = conftest.invoke_setup_py(sample_project, "explain", "--cached")
+    assert output.startswith("Definitions served from ")
@@ -1,8 +1,11 @@
+import io
 import os
 import re
 from unittest.mock import patch
 
 import setupmeta
+import setupmeta.scm
+import setupmeta.versioning
 
 from . import conftest
 
@@ -57,7 +60,7 @@ def test_version(sample_project):  # noqa: ARG001, fixture
         """
             Not committing bump, use --commit to commit
             Would run: git tag -a v[\\d.]+ -m "Version [\\d.]+"
-            Not running 'git push --tags origin' as you don't have an origin
+            Not running 'git push --atomic origin refs/tags/v[\\d.]+' as you don't have an origin
         """,
     )
 
@@ -76,6 +79,18 @@ def test_version(sample_project):  # noqa: ARG001, fixture
         """,
     )
 
+    run_setup_py(
+        ["version", "--log=HEAD"], '"commit": "[0-9a-f]{40}", "ref": "[0-9a-f]{40}", "scm": "v0.0.0-1-g[0-9a-f]+", "version": "[\\d.]+"'
+    )
+    with patch("sys.stdin", io.StringIO("HEAD\n\nno-such-ref\n")):
+        run_setup_py(
+            ["version", "--log=-"],
+            """
+                {"commit": "[0-9a-f]{40}", "ref": "HEAD", "scm": "v0.0.0-1-g[0-9a-f]+", "version": "[\\d.]+"}
+                {"error": "unknown revision", "ref": "no-such-ref"}
+            """,
+        )
+
     run_setup_py(["version", "--show-next", "major"], "[\\d.]+")
     run_setup_py(["version", "--show-next", "minor"], "[\\d.]+")
     run_setup_py(["version", "--show-next", "foo"], "Can't bump 'foo'")
@@ -84,6 +99,65 @@ def test_version(sample_project):  # noqa: ARG001, fixture
     run_setup_py(["version", "-a", "patch"], "[\\d.]+", folder=conftest.PROJECT_DIR)
 
 
+def test_export_env(sample_project, monkeypatch):
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    written = []
+    atomic_write = setupmeta.atomic_write
+    monkeypatch.setattr(setupmeta, "atomic_write", lambda path, text: written.append(path) or atomic_write(path, text))
+    output = conftest.invoke_setup_py(sample_project, "export_env")
+    assert output.startswith("Exported version 0.0.1 to ")
+    export_file = os.path.join(sample_project, setupmeta.EXPORT_FILE)
+    assert written == [export_file]  # Written atomically, readers never see a partially written file
+    exported = setupmeta.scm.read_exported(export_file)
+    git = setupmeta.scm.Git(sample_project)
+    assert exported == {
+        "SCM_BRANCH": git.get_branch(),
+        "SCM_COMMIT": git.head_oid(),
+        "SCM_DESCRIBE": "v0.0.0-1-g%s" % git.git_output("rev-parse", "--short", "HEAD"),
+        "SCM_DIRTY": "0",
+        "SETUPMETA_VERSION": "0.0.1",
+    }
+
+    # Later steps don't query git at all
+    monkeypatch.setattr(setupmeta.scm.Git, "run_program", None)
+    scm = setupmeta.versioning.project_scm(sample_project)
+    assert isinstance(scm, setupmeta.scm.Snapshot)
+    assert scm.get_branch() == exported["SCM_BRANCH"]
+    assert conftest.invoke_setup_py(sample_project, "version") == "0.0.1"
+
+    # Exporting again queries git afresh
+    monkeypatch.undo()
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    with open(export_file) as fh:
+        assert conftest.invoke_setup_py(sample_project, "export_env", "--output=-") == fh.read().strip()
+
+    # Same in json format, with dirty checkout
+    with open(os.path.join(sample_project, "sample.py"), "a") as fh:
+        fh.write("# dirty\n")
+
+    conftest.invoke_setup_py(sample_project, "export_env", "--format=json")
+    with open(export_file) as fh:
+        assert fh.read().startswith("{")
+
+    exported = setupmeta.scm.read_exported(export_file)
+    assert exported["SCM_DIRTY"] == "1"
+    assert exported["SCM_DESCRIBE"].endswith("-dirty")
+    assert exported["SETUPMETA_VERSION"] == "0.0.1+dirty"
+    assert setupmeta.versioning.project_scm(sample_project).is_dirty()
+
+    # Export becomes stale as soon as HEAD moves
+    conftest.run_git("commit", "-q", "-am", "Another commit")
+    assert isinstance(setupmeta.versioning.project_scm(sample_project), setupmeta.scm.Git)
+    assert "Unsupported export format 'foo'" in conftest.invoke_setup_py(sample_project, "export_env", "--format=foo")
+
+    # Bump commits and tags via git, even when an export file for current commit is present
+    conftest.invoke_setup_py(sample_project, "export_env")
+    assert isinstance(setupmeta.versioning.project_scm(sample_project), setupmeta.scm.Snapshot)
+    output = conftest.invoke_setup_py(sample_project, "version", "--bump", "minor", "--commit")
+    assert 'Running: git tag -a v0.1.0 -m "Version 0.1.0"' in output
+    assert git.git_output("tag", "--points-at", "HEAD") == "v0.1.0"
+
+
 @patch("sys.stdout.isatty", return_value=True)
 @patch.dict(os.environ, {"TERM": "testing"})
 def test_console(*_):
@@ -100,3 +174,12 @@ def touch(folder, isdir, *paths):
         else:
             with open(full_path, "w") as fh:
                 fh.write("from setuptools import setup\nsetup(setup_requires='setupmeta')\n")
+
+
+def test_explain_timings(sample_project, monkeypatch):
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    output = conftest.invoke_setup_py(sample_project, "explain", "--timings")
+    lines = output.splitlines()
+    assert lines[0].startswith("phase ")
+    assert lines[-1].startswith("total ")
+    assert any(line.startswith("version ") for line in lines)
@@ -1,7 +1,14 @@
+import concurrent.futures
+import json
 import os
+import stat
+
+import pytest
 
 import setupmeta
 
+from . import conftest
+
 
 def test_shortening():
     assert setupmeta.short(None) == "None"
@@ -68,3 +75,133 @@ def test_stringify():
     assert setupmeta.listify("a b") == ["a", "b"]
     assert sorted(setupmeta.listify(set("ab"))) == ["a", "b"]
     assert setupmeta.listify(("a", "b")) == ["a", "b"]
+
+
+def test_content_cache(sample_project, monkeypatch):
+    monkeypatch.setattr(setupmeta.MetaDefs, "project_dir", sample_project)
+    path = os.path.join(sample_project, "foo.txt")
+    with open(path, "wb") as fh:
+        fh.write(b"line 1\r\nline 2\n")
+
+    with setupmeta.ContentCache() as cache:
+        assert setupmeta.readlines("foo.txt") == ["line 1\n", "line 2\n"]
+        assert setupmeta.readlines("foo.txt", limit=2) == ["line 1\n"]
+        assert cache.data(path) == b"line 1\r\nline 2\n"
+        assert cache.text(path) == "line 1\nline 2\n"
+        assert setupmeta.readlines("no-such-file") is None
+        assert str(cache) == "3 hits, 2 misses"
+
+        with open(path, "w") as fh:
+            fh.write("changed\n")
+
+        os.utime(path, ns=(0, 0))  # Ensure mtime differs, even on file systems with coarse granularity
+        assert setupmeta.readlines("foo.txt") == ["changed\n"]
+        assert str(cache) == "3 hits, 3 misses"
+
+    assert setupmeta.current_context().contents is None
+
+
+class Expensive:
+    def __init__(self):
+        self.rendered = 0
+
+    def __str__(self):
+        self.rendered += 1
+        return "expensive"
+
+
+def test_trace(monkeypatch):
+    expensive = Expensive()
+    monkeypatch.setattr(setupmeta, "TRACE_ENABLED", None)
+    setupmeta.trace("not shown: %s", expensive)
+    assert not expensive.rendered
+    assert not setupmeta.TRACE_SINK.buffer
+
+    monkeypatch.setattr(setupmeta, "TRACE_ENABLED", "info")
+    monkeypatch.setattr(setupmeta, "TRACE_LEVEL", setupmeta.TRACE_INFO)
+    with conftest.capture_output() as logged:
+        setupmeta.trace("debug: %s", expensive, level=setupmeta.TRACE_DEBUG)
+        setupmeta.trace("info: %s %s", expensive, setupmeta.LazyShort("a  b"))
+        assert not str(logged)  # Buffered until flushed
+        setupmeta.TRACE_SINK.flush()
+        assert str(logged) == ":: info: expensive a b"
+        assert expensive.rendered == 1
+
+    monkeypatch.setattr(setupmeta, "TRACE_LEVEL", setupmeta.TRACE_DEBUG)
+    monkeypatch.setattr(setupmeta, "TRACE_JSON", True)
+    with conftest.capture_output() as logged:
+        setupmeta.trace("debug: %s", expensive, level=setupmeta.TRACE_DEBUG, step="test")
+        setupmeta.TRACE_SINK.flush()
+        event = json.loads(str(logged))
+        assert event["level"] == "debug"
+        assert event["message"] == "debug: expensive"
+        assert event["step"] == "test"
+        assert isinstance(event["time"], float)
+
+    sink = setupmeta.TraceSink(capacity=2)
+    with conftest.capture_output() as logged:
+        sink.write("a\n")
+        assert not str(logged)
+        sink.write("b\n")
+        assert str(logged) == "a\nb"
+        assert not sink.buffer
+
+
+def test_concurrently():
+    assert setupmeta.concurrently() == []
+    assert setupmeta.concurrently(lambda: 1) == [1]
+    with setupmeta.EvaluationContext(conftest.TESTS) as context:
+        results = setupmeta.concurrently(*[setupmeta.current_context for _ in range(10)])
+        assert results == [context] * 10  # Caller's context applies to worker threads
+
+    def failing():
+        raise ValueError("oops")
+
+    with pytest.raises(ValueError, match="oops"):
+        setupmeta.concurrently(lambda: 1, failing)
+
+
+VERSION_CONTENTS = ["v1.%s.0-%s-gabc1234" % (i, "0" * 100000) for i in range(3)]  # Large, so that torn writes would be visible
+
+
+def concurrent_writer(path, worker, count):
+    """Write one of VERSION_CONTENTS 'count' times to 'path' (runs in a worker process)"""
+    return sum(setupmeta.write_if_changed(path, VERSION_CONTENTS[(worker + i // 4) % 3]) for i in range(count))
+
+
+def test_write_if_changed():
+    with setupmeta.temp_resource() as temp:
+        path = os.path.join(temp, setupmeta.VERSION_FILE)
+        assert setupmeta.write_if_changed(path, "v1.0")
+        mtime = os.stat(path).st_mtime_ns
+        assert not setupmeta.write_if_changed(path, "v1.0")
+        assert os.stat(path).st_mtime_ns == mtime
+
+        # Permissions are as per umask for a new file (as with a regular open()), and preserved when file is rewritten
+        umask = os.umask(0o022)
+        try:
+            os.unlink(path)
+            assert setupmeta.write_if_changed(path, "v1.0")
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+            os.chmod(path, 0o664)
+            assert setupmeta.write_if_changed(path, "v1.1")
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o664
+
+        finally:
+            os.umask(umask)
+
+        # Many concurrent writers: readers never see a partially written file, and no temp file is left behind
+        workers = 8
+        setupmeta.write_if_changed(path, VERSION_CONTENTS[0])
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(concurrent_writer, path, worker, 40) for worker in range(workers)]
+            while not all(f.done() for f in futures):
+                with open(path) as fh:
+                    assert fh.read() in VERSION_CONTENTS
+
+            written = sum(f.result() for f in futures)
+
+        assert 0 < written < workers * 40  # Writes of unchanged contents were skipped
+        assert os.listdir(temp) == [setupmeta.VERSION_FILE]
+        with open(path) as fh:
+            assert not setupmeta.write_if_changed(path, fh.read())
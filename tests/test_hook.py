@@ -0,0 +1,39 @@
+import sys
+
+import setupmeta
+from setupmeta.hook import is_using_setupmeta
+
+HEAVY_MODULES = ["setupmeta.content", "setupmeta.license", "setupmeta.model", "setupmeta.scm", "setupmeta.versioning"]
+
+FOOTPRINT_PROBE = """
+import sys
+import setuptools.dist
+import setupmeta.hook
+
+dist = setuptools.dist.Distribution()
+setupmeta.hook.finalize_dist(dist)
+setupmeta.hook.register_keyword(dist, "setup_requires", ["wheel"])
+print(" ".join(sorted(m for m in sys.modules if m.startswith("setupmeta"))))
+"""
+
+
+def test_is_using_setupmeta():
+    assert not is_using_setupmeta(None)
+    assert not is_using_setupmeta("")
+    assert not is_using_setupmeta([])
+    assert not is_using_setupmeta(["wheel"])
+    assert not is_using_setupmeta([None, 5])
+
+    assert is_using_setupmeta("setupmeta")
+    assert is_using_setupmeta(["wheel", "setupmeta>=3"])
+    assert is_using_setupmeta(("setupmeta",))
+
+
+def test_import_footprint():
+    """Builds of projects that don't use setupmeta should not pay for importing setupmeta's model"""
+    result = setupmeta.run_program(sys.executable, "-c", FOOTPRINT_PROBE)
+    assert result.returncode == 0, result.stderr
+    loaded = result.stdout.split()
+    assert "setupmeta.hook" in loaded
+    for name in HEAVY_MODULES:
+        assert name not in loaded
@@ -1,7 +1,23 @@
+import concurrent.futures
+import importlib.util
+import os
 import sys
 
+import setuptools
+
 import setupmeta
-from setupmeta.model import Definition, DefinitionEntry, get_pip, is_setup_py_path
+import setupmeta.model
+from setupmeta.model import (
+    Definition,
+    DefinitionEntry,
+    evaluated_project,
+    find_packages,
+    get_pip,
+    is_setup_py_path,
+    needed_steps,
+    setup_py_from_stack,
+    SimpleModule,
+)
 
 from . import conftest
 
@@ -42,6 +58,209 @@ def test_setup_py_determination():
             sys.argv[0] = initial
 
 
+def test_setup_py_from_stack(monkeypatch):
+    monkeypatch.setattr(setupmeta.model, "_STACK_SETUP_PY", {})
+    assert setup_py_from_stack() is None
+
+    with setupmeta.temp_resource() as temp:
+        paths = []
+        for name in ("foo", "bar"):
+            path = os.path.join(temp, name, "setup.py")
+            os.mkdir(os.path.dirname(path))
+            with open(path, "w") as fh:
+                fh.write("from setupmeta.model import setup_py_from_stack\n\nfound = setup_py_from_stack()\n")
+
+            paths.append(path)
+
+        # Memoized per file seen in call stack: a different setup.py (or none) later in the same process is found as well
+        for path in paths + paths:
+            spec = importlib.util.spec_from_file_location("setup", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            assert module.found == path
+
+        # Relative 'co_filename' (as compiled by 'python setup.py' or setuptools' build_meta) resolves against current working dir
+        for path in paths + paths:
+            os.chdir(os.path.dirname(path))
+            with open("setup.py") as fh:
+                code = compile(fh.read(), "setup.py", "exec")
+
+            namespace = {}
+            # Same as what setuptools.build_meta does to run a setup.py
+            exec(code, namespace)  # noqa: S102
+            assert namespace["found"] == path
+
+    assert setup_py_from_stack() is None
+
+
+def test_needed_steps():
+    assert needed_steps([]) is None
+    assert needed_steps(["-q"]) is None
+    assert needed_steps(["explain"]) is None
+    assert needed_steps(["--version", "sdist"]) is None
+    assert needed_steps(["--name"]) == set()
+    assert needed_steps(["-q", "--help-commands"]) == set()
+    assert needed_steps(["--version"]) == {"modules", "version"}
+    assert needed_steps(["--author", "--license"]) == {"contacts", "license", "modules"}
+    assert needed_steps(["--url"]) == {"modules", "urls", "version"}
+
+
+def test_directory_index(sample_project):
+    assert setupmeta.glob_paths(os.path.join(sample_project, "req?.txt")) == [os.path.join(sample_project, "req1.txt")]
+    with setupmeta.DirectoryIndex() as index:
+        assert setupmeta.is_file("setup.py")
+        assert not setupmeta.is_dir("setup.py")
+        assert setupmeta.is_dir("subfolder")
+        assert not setupmeta.is_file("subfolder")
+        assert not setupmeta.is_file("foo")
+        assert not setupmeta.is_file("foo/bar")
+        assert setupmeta.is_dir("/")
+        assert setupmeta.glob_paths("req*") == ["req1.txt", "reqs2.txt", "requirements.txt"]
+        assert setupmeta.glob_paths("*.cfg") == ["setup.cfg"]
+        assert setupmeta.glob_paths(".git*") == [".git", ".gitignore"]
+        assert setupmeta.glob_paths("foo/*") == []
+        assert str(index) == "7 probes served by 2 scandir calls"
+
+        with open("foo", "w") as fh:
+            fh.write("foo\n")
+
+        assert not setupmeta.is_file("foo")  # Listing is not refreshed, unless told so
+        index.forget("foo")
+        assert setupmeta.is_file("foo")
+
+    assert setupmeta.current_context().dir_index is None
+
+
+def make_packages(root, *packages):
+    for package in packages:
+        folder = os.path.join(root, *package.split("."))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "__init__.py"), "w") as fh:
+            fh.write("")
+
+
+def test_find_packages(sample_project, monkeypatch):
+    make_packages(sample_project, "foo", "foo.bar", "foo_utils", "other", "build", "build.foo", "node_modules.foo")
+    os.makedirs(os.path.join(sample_project, "foo", "data"))
+    assert sorted(setuptools.find_packages(sample_project)) == ["build", "build.foo", "foo", "foo.bar", "foo_utils", "other"]
+    assert find_packages(sample_project) == ["foo", "foo_utils", "other", "foo.bar"]
+    assert find_packages(sample_project, prefix="foo") == ["foo", "foo_utils", "foo.bar"]
+
+    # Memoized, as long as visited folders don't change
+    with setupmeta.InputTracker() as inputs:
+        assert find_packages(sample_project, prefix="foo") == ["foo", "foo_utils", "foo.bar"]
+        assert sorted(os.path.relpath(p, sample_project) for p in inputs.folders) == [".", "foo", "foo/bar", "foo/data", "foo_utils"]
+
+    make_packages(sample_project, "foo.bar.baz")
+    assert find_packages(sample_project, prefix="foo") == ["foo", "foo_utils", "foo.bar", "foo.bar.baz"]
+
+    make_packages(sample_project, "foo.data")
+    assert find_packages(sample_project, prefix="foo") == ["foo", "foo_utils", "foo.bar", "foo.data", "foo.bar.baz"]
+
+    monkeypatch.setenv("SETUPMETA_IGNORED_FOLDERS", "foo_utils, other")
+    assert find_packages(sample_project) == ["foo", "foo.bar", "foo.data", "foo.bar.baz"]
+
+    # Memoized results honor SETUPMETA_IGNORED_FOLDERS, which stays tracked as an input on memo hits
+    with setupmeta.InputTracker() as inputs:
+        assert find_packages(sample_project) == ["foo", "foo.bar", "foo.data", "foo.bar.baz"]
+        assert inputs.env["SETUPMETA_IGNORED_FOLDERS"] == "foo_utils, other"
+
+    monkeypatch.setenv("SETUPMETA_IGNORED_FOLDERS", "foo_utils, other, foo")
+    assert find_packages(sample_project) == []
+
+    monkeypatch.setenv("SETUPMETA_IGNORED_FOLDERS", "foo_utils, other")
+    assert find_packages(sample_project) == ["foo", "foo.bar", "foo.data", "foo.bar.baz"]
+
+    # Ignored folders are pruned at top level only, sub-packages named like them are kept (as setuptools does)
+    make_packages(sample_project, "src.mypkg", "src.mypkg.build", "src.mypkg.core", "src.mypkg.dist")
+    os.makedirs(os.path.join(sample_project, "src", "mypkg", "core", "node_modules"))
+    src = os.path.join(sample_project, "src")
+    expected = ["mypkg", "mypkg.build", "mypkg.core", "mypkg.dist"]
+    assert sorted(setuptools.find_packages(src)) == expected
+    assert find_packages(src) == expected
+
+
+LARGE_MODULE = """
+\"\"\"
+Generated module
+
+author: Someone
+\"\"\"
+
+import os
+
+__version__ = "1.0"
+
+
+def main():
+    pass
+
+%s
+__license__ = "MIT"
+"""
+
+
+def test_large_module(sample_project, monkeypatch):
+    monkeypatch.setattr(setupmeta.MetaDefs, "project_dir", sample_project)
+    with open(os.path.join(sample_project, "big.py"), "w") as fh:
+        fh.write(LARGE_MODULE % ("TABLE = [%s]\n" % ", ".join(str(i) for i in range(20000))))
+
+    def sources(module):
+        return {key: str(definition.sources[0].source) for key, definition in module.definitions.items()}
+
+    full = {"author": "big.py:5", "docstring_lead": "big.py:3", "license": "big.py:18", "version": "big.py:10"}
+    header = {"author": "big.py:5", "docstring_lead": "big.py:3", "version": "big.py:10"}
+    assert sources(SimpleModule("big.py")) == header
+
+    monkeypatch.setenv("SETUPMETA_SCAN_BUDGET", "0")
+    assert sources(SimpleModule("big.py")) == full
+
+    monkeypatch.setenv("SETUPMETA_SCAN_BUDGET", "1000000")
+    assert sources(SimpleModule("big.py")) == full
+
+    monkeypatch.setenv("SETUPMETA_SCAN_BUDGET", "50")
+    assert sources(SimpleModule("big.py")) == {"author": "big.py:5", "docstring_lead": "big.py:3"}
+
+
+def example_path(name):
+    return os.path.abspath(conftest.resource("..", "examples", name))
+
+
+def test_concurrent_evaluation():
+    cwd = os.getcwd()
+    project_dir = setupmeta.MetaDefs.project_dir
+    environ = {"SETUPMETA_CACHE": "0", "SCM_DESCRIBE": "v1.0.0-4-gabcdef"}
+    projects = ["direct", "hierarchical"] * 6
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(evaluated_project, example_path(name), attrs={"name": name, "versioning": "post"}, environ=environ)
+            for name in projects
+        ]
+        results = [f.result() for f in futures]
+
+    assert os.getcwd() == cwd
+    assert setupmeta.MetaDefs.project_dir == project_dir
+    assert len(results) == len(projects)
+    for i, meta in enumerate(results):
+        name = projects[i]
+        assert str(meta) == "%s definitions, %s" % (len(meta.definitions), setupmeta.short(example_path(name)))
+        assert meta.name == name
+        assert meta.version == "1.0.0.post4"
+        assert meta.definitions["version"].source == "snapshot"
+        assert meta.requirements is not None
+
+    direct, hierarchical = results[:2]
+    assert direct.value("packages") == ["direct", "direct.some_submodule"]
+    assert direct.definitions["url"].source == "direct/__init__.py:9"
+    assert hierarchical.value("package_dir") == {"": "src"}
+
+    # Informational command line is honored
+    meta = evaluated_project(example_path("direct"), attrs={"name": "direct"}, argv=["setup.py", "--name"], environ=environ)
+    assert meta.name == "direct"
+    assert not meta.version
+    assert "packages" not in meta.definitions
+
+
 def test_representation():
     e = DefinitionEntry("foo", "bar", "inlined")
     assert str(e) == "foo=bar from inlined"
@@ -150,3 +369,37 @@ def test_standard_req():
     assert setupmeta.standard_req(".foo") is None
     assert setupmeta.standard_req(".") is None
     assert setupmeta.standard_req("") is None
+
+
+def test_timings(sample_project):
+    timings = setupmeta.Timings()
+    assert setupmeta.current_context().timings is None
+    with timings:
+        with setupmeta.timed_phase("outer"):
+            setupmeta.record_read(10)
+            with setupmeta.timed_phase("inner"):
+                setupmeta.record_read(5)
+                setupmeta.record_program(0.5)
+
+        setupmeta.record_read(1)
+
+    assert setupmeta.current_context().timings is None
+    phases = timings.to_dict()["phases"]
+    assert list(phases) == ["other", "outer", "inner"]
+    assert phases["outer"]["bytes"] == 10
+    assert phases["inner"]["bytes"] == 5
+    assert phases["inner"]["programs"] == 1
+    assert phases["inner"]["program_seconds"] == 0.5
+    assert phases["other"]["files"] == 1
+    assert abs(sum(p["seconds"] for p in phases.values()) - timings.total) < 1e-3
+    assert str(timings).endswith("ms in 3 phases")
+
+    environ = {"SETUPMETA_CACHE": "0"}
+    meta = evaluated_project(sample_project, attrs={"name": "sample", "versioning": "post"}, environ=environ)
+    phases = meta.timings.to_dict()["phases"]
+    assert {"scm", "cache", "modules", "version", "urls", "requirements", "license", "long_description"} <= set(phases)
+    assert phases["version"]["programs"] >= 1
+    assert phases["modules"]["files"] >= 1
+    report = meta.timings.report()
+    assert report[0].split() == ["phase", "calls", "ms", "programs", "programs", "ms", "files", "bytes"]
+    assert report[-1].startswith("total ")
@@ -1,6 +1,13 @@
+import os
+import shutil
+
 import pytest
 
+import setupmeta.cache
+import setupmeta.gitdir
+import setupmeta.model
 import setupmeta.scm
+import setupmeta.versioning
 
 from . import conftest
 
@@ -22,33 +29,37 @@ def test_git():
         assert not str(out)
 
         git.commit_files(False, True, ["foo"], "2.0")
-        assert out.pop() == 'Would run: git add foo\nWould run: git commit -m "Version 2.0" --no-verify\nWould run: git push origin'
+        assert out.pop() == 'Would run: git add foo\nWould run: git commit -m "Version 2.0" --no-verify'
         git.apply_tag(False, True, "2.0", "main")
-        assert out.pop() == 'Would run: git fetch --all\nWould run: git tag -a v2.0 -m "Version 2.0"\nWould run: git push --tags origin'
+        expected = 'Would run: git fetch --no-tags origin refs/heads/main\nWould run: git tag -a v2.0 -m "Version 2.0"'
+        assert out.pop() == expected + "\nWould run: git push --atomic origin main refs/tags/v2.0"
 
         with pytest.raises(SystemExit):
             git.apply_tag(True, True, "2.0", "main")
 
-        assert out.pop() == "chatty stderr\ngit push --tags origin exited with code 1:\noops push failed"
+        assert out.pop() == "chatty stderr\ngit push --atomic origin main refs/tags/v2.0 exited with code 1:\noops push failed"
 
         report = git.get_diff_report()
         assert report == "some diff stats"
         assert out.pop() == "WARNING: git diff --stat exited with code 1, stderr:\noops something happened"
 
+    git = conftest.MockGit(describe="", commitid="abc123")
     git._has_origin = ""
+    git.upstream = lambda _: None  # No remote at all
     with conftest.capture_output() as out:
-        git.commit_files(False, False, [], "2.0")
-        assert not str(out)
-
-        git.commit_files(False, True, ["foo"], "2.0")
-        assert "Won't push: no origin defined" in out.pop()
         git.apply_tag(False, True, "2.0", "main")
         assert "Would run: git push " not in out
-        assert "Not running 'git push --tags origin' as you don't have an origin" in out.pop()
+        assert "Not running 'git push --atomic origin refs/tags/v2.0' as you don't have an origin" in out.pop()
 
     git._has_origin = True
-    git.status_message = "## main...origin/main [behind 1]"
-    with pytest.raises(setupmeta.UsageError, match="branch 'main' is out of date"):
+    git.status_message = "# branch.head main\n# branch.upstream origin/main\n# branch.ab +0 -1"
+    git._status = None
+    with pytest.raises(setupmeta.UsageError, match=r"branch 'main' is out of date \(behind 1\)"):
+        git.apply_tag(False, True, "2.0", "main")
+
+    git.status_message = "# branch.head main\n# branch.upstream origin/main"
+    git._status = None
+    with pytest.raises(setupmeta.UsageError, match=r"branch 'main' is out of date \(gone\)"):
         git.apply_tag(False, True, "2.0", "main")
 
 
@@ -70,3 +81,490 @@ def test_git_describe_override(monkeypatch):
     assert v.main_text == "1.2.3"
     assert v.distance == 4
     assert v.commitid == "gabc123"
+
+
+def commit_change(project, name, message):
+    with open(os.path.join(project, name), "a") as fh:
+        fh.write("%s\n" % message)
+
+    conftest.run_git("add", name, cwd=project)
+    conftest.run_git("commit", "-m", message, cwd=project)
+
+
+def check_in_process_describe(project, monkeypatch, *patterns):
+    git = setupmeta.scm.Git(project)
+    for pattern in patterns:
+        git.version_tag = pattern
+        monkeypatch.setenv("SETUPMETA_GIT_BACKEND", "python")
+        in_process = git.git_describe_output()
+        monkeypatch.delenv("SETUPMETA_GIT_BACKEND")
+        assert in_process == git.git_describe_output()
+
+    git.version_tag = None
+    monkeypatch.setenv("SETUPMETA_GIT_BACKEND", "python")
+    with conftest.capture_output():
+        in_process = git.get_version()
+
+    monkeypatch.delenv("SETUPMETA_GIT_BACKEND")
+    with conftest.capture_output():
+        assert in_process.text == git.get_version().text
+
+    return in_process
+
+
+def test_in_process_describe(sample_project, monkeypatch):
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")  # Compare both backends, not cached results
+    git = setupmeta.scm.Git(sample_project)
+    assert check_in_process_describe(sample_project, monkeypatch, "v*").text == "v0.0.0-1-g%s" % git.git_output(
+        "rev-parse", "--short", "HEAD"
+    )
+
+    commit_change(sample_project, "sample.py", "# 1")
+    conftest.run_git("tag", "2.0")
+    commit_change(sample_project, "sample.py", "# 2")
+    conftest.run_git("tag", "v1.0")
+    conftest.run_git("tag", "-a", "v1.0-annotated", "-m", "Annotated tag wins over lightweight one on same commit")
+    commit_change(sample_project, "sample.py", "# 3")
+    conftest.run_git("checkout", "-q", "-b", "side")
+    commit_change(sample_project, "side.txt", "side")
+    conftest.run_git("tag", "v9.9")  # Not on first-parent path
+    conftest.run_git("checkout", "-q", "-")
+    conftest.run_git("merge", "--no-ff", "-m", "Merged side", "side")
+    patterns = ("v*.*", "*.*", "2.*", "v1.0", "nomatch")
+    assert check_in_process_describe(sample_project, monkeypatch, *patterns).text.startswith("v1.0-annotated-2-g")
+
+    # Packed objects and refs, dirty checkout
+    conftest.run_git("gc", "-q")
+    commit_change(sample_project, "sample.py", "# 4")
+    with open(os.path.join(sample_project, "sample.py"), "a") as fh:
+        fh.write("# dirty\n")
+
+    assert check_in_process_describe(sample_project, monkeypatch, *patterns).text.endswith("-dirty")
+    assert setupmeta.scm.Git(sample_project).in_process_describe("v*.*").startswith("v1.0-annotated-3-g")
+
+    # Exact match
+    conftest.run_git("checkout", "-q", "-f", "v1.0")
+    assert check_in_process_describe(sample_project, monkeypatch, *patterns).text.startswith("v1.0-annotated-0-g")
+
+    # Settings that are not emulated make in-process describe fall back to running git
+    conftest.run_git("config", "core.abbrev", "12")
+    assert git.in_process_describe("v*.*") is None
+    check_in_process_describe(sample_project, monkeypatch, *patterns)
+
+
+def check_indexed_describe(project, *patterns):
+    git = setupmeta.scm.Git(project)
+    for pattern in patterns:
+        expected = git.git_output("describe", "--tags", "--long", "--first-parent", "--match", pattern)
+        assert git.indexed_describe(pattern) == expected
+
+    assert git.local_tags() == git._get_tags("show-ref", "--tags", "-d")
+    return git.tag_index()
+
+
+def test_tag_index(sample_project, monkeypatch):
+    patterns = ("v*.*", "*.*", "v2*", "nomatch")
+    index = check_indexed_describe(sample_project, *patterns)
+    assert not index.tags
+
+    conftest.run_git("tag", "v1.10")
+    conftest.run_git("tag", "v1.9")
+    commit_change(sample_project, "sample.py", "# 1")
+    conftest.run_git("tag", "-a", "v2.0", "-m", "Nested tag")
+    conftest.run_git("tag", "-a", "v2.0-nested", "-m", "Tag of a tag", "v2.0")
+    conftest.run_git("tag", "-a", "tree-tag", "-m", "Tag of a tree", "HEAD^{tree}")
+    conftest.run_git("tag", "-a", "a-tree-nested", "-m", "Tag of a tag that doesn't peel to a commit", "tree-tag")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "2020-01-01T00:00:00")
+    conftest.run_git("tag", "-a", "v2.1", "-m", "Most recent annotated tag wins")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "2010-01-01T00:00:00")
+    conftest.run_git("tag", "-a", "v2.2", "-m", "Older annotated tag")
+    index = check_indexed_describe(sample_project, *patterns)
+    assert [entry[-1] for entry in index.versions] == ["v1.9", "v1.10", "v2.0", "v2.0-nested", "v2.1", "v2.2"]
+    assert index.tags["v2.0-nested"][0] == index.tags["v2.0"][0]
+    assert index.tags["a-tree-nested"][0] is None
+
+    for i in range(100):  # More than initial chunk of first-parent commits looked at
+        commit_change(sample_project, "sample.py", "# %s" % i)
+
+    check_indexed_describe(sample_project, *patterns)
+
+    # Tags added, removed and packed
+    conftest.run_git("tag", "v3.0", "HEAD~70")
+    fingerprint = setupmeta.scm.Git(sample_project).refs_fingerprint()
+    assert setupmeta.cache.TagIndex(os.path.dirname(index.path)).changed_names(fingerprint) == {"v3.0"}  # Updated incrementally
+    conftest.run_git("tag", "-d", "v2.1", "v2.2")
+    index = check_indexed_describe(sample_project, *patterns)
+    assert [entry[-1] for entry in index.versions] == ["v1.9", "v1.10", "v2.0", "v2.0-nested", "v3.0"]
+    conftest.run_git("pack-refs", "--all")
+    conftest.run_git("tag", "-d", "v1.9")
+    index = check_indexed_describe(sample_project, *patterns)
+    assert [entry[-1] for entry in index.versions] == ["v1.10", "v2.0", "v2.0-nested", "v3.0"]
+
+    # Exact match on a nested tag
+    conftest.run_git("checkout", "-q", "v2.0-nested")
+    check_indexed_describe(sample_project, "v2.0-*")
+
+
+def test_indexed_describe_fallback_pattern(sample_project, monkeypatch, git_calls):
+    for i in range(100):
+        commit_change(sample_project, "sample.py", "# %s" % i)
+
+    conftest.run_git("tag", "1.0", "HEAD~10")  # Only fallback pattern '*.*' has tags
+    git = setupmeta.scm.Git(sample_project)
+    expected = git.git_output("describe", "--tags", "--long", "--first-parent", "--match", "*.*")
+    git_calls.clear()
+    assert git.indexed_describe("v*.*", "*.*") == expected
+    assert len([args for args in git_calls if args[0] == "log"]) == 1  # History is not walked further than needed
+
+    # Same for in-process describe
+    parents = []
+    original_parents = setupmeta.gitdir.GitDir.parents
+    monkeypatch.setattr(setupmeta.gitdir.GitDir, "parents", lambda self, oid: parents.append(oid) or original_parents(self, oid))
+    assert "%s-%s-g%s" % setupmeta.gitdir.GitDir(git.git_dir).describe("v*.*", "*.*") == expected
+    assert len(parents) == 11
+
+
+def test_version_history(sample_project, monkeypatch):
+    git = setupmeta.scm.Git(sample_project)
+    branch = git.get_branch()
+    commit_change(sample_project, "sample.py", "# 1")
+    conftest.run_git("tag", "-a", "v1.0", "-m", "Version 1.0")
+    conftest.run_git("tag", "1.1")  # Matches only fallback pattern '*.*'
+    conftest.run_git("checkout", "-q", "-b", "feature")
+    commit_change(sample_project, "sample.py", "# feature")
+    conftest.run_git("tag", "v5.0")  # Not on first-parent history of main
+    conftest.run_git("checkout", "-q", branch)
+    commit_change(sample_project, "README.rst", "# 2")
+    conftest.run_git("merge", "-q", "--no-ff", "-m", "Merged feature", "feature")
+    conftest.run_git("tag", "v1.2")
+    commit_change(sample_project, "sample.py", "# 3")
+
+    def described(ref):
+        output = git.run_program("describe", "--tags", "--long", "--first-parent", "--match", "v*.*", ref).stdout
+        return output or "v0.0.0-1-g%s" % git.git_output("rev-parse", "--short", ref)
+
+    history = list(git.version_history())
+    commits = git.git_output("log", "--first-parent", "--format=%H").splitlines()
+    assert [commit for _, commit, _ in history] == commits
+    assert [version.text for _, _, version in history] == [described(commit) for commit in commits]
+
+    refs = ["feature", "no-such-ref", "HEAD~1", "v1.0", "--all"]
+    history = list(git.version_history(refs=refs))
+    assert [ref for ref, _, _ in history] == refs
+    assert [version and version.text for _, _, version in history] == [
+        described("feature"),
+        None,
+        described("HEAD~1"),
+        described("v1.0"),
+        None,
+    ]
+
+    # Rendered via configured strategy, with or without a persisted tag index
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    with conftest.capture_output():
+        meta = setupmeta.model.evaluated_project(sample_project, attrs={"versioning": "distance"})
+        entries = list(meta.versioning.version_log(refs=["HEAD", "v1.0", "foo"]))
+
+    assert entries[0] == {"ref": "HEAD", "commit": commits[0], "scm": described("HEAD"), "version": meta.version}
+    assert entries[1]["version"] == "1.0.0"
+    assert entries[2] == {"ref": "foo", "error": "unknown revision"}
+
+
+def scoped_git(project, path):
+    git = setupmeta.scm.Git(project)
+    git.distance_path = path
+    return git
+
+
+def test_scoped_distance(sample_project, monkeypatch, git_calls):
+    git = scoped_git(sample_project, "subfolder")
+    commit_change(sample_project, "subfolder/sub.txt", "# 1")
+    commit_change(sample_project, "sample.py", "# 2")
+    assert git.get_version().distance == 2  # Untagged: initial commit counts too
+    assert git.commit_count() == 3
+
+    conftest.run_git("tag", "v1.0.0")
+    branch = git.get_branch()
+    conftest.run_git("checkout", "-q", "-b", "feature")
+    commit_change(sample_project, "subfolder/sub.txt", "# feature")
+    commit_change(sample_project, "side.txt", "# feature")
+    conftest.run_git("checkout", "-q", branch)
+    for i in range(3):
+        commit_change(sample_project, "sample.py", "# main %s" % i)
+
+    conftest.run_git("merge", "-q", "--no-ff", "-m", "Merged feature", "feature")  # Brings a change to subfolder: counts as 1
+    commit_change(sample_project, "subfolder/sub.txt", "# 3")
+    git = scoped_git(sample_project, "subfolder")
+    head = git.git_output("rev-parse", "--short", "HEAD")
+    assert git.get_version().text == "v1.0.0-2-g%s" % head
+    assert scoped_git(sample_project, None).get_version().text == "v1.0.0-5-g%s" % head
+
+    # Distance is extended incrementally from most recent known HEAD
+    for i in range(3):
+        commit_change(sample_project, "sample.py", "# more %s" % i)
+
+    commit_change(sample_project, "subfolder/sub.txt", "# 4")
+    git = scoped_git(sample_project, "subfolder")
+    git_calls.clear()
+    assert git.get_version().distance == 3
+    assert git.git_output("rev-list", "--first-parent", "--count", "HEAD", "^v1.0.0", "--", "subfolder") == "3"
+    counts = [args for args in git_calls if args[0] == "rev-list" and "--count" in args]
+    assert len(counts) == 2
+    assert "^%s" % git.tag_commit("v1.0.0") not in counts[0]  # Only commits since previously seen HEAD were walked
+
+    # Without cache, distance is computed from scratch
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    assert git.scoped_distance(git.tag_commit("v1.0.0")) == 3
+
+    # Scope is configured via 'versioning'
+    versioning = {"main": "{major}.{minor}.{patch}{post}", "distance_scope": "project"}
+    with conftest.capture_output():
+        meta = setupmeta.model.evaluated_project(os.path.join(sample_project, "subfolder"), attrs={"versioning": versioning})
+        assert meta.version == "1.0.0.post3"
+        meta = setupmeta.model.evaluated_project(sample_project, attrs={"versioning": versioning})
+        assert meta.version == "1.0.0.post9"
+
+    strategy = setupmeta.versioning.Strategy.from_meta(dict(versioning, distance_scope="foo"))
+    assert strategy.problem == "Invalid distance_scope 'foo', expecting one of: checkout, project"
+
+
+def test_git_status(sample_project, git_calls):
+    status = setupmeta.scm.GitStatus("# branch.oid (initial)\n# branch.head main\n")
+    assert status.oid is None
+    assert str(status) == "main"
+
+    status = setupmeta.scm.GitStatus("# branch.oid abc\n# branch.head (detached)\n2 R. N... 100644 100644 100644 a b R100 new\told\n")
+    assert status.oid == "abc"
+    assert str(status) == "HEAD (dirty)"
+
+    status = setupmeta.scm.GitStatus("# branch.head main\n# branch.upstream origin/main\n# branch.ab +2 -3\n")
+    assert str(status) == "main [ahead 2, behind 3]"
+
+    conftest.run_git("tag", "v1.0")
+    git = setupmeta.scm.Git(sample_project)
+    assert str(git.get_version()) == "v1.0-0-g%s" % git.status().oid[:7]
+    assert git.get_branch() in ("main", "master")
+    assert not git.is_dirty()
+    # Tag index is built once, version, branch and dirtiness need 2 git invocations
+    assert [args[0] for args in git_calls] == ["for-each-ref", "log", "status"]
+
+    with open(os.path.join(sample_project, "sample.py"), "a") as fh:
+        fh.write("# dirty\n")
+
+    git.run_git("add", "sample.py")  # Checkout modified via git: status is queried again
+    assert git.is_dirty()
+    assert str(git.get_version()).endswith("-dirty")
+
+
+def check_in_process_dirty(project, monkeypatch, expected):
+    monkeypatch.setenv("SETUPMETA_GIT_BACKEND", "python")
+    assert setupmeta.scm.Git(project).is_dirty() == expected
+    monkeypatch.delenv("SETUPMETA_GIT_BACKEND")
+    assert setupmeta.scm.Git(project).is_dirty() == expected
+
+
+def test_in_process_dirty_check(sample_project, monkeypatch, git_calls):
+    git = setupmeta.scm.Git(sample_project)
+    assert git.in_process_is_clean()
+    git_calls.clear()
+    monkeypatch.setenv("SETUPMETA_GIT_BACKEND", "python")
+    git = setupmeta.scm.Git(sample_project)
+    assert not git.is_dirty()
+    assert not git_calls  # Clean checkout: git was not needed
+    monkeypatch.delenv("SETUPMETA_GIT_BACKEND")
+    monkeypatch.setattr(setupmeta.gitdir, "MAX_INDEX_ENTRIES", 1)
+    assert not git.in_process_is_clean()  # Large checkouts are left to 'git status'
+    monkeypatch.undo()
+
+    conftest.run_git("update-index", "--index-version", "4")  # Prefix-compressed paths
+    check_in_process_dirty(sample_project, monkeypatch, False)
+
+    path = os.path.join(sample_project, "sample.py")
+    os.utime(path)  # Touched only: git status tells it's still clean
+    assert not setupmeta.scm.Git(sample_project).in_process_is_clean()
+    check_in_process_dirty(sample_project, monkeypatch, False)
+
+    with open(path, "a") as fh:
+        fh.write("# dirty\n")
+
+    check_in_process_dirty(sample_project, monkeypatch, True)
+    conftest.run_git("add", "sample.py")
+    check_in_process_dirty(sample_project, monkeypatch, True)
+    conftest.run_git("commit", "-m", "Committed")
+    check_in_process_dirty(sample_project, monkeypatch, False)
+    os.unlink(path)
+    check_in_process_dirty(sample_project, monkeypatch, True)
+
+
+def test_version_cache(sample_project, monkeypatch, git_calls):
+    def version_calls():
+        git_calls.clear()
+        version = str(setupmeta.scm.Git(sample_project).get_version())
+        return version, [args[0] for args in git_calls]
+
+    untagged_calls = ["for-each-ref", "rev-parse", "rev-list", "status"]
+    version, calls = version_calls()
+    assert version == "v0.0.0-1-g%s" % setupmeta.scm.Git(sample_project).git_output("rev-parse", "--short", "HEAD")
+    assert calls == untagged_calls
+    assert version_calls() == (version, ["status"])  # Commit id and distance served from cache
+
+    # New commits and tags invalidate cache
+    commit_change(sample_project, "sample.py", "# 1")
+    assert version_calls()[1] == untagged_calls[1:]  # Tag index is still up to date
+    conftest.run_git("tag", "v1.0")
+    version, calls = version_calls()
+    assert version.startswith("v1.0-0-g")
+    assert calls == ["for-each-ref", "log", "status"]  # New tag was added to tag index
+    assert version_calls() == (version, ["status"])  # 'git describe' output served from cache
+
+    # Dirtiness is never cached
+    with open(os.path.join(sample_project, "sample.py"), "a") as fh:
+        fh.write("# dirty\n")
+
+    assert version_calls() == (version + "-dirty", ["status"])
+
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    assert version_calls()[1] == ["describe", "status"]
+
+
+def test_upstream_state(sample_project):
+    origin = os.path.join(os.path.dirname(sample_project), "origin.git")
+    other = os.path.join(os.path.dirname(sample_project), "other")
+    conftest.run_git("clone", "-q", "--bare", sample_project, origin)
+    conftest.run_git("remote", "add", "origin", origin)
+    conftest.run_git("fetch", "-q", "origin")
+    git = setupmeta.scm.Git(sample_project)
+    branch = git.get_branch()
+    conftest.run_git("branch", "-q", "--set-upstream-to", "origin/%s" % branch)
+    assert git.upstream_state(branch) == ""
+
+    conftest.run_git("clone", "-q", origin, other)
+    commit_change(other, "sample.py", "# from elsewhere")
+    conftest.run_git("push", "-q", "origin", cwd=other)
+    with conftest.capture_output(), pytest.raises(setupmeta.UsageError, match="is out of date \\(behind 1\\)"):
+        git.apply_tag(True, False, "1.0", branch)
+
+    assert not git.local_tags()
+    conftest.run_git("update-ref", "-d", "refs/remotes/origin/%s" % branch)  # As if branch was deleted on remote, then pruned
+    assert git.upstream_state(branch) == "gone"
+    assert git.upstream_state("no-such-branch") == ""
+
+
+def test_bump_push(sample_project):
+    origin = os.path.join(os.path.dirname(sample_project), "origin.git")
+    conftest.run_git("clone", "-q", "--bare", sample_project, origin)
+    conftest.run_git("remote", "add", "origin", origin)
+    conftest.run_git("remote", "add", "unreachable", os.path.join(origin, "no-such-repo"))  # Not fetched by bump
+    conftest.run_git("fetch", "-q", "origin")
+    git = setupmeta.scm.Git(sample_project)
+    branch = git.get_branch()
+    conftest.run_git("branch", "-q", "--set-upstream-to", "origin/%s" % branch)
+    conftest.run_git("tag", "local-only")
+    conftest.run_git("config", "user.name", "Tester")  # Bump commits and tags via Git, not via conftest.run_git()
+    conftest.run_git("config", "user.email", "test@example.com")
+    with open(os.path.join(sample_project, "sample.py"), "a") as fh:
+        fh.write("# bumped\n")
+
+    with conftest.capture_output() as out:
+        git.commit_files(True, True, ["sample.py"], "1.0")
+        git.apply_tag(True, True, "1.0", branch)
+        assert "Running: git fetch --no-tags origin refs/heads/%s\n" % branch in out
+        assert "Running: git push --atomic origin %s refs/tags/v1.0\n" % branch in out
+
+    # Version commit and its tag made it to origin, other local tags did not
+    assert conftest.run_git("rev-parse", branch, cwd=origin).stdout == conftest.run_git("rev-parse", "HEAD").stdout
+    assert conftest.run_git("tag", cwd=origin).stdout == "v1.0"
+
+    # Pushed to the remote (and branch) that current branch tracks, even if it's not 'origin'
+    fork = os.path.join(os.path.dirname(sample_project), "fork.git")
+    conftest.run_git("init", "-q", "--bare", fork)
+    conftest.run_git("remote", "add", "fork", fork)
+    conftest.run_git("push", "-q", "fork", "%s:refs/heads/release" % branch)
+    conftest.run_git("branch", "-q", "--set-upstream-to", "fork/release")
+    with open(os.path.join(sample_project, "sample.py"), "a") as fh:
+        fh.write("# bumped again\n")
+
+    git = setupmeta.scm.Git(sample_project)
+    with conftest.capture_output() as out:
+        git.commit_files(True, True, ["sample.py"], "1.1")
+        git.apply_tag(True, True, "1.1", branch)
+        assert "Running: git push --atomic fork %s:refs/heads/release refs/tags/v1.1\n" % branch in out
+
+    assert conftest.run_git("rev-parse", "release", cwd=fork).stdout == conftest.run_git("rev-parse", "HEAD").stdout
+    assert conftest.run_git("tag", cwd=fork).stdout == "v1.1"
+    assert conftest.run_git("tag", cwd=origin).stdout == "v1.0"
+
+
+def test_shallow_clone(sample_project, monkeypatch, git_calls):
+    for i in range(9):
+        commit_change(sample_project, "sample.py", "# change %s" % i)
+        if i == 4:
+            conftest.run_git("tag", "-a", "v1.0", "-m", "Version 1.0")
+
+    origin = os.path.join(os.path.dirname(sample_project), "origin.git")
+    clone = os.path.join(os.path.dirname(sample_project), "clone")
+    conftest.run_git("clone", "-q", "--bare", sample_project, origin)
+    conftest.run_git("clone", "-q", "--depth=1", "file://%s" % origin, clone)
+    git = setupmeta.scm.Git(clone)
+    assert git.is_shallow()
+
+    # Deepening disabled: no version tag is reachable
+    monkeypatch.setenv("SETUPMETA_SHALLOW_DEPTH", "0")
+    assert str(git.get_version()) == "v0.0.0-1-g%s" % git.git_output("rev-parse", "--short", "HEAD")
+
+    # Clone gets deepened by 2, then 4 commits: v1.0 (4 commits away from HEAD) is then reachable, older history is not fetched
+    monkeypatch.delenv("SETUPMETA_SHALLOW_DEPTH")
+    monkeypatch.setattr(setupmeta.scm, "DEEPEN_CHUNK", 2)
+    assert git.get_version().text == "v1.0-4-g%s" % git.git_output("rev-parse", "--short", "HEAD")
+    assert git.is_shallow()
+    assert git.commit_count() == 7
+
+    # Cap is respected: deepened by 2, then by 1 commit
+    shutil.rmtree(clone)
+    conftest.run_git("clone", "-q", "--depth=1", "file://%s" % origin, clone)
+    monkeypatch.setenv("SETUPMETA_SHALLOW_DEPTH", "3")
+    assert str(git.get_version()) == "v0.0.0-4-g%s" % git.git_output("rev-parse", "--short", "HEAD")
+
+    # Not deepened when remote has no version tags, or can't be reached (offline builds): no fetch, no warning
+    shutil.rmtree(clone)
+    conftest.run_git("clone", "-q", "--depth=1", "file://%s" % origin, clone)
+    conftest.run_git("tag", "-d", "v1.0", cwd=origin)
+    monkeypatch.delenv("SETUPMETA_SHALLOW_DEPTH")
+    monkeypatch.setenv("SETUPMETA_CACHE", "0")
+    git_calls.clear()
+    expected = "v0.0.0-1-g%s" % git.git_output("rev-parse", "--short", "HEAD")
+    with conftest.capture_output() as out:
+        assert str(setupmeta.scm.Git(clone).get_version()) == expected
+        conftest.run_git("remote", "set-url", "origin", os.path.join(origin, "no-such-repo"), cwd=clone)
+        assert str(setupmeta.scm.Git(clone).get_version()) == expected
+        assert "WARNING" not in out
+
+    assert [args for args in git_calls if args[0] == "ls-remote"]
+    assert not [args for args in git_calls if args[0] == "fetch"]
+
+
+def test_commit_count(sample_project, monkeypatch):
+    git = setupmeta.scm.Git(sample_project)
+    commit_change(sample_project, "sample.py", "# 1")
+    conftest.run_git("checkout", "-q", "-b", "side", "HEAD~1")
+    commit_change(sample_project, "side.txt", "side")
+    conftest.run_git("checkout", "-q", "-")
+    conftest.run_git("merge", "--no-ff", "-m", "Merged side", "side")
+    assert git.commit_count() == 4
+
+    monkeypatch.setenv("SETUPMETA_GIT_BACKEND", "python")
+    with conftest.capture_output():
+        assert git.commit_count() == 4  # No commit-graph: falls back to git
+
+    conftest.run_git("commit-graph", "write", "--reachable")
+    commit_change(sample_project, "sample.py", "# 2")  # Commit not in commit-graph
+    assert git.commit_count() == 5
+    gitdir = setupmeta.gitdir.GitDir(git.git_dir)
+    assert gitdir.commit_graph.count == 4
+    assert gitdir.commit_count(gitdir.resolved_ref("refs/heads/side")) == 2
+
+    with conftest.capture_output():
+        version = git.get_version()
+
+    assert version.distance == 5
+    assert version.commitid == "g%s" % gitdir.abbreviated(gitdir.resolved_ref("HEAD"))
@@ -93,10 +93,12 @@ def test_snapshot_with_version_file():
         assert not versioning.scm.is_dirty()
         assert versioning.scm.get_branch() == "HEAD"
 
-        # Trigger artificial rewriting of version file
+        # Trigger artificial rewriting of version file: contents are unchanged, so file is not touched
+        mtime = version_file.stat().st_mtime_ns
         versioning.generate_version_file = True
         versioning.auto_fill_version()
         assert version_file.read_text() == "v1.2.3-4-g1234567"
+        assert version_file.stat().st_mtime_ns == mtime
 
 
 @patch.dict(os.environ, {setupmeta.SCM_DESCRIBE: "1.0"})
@@ -440,12 +442,21 @@ def check_bump(versioning):
         versioning.bump("minor", push=True)
         assert "Not committing bump, use --commit to commit" in logged
         assert 'git tag -a v0.2.0 -m "Version 0.2.0"' in logged
-        assert "git push --tags origin" in logged
+        assert "git push --atomic origin refs/tags/v0.2.0" in logged
 
     with pytest.raises(setupmeta.UsageError):
         versioning.bump("foo")
 
 
+def test_bump_disallowed_branch(monkeypatch):
+    scm = conftest.MockGit(branch="feature")
+    monkeypatch.setattr(scm, "remote_tags", None)  # Remote is not queried when branch can't be bumped anyway
+    with conftest.capture_output():
+        meta = new_meta("distance", scm=scm)
+        with pytest.raises(setupmeta.UsageError, match="Can't bump branch 'feature'"):
+            meta.versioning.bump("minor")
+
+
 def test_missing_tags():
     with conftest.capture_output() as logged:
         meta = new_meta("distance", scm=conftest.MockGit(describe="v0.1.2-3-g123", local_tags="v1.0\nv1.1", remote_tags="v1.0\nv2.0"))